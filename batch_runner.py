@@ -0,0 +1,150 @@
+import threading
+import time
+
+from frame_pipeline import FrameQueue, StageStats
+
+
+class StreamingBatchRunner:
+    """
+    读取 / 处理 / 写出 三段重叠执行的批处理器
+
+    read(item) -> data            读取线程，按输入顺序预读解码
+    make_worker() -> process      每个处理线程调用一次，得到 process(item, data) -> result，
+                                  便于每个线程持有自己的增强器（CLAHE等对象不跨线程共享）
+    write(item, result)           写出线程；ordered=True 时严格按输入顺序写出
+
+    已读取但尚未写出的条目数不超过 max_in_flight（默认 prefetch + workers），
+    因此内存占用与目录大小无关。items 可以是任意可迭代对象（包括生成器）。
+    任一阶段抛出的异常只影响该条目，记入 failures 后继续处理。
+    read 返回 SKIP 表示该条目无需处理（例如清单中已是最新），只计入 skipped。
+    """
+
+    SKIP = object()
+
+    def __init__(self, read, make_worker, write, workers=4, prefetch=8, ordered=True, max_in_flight=None):
+        self.read = read
+        self.make_worker = make_worker
+        self.write = write
+        self.workers = max(1, workers)
+        self.prefetch = max(1, prefetch)
+        self.ordered = ordered
+        self.max_in_flight = max_in_flight or self.prefetch + self.workers
+        self.stats = {name: StageStats(name) for name in ("read", "process", "write")}
+        self.failures = []
+        self.succeeded = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+
+    def run(self, items):
+        """处理全部条目并阻塞到完成，返回成功数量"""
+        self._slots = threading.Semaphore(self.max_in_flight)
+        self._read_queue = FrameQueue(self.prefetch, policy="block")
+        self._write_queue = FrameQueue(self.max_in_flight, policy="block")
+        self._active_workers = self.workers
+        self._lock = threading.Lock()
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self._read_loop, args=(items,), daemon=True)]
+        threads += [threading.Thread(target=self._process_loop, daemon=True) for _ in range(self.workers)]
+        for th in threads:
+            th.start()
+        self._write_loop()
+        for th in threads:
+            th.join()
+        self.elapsed = time.perf_counter() - start
+        return self.succeeded
+
+    def _read_loop(self, items):
+        stats = self.stats["read"]
+        seq = 0
+        for item in items:
+            self._slots.acquire()
+            start = time.perf_counter()
+            try:
+                data, error = self.read(item), None
+            except Exception as e:
+                data, error = None, ("读取", e)
+            stats.record(time.perf_counter() - start)
+            if data is self.SKIP:
+                self.skipped += 1
+                self._slots.release()
+                continue
+            self._read_queue.put((seq, item, data, error))
+            seq += 1
+        self._read_queue.close()
+
+    def _process_loop(self):
+        stats = self.stats["process"]
+        process = self.make_worker()
+        while True:
+            entry = self._read_queue.get()
+            if entry is None:
+                if self._read_queue.closed:
+                    break
+                continue
+            seq, item, data, error = entry
+            result = None
+            if error is None:
+                start = time.perf_counter()
+                try:
+                    result = process(item, data)
+                except Exception as e:
+                    error = ("处理", e)
+                stats.record(time.perf_counter() - start)
+            self._write_queue.put((seq, item, result, error))
+        with self._lock:
+            self._active_workers -= 1
+            if self._active_workers == 0:
+                self._write_queue.close()
+
+    def _write_loop(self):
+        pending = {}
+        next_seq = 0
+        while True:
+            entry = self._write_queue.get()
+            if entry is None:
+                if self._write_queue.closed:
+                    break
+                continue
+            if not self.ordered:
+                self._write_one(*entry[1:])
+                continue
+            pending[entry[0]] = entry
+            while next_seq in pending:
+                self._write_one(*pending.pop(next_seq)[1:])
+                next_seq += 1
+
+    def _write_one(self, item, result, error):
+        if error is None:
+            start = time.perf_counter()
+            try:
+                self.write(item, result)
+                self.succeeded += 1
+            except Exception as e:
+                error = ("写出", e)
+            self.stats["write"].record(time.perf_counter() - start)
+        if error is not None:
+            print(f"{error[0]} {item} 失败: {error[1]}")
+            self.failures.append((item, error[0], str(error[1])))
+        self._slots.release()
+
+    def utilisation(self):
+        """各阶段线程的忙碌比例（忙碌时间 / (总耗时 x 线程数)）"""
+        threads = {"read": 1, "process": self.workers, "write": 1}
+        return {name: stats.busy_time / max(self.elapsed * threads[name], 1e-9)
+                for name, stats in self.stats.items()}
+
+    def format_report(self):
+        total = self.succeeded + len(self.failures)
+        lines = [
+            f"处理完成: 成功 {self.succeeded}/{total}，失败 {len(self.failures)}，跳过 {self.skipped}",
+            f"总耗时: {self.elapsed:.2f}秒 | 吞吐: {self.succeeded / max(self.elapsed, 1e-9):.2f} 张/秒",
+            f"{'阶段':<10}{'线程':>6}{'次数':>8}{'平均(ms)':>10}{'利用率':>8}",
+        ]
+        threads = {"read": 1, "process": self.workers, "write": 1}
+        utilisation = self.utilisation()
+        for name, stats in self.stats.items():
+            snapshot = stats.snapshot()
+            lines.append(f"{name:<10}{threads[name]:>6}{snapshot['count']:>8}{snapshot['avg_ms']:>10.1f}"
+                         f"{utilisation[name]:>8.0%}")
+        return "\n".join(lines)
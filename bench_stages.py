@@ -0,0 +1,210 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from fire_classifier import FireColorLUT, exact_fire_mask
+from ir_enhancer import InfraredEnhancer
+
+FUSION_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ss1-ok - 副本-曝光在上色前 - 人体少识别.py")
+
+
+def load_fusion_module(path=FUSION_SCRIPT):
+    """按文件路径加载融合上色脚本（文件名不是合法的模块名）"""
+    spec = importlib.util.spec_from_file_location("fusion_script", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_ir_frame(width, height, seed=0, people=3, fires=2):
+    """
+    生成可复现的合成烟雾红外帧
+
+    返回 (thermal, fused)：
+    thermal - 单通道热成像图：竖直亮度渐变 + 人形热斑 + 极亮火点 + 低频烟雾 + 传感器噪声
+    fused - 对应的BGR融合图，火点区域带有火焰色调，用于火焰抑制阶段
+    """
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    thermal = 60.0 + 40.0 * yy / height
+
+    # 人形热斑：竖直椭圆
+    for _ in range(people):
+        cx, cy = rng.uniform(0.1, 0.9) * width, rng.uniform(0.3, 0.7) * height
+        rx, ry = width * rng.uniform(0.02, 0.04), height * rng.uniform(0.12, 0.2)
+        thermal += 90.0 * np.exp(-(((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2) ** 2)
+
+    # 火点：小而极亮
+    fire_mask = np.zeros((height, width), np.uint8)
+    for _ in range(fires):
+        cx, cy = int(rng.uniform(0.1, 0.9) * width), int(rng.uniform(0.5, 0.9) * height)
+        radius = max(4, int(width * rng.uniform(0.02, 0.05)))
+        cv2.circle(fire_mask, (cx, cy), radius, 255, -1)
+    thermal[fire_mask > 0] = 250.0
+
+    # 低频烟雾
+    smoke = rng.normal(0, 1, (max(2, height // 32), max(2, width // 32))).astype(np.float32)
+    smoke = cv2.resize(smoke, (width, height), interpolation=cv2.INTER_CUBIC)
+    thermal = thermal * 0.8 + 20.0 * smoke + rng.normal(0, 6, (height, width)).astype(np.float32)
+    thermal = np.clip(thermal, 0, 255).astype(np.uint8)
+
+    fused = cv2.cvtColor(thermal, cv2.COLOR_GRAY2BGR)
+    fused[fire_mask > 0] = (20, 60, 230)
+    return thermal, fused
+
+
+def time_stage(fn, repeat, warmup):
+    """运行 warmup 次后计时 repeat 次，返回毫秒统计"""
+    for _ in range(warmup):
+        fn()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": float(np.percentile(durations, 50)),
+        "p95_ms": float(np.percentile(durations, 95)),
+        "mean_ms": float(np.mean(durations)),
+        "runs": repeat,
+    }
+
+
+def build_stages(size, source_size, seed, fusion):
+    """为一个目标分辨率准备各阶段的输入，返回 [(阶段名, 无参函数)]"""
+    width, height = size
+    enhancer = InfraredEnhancer(target_size=size)
+    _, source = synthetic_ir_frame(*source_size, seed=seed)
+    thermal, fused = synthetic_ir_frame(width, height, seed=seed)
+
+    # 逐级计算一次，得到每个阶段的真实输入
+    gray = thermal
+    clahe_out = enhancer.clahe.apply(gray)
+    denoised = enhancer.denoise(clahe_out)
+    levels = enhancer.stretch_lut(denoised)
+    gamma = enhancer.smoke_gamma(denoised, levels)
+    gamma_out = cv2.LUT(denoised, enhancer.gamma_lut(levels, gamma))
+    colored, human_mask = fusion.highlight_human_regions_from_fused(fused, thermal, output_size=size, brighten=False)
+    enhanced, enhanced_hsv = fusion.enhance_colors(colored)
+    fire_lut = FireColorLUT()
+
+    return [
+        ("resize", lambda: enhancer.resize(source)),
+        ("clahe", lambda: enhancer.clahe.apply(gray)),
+        ("nlm", lambda: enhancer.denoise(clahe_out)),
+        ("percentile_stretch", lambda: enhancer.stretch_lut(denoised)),
+        ("gamma", lambda: cv2.LUT(denoised, enhancer.gamma_lut(levels, gamma))),
+        ("lab_clahe", lambda: enhancer.lab_enhance(gamma_out)),
+        ("highlight_human_regions_from_fused",
+         lambda: fusion.highlight_human_regions_from_fused(fused, thermal, output_size=size)),
+        ("enhance_colors", lambda: fusion.enhance_colors(colored)),
+        ("adjust_for_fire_detection", lambda: fusion.adjust_for_fire_detection(enhanced, human_mask, enhanced_hsv)),
+        ("adjust_for_fire_detection_lut",
+         lambda: fusion.adjust_for_fire_detection(enhanced, human_mask, fire_classifier=fire_lut)),
+        ("fire_mask_hsv", lambda: exact_fire_mask(enhanced)),
+        ("fire_mask_lut", lambda: fire_lut(enhanced)),
+        ("adjust_exposure", lambda: fusion.adjust_exposure(fused)),
+    ]
+
+
+def run_benchmarks(sizes, source_size=(1280, 720), repeat=20, warmup=3, seed=0, stages=None):
+    """对每个分辨率逐阶段计时，返回可直接写入JSON的结果"""
+    fusion = load_fusion_module()
+    results = {}
+    # 被测函数内部的 print 不计入输出
+    with contextlib.redirect_stdout(io.StringIO()):
+        for size in sizes:
+            key = f"{size[0]}x{size[1]}"
+            results[key] = {}
+            for name, fn in build_stages(size, source_size, seed, fusion):
+                if stages and name not in stages:
+                    continue
+                results[key][name] = time_stage(fn, repeat, warmup)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "cv2_threads": cv2.getNumThreads(),
+            "source_size": list(source_size),
+            "repeat": repeat,
+            "warmup": warmup,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare_with_baseline(report, baseline, tolerance=0.2, metric="p50_ms"):
+    """与基线比较，返回 [(分辨率, 阶段, 当前值, 基线值, 比值, 是否退化)]"""
+    rows = []
+    for size, stages in report["results"].items():
+        for name, stats in stages.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if base is None:
+                continue
+            ratio = stats[metric] / max(base[metric], 1e-9)
+            rows.append((size, name, stats[metric], base[metric], ratio, ratio > 1.0 + tolerance))
+    return rows
+
+
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='红外增强/融合各阶段性能基准')
+    parser.add_argument('--sizes', default='640x360,960x540,1920x1080', help='逗号分隔的目标分辨率')
+    parser.add_argument('--source_size', default='1280x720', help='resize 阶段的输入分辨率')
+    parser.add_argument('--repeat', type=int, default=20, help='每个阶段的计时次数')
+    parser.add_argument('--warmup', type=int, default=3, help='每个阶段的预热次数')
+    parser.add_argument('--seed', type=int, default=0, help='合成图像随机种子')
+    parser.add_argument('--stages', default=None, help='只运行指定的阶段（逗号分隔）')
+    parser.add_argument('--output', default='bench_results.json', help='结果JSON路径')
+    parser.add_argument('--baseline', default=None, help='基线JSON路径，用于检测性能退化')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的p50相对退化比例')
+    parser.add_argument('--save_baseline', action='store_true', help='将本次结果写为基线')
+
+    args = parser.parse_args()
+    sizes = [parse_size(s) for s in args.sizes.split(',') if s.strip()]
+    stages = set(args.stages.split(',')) if args.stages else None
+
+    report = run_benchmarks(sizes, parse_size(args.source_size), args.repeat, args.warmup, args.seed, stages)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"{'分辨率':<12}{'阶段':<38}{'p50(ms)':>10}{'p95(ms)':>10}")
+    for size, results in report["results"].items():
+        for name, stats in results.items():
+            print(f"{size:<12}{name:<38}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}")
+    print(f"结果已保存: {os.path.abspath(args.output)}")
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"基线已更新: {os.path.abspath(args.baseline)}")
+    elif args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare_with_baseline(report, baseline, args.tolerance)
+        regressions = [row for row in rows if row[5]]
+        print(f"\n与基线对比（容差 {args.tolerance:.0%}）:")
+        for size, name, current, base, ratio, regressed in rows:
+            flag = "  <-- 退化" if regressed else ""
+            print(f"{size:<12}{name:<38}{current:>10.2f}{base:>10.2f}{ratio:>8.2f}x{flag}")
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能退化")
+            sys.exit(1)
+        print("未发现性能退化")
@@ -1,4 +1,3 @@
-import copy
 import os
 import shutil
 import numpy as np
@@ -10,8 +9,14 @@ import cv2
 import torch
 import os.path as osp
 import time
-from ultralytics import YOLO
-import matplotlib.pyplot as plt
+
+from frame_cache import FrameCache
+from frame_pipeline import FramePipeline
+from frame_sink import FrameSink, frame_to_qimage, qimage_to_frame
+from ir_enhancer import make_default_enhancer, make_video_enhancer
+from model_registry import ModelRegistry
+from slideshow import SlideshowPrefetcher
+from stage_timer import TIMER
 
 IMAGE_RIGHT_INIT = "images/resources/人像.png"
 IMAGE_LEFT_INIT = "images/resources/人像_1.png"
@@ -26,6 +31,9 @@ from shipin import Ui_Form as Ui_Page4
 from shexiangtou import Ui_Form as Ui_Page5
 
 class MainWindow(QMainWindow):
+    # 视频检测线程结束后通知GUI线程恢复界面
+    vid_finished = Signal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("浓烟人体识别")
@@ -80,17 +88,45 @@ class MainWindow(QMainWindow):
         self.vid_source = int(self.init_vid_id)
         self.IS_vid = 0
         self.model_path = "weights/fin.pt"#hongwaiout.pt,best.pt
+        # 模型注册表：每个权重只加载并预热一次，视频模式的权重在后台预加载
+        self.models = ModelRegistry()
         self.model = self.model_load(weights=self.model_path)
+        self.models.preload(["weights/best.pt"])
         self.output_size = 480
         self.conf_thres = 0.5
         self.iou_thres = 0.5
         self.vid_gap = 30
+        # 是否将检测结果保存到 record/ 目录；默认关闭，帧不会写入磁盘
+        self.record_enabled = False
+        # 视频/摄像头检测前是否先做红外增强
+        self.enhance_vid = False
+        # 视频流水线：阶段间队列容量与统计输出间隔（秒）
+        self.pipeline = None
+        self.queue_size = 2
+        self.stats_interval = 2.0
+        # 线程安全的帧显示器，工作线程直接提交 numpy 帧
+        self.img_sink = FrameSink(self.page2.right_img, self)
+        self.vid_sink = FrameSink(self.page4.pictures_img, self)
+        self.cam_sink = FrameSink(self.page5.canmera_img, self)
+        self.vid_finished.connect(self.on_vid_finished)
+        # 红外增强器（CLAHE等对象只创建一次）
+        self.enhancer = make_default_enhancer()
+        # 视频模式增强器：帧间复用拉伸/烟雾统计量
+        self.vid_enhancer = make_video_enhancer()
         # 计时器用于轮流播放图片
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.show_next_image)
         # 图片路径列表和当前索引
         self.image_files = []
         self.current_index = 0
+        # 轮播预取：批量大小、缓冲帧数，以及预取线程专用的增强器
+        self.prefetcher = None
+        self.slide_batch_size = 4
+        self.slide_buffer_size = 16
+        self.slide_enhancer = make_default_enhancer()
+        # 增强+检测结果的LRU缓存（跨轮次、跨文件夹保留），循环第二圈起只需显示
+        self.slide_cache = FrameCache(max_bytes=1 << 30)
+        self.pic_sink = FrameSink(self.page3.pictures_img, self)
 
         # 设置初始图片
         self.page2.left_img.setPixmap(QPixmap(IMAGE_LEFT_INIT))
@@ -124,7 +160,7 @@ class MainWindow(QMainWindow):
     # 模型初始化
     @torch.no_grad()
     def model_load(self, weights=""):
-        model_loaded = YOLO(weights)
+        model_loaded = self.models.get(weights)
         return model_loaded
 
     def bind(self):
@@ -146,6 +182,16 @@ class MainWindow(QMainWindow):
         self.page5.up_load_button_3.clicked.connect(self.open_cam)
         self.page5.stop_button_3.clicked.connect(self.close_vid)
         self.page5.closebutton.clicked.connect(self.closeEvent)
+        # Ctrl+T 导出阶段耗时统计（需设置环境变量 STAGE_TIMING=1 开启计时）
+        QShortcut(QKeySequence("Ctrl+T"), self, self.dump_stage_timing)
+
+    def dump_stage_timing(self):
+        """打印并保存各阶段耗时的 p50/p95/p99 统计"""
+        if not TIMER.enabled:
+            print("阶段计时未开启，请设置环境变量 STAGE_TIMING=1 后启动")
+            return
+        print(TIMER.report())
+        TIMER.write_csv("record/stage_timing.csv")
 
     def closeEvent(self, event):
         reply = QMessageBox.question(self, 'quit', "Are you sure?",
@@ -177,20 +223,15 @@ class MainWindow(QMainWindow):
             self.page2.right_img.setPixmap(QPixmap(IMAGE_RIGHT_INIT))
 
     def detect_img(self):
-        output_path = "images/tmp/enhanced_image.jpg"
-        self.enhance_infrared_image(self.img2predict,output_path)
-        output_size = self.output_size
-        results = self.model(output_path, conf=self.conf_thres)
+        # 增强结果直接在内存中送入检测，不再经过JPEG中转
+        enhanced = self.enhancer.enhance_file(self.img2predict)
+        results = self.model(enhanced, conf=self.conf_thres)
         result = results[0]
-        img_array = result.plot()
-        im0 = img_array
-        im_record = copy.deepcopy(im0)
-        resize_scale = output_size / im0.shape[0]
-        im0 = cv2.resize(im0, (0, 0), fx=resize_scale, fy=resize_scale)
-        cv2.imwrite("images/tmp/single_result.jpg", im0)
-        self.page2.right_img.setPixmap(QPixmap("images/tmp/single_result.jpg"))
-        time_re = time.strftime('result_%Y-%m-%d_%H-%M-%S_%A')
-        cv2.imwrite(f"record/img/{time_re}.jpg", im_record)
+        im_record = result.plot()
+        self.img_sink.show(im_record)
+        if self.record_enabled:
+            time_re = time.strftime('result_%Y-%m-%d_%H-%M-%S_%A')
+            cv2.imwrite(f"record/img/{time_re}.jpg", im_record)
 
         result_names = result.names
         result_nums = [0] * len(result_names)
@@ -234,58 +275,75 @@ class MainWindow(QMainWindow):
 
     # 视频检测主函数
     def detect_vid(self):
-        """检测视频文件，这里的视频文件包含了mp4格式的视频文件和摄像头形式的视频文件"""
-        # model = self.model
-        vid_i = 0
-        while self.cap.isOpened():
-            # Read a frame from the video
-            success, frame = self.cap.read()
-            if success:
-                # Run YOLOv8 inference on the frame
-                results = self.model(frame,conf=self.conf_thres)
-                result = results[0]
-                img_array = result.plot()
-                # 检测 展示然后保存对应的图像结果
-                im0 = img_array
-                im_record = copy.deepcopy(im0)
-                resize_scale = self.output_size / im0.shape[0]
-                im0 = cv2.resize(im0, (0, 0), fx=resize_scale, fy=resize_scale)
-                cv2.imwrite("images/tmp/single_result_vid.jpg", im0)
-                if(self.IS_vid == 1):
-                    self.page5.canmera_img.setPixmap(QPixmap("images/tmp/single_result_vid.jpg"))
-                else:
-                    self.page4.pictures_img.setPixmap(QPixmap("images/tmp/single_result_vid.jpg"))
-                time_re = str(time.strftime('result_%Y-%m-%d_%H-%M-%S_%A'))
-
-                if vid_i % self.vid_gap == 0:
-                    cv2.imwrite("record/vid/{}.jpg".format(time_re), im_record)
-                # 保存txt记录文件
-                # if len(txt_results) > 0:
-                #     np.savetxt('record/img/{}.txt'.format(time_re), np.array(txt_results), fmt="%s %s %s %s %s %s",
-                #                delimiter="\n")
-                # 统计每个类别的数目，如果这个类别检测到的数量大于0，则将这个类别在界面上进行展示
-                result_names = result.names
-                result_nums = [0 for i in range(0, len(result_names))]
-                cls_ids = list(result.boxes.cls.cpu().numpy())
-                for cls_id in cls_ids:
-                    result_nums[int(cls_id)] = result_nums[int(cls_id)] + 1
-                result_info = ""
-                for idx_cls, cls_num in enumerate(result_nums):
-                    if cls_num > 0:
-                        result_info = result_info + "{}:{}\n".format(result_names[idx_cls], cls_num)
-                    # result_info = result_info + "{}:{}\n".format(result_names[idx_cls], cls_num)
-                    # result_info = result_info + "{}:{}\n".format(result_names[idx_cls], cls_num)
-                vid_i = vid_i + 1
-            if cv2.waitKey(1) & self.stopEvent.is_set() == True:
-                # 关闭并释放对应的视频资源
-                self.stopEvent.clear()
-                self.page5.up_load_button_3.setEnabled(True)
-                self.page4.up_load_button_2.setEnabled(True)
-                if self.cap is not None:
-                    self.cap.release()
-                    cv2.destroyAllWindows()
-                self.reset_vid()
+        """检测视频文件，这里的视频文件包含了mp4格式的视频文件和摄像头形式的视频文件
+
+        采集、增强、推理、显示分别运行在独立线程中，由有界队列连接：
+        摄像头模式只保留最新帧（丢弃旧帧），视频文件模式阻塞等待，不丢帧。
+        """
+        self.vid_i = 0
+        stages = []
+        if self.enhance_vid:
+            self.vid_enhancer.reset()
+            stages.append(("enhance", self.vid_enhancer.enhance))
+        stages.append(("infer", self.infer_frame))
+        stages.append(("display", self.display_result))
+        live = self.IS_vid == 1
+        self.pipeline = FramePipeline(self.cap.read, stages, queue_size=self.queue_size,
+                                      policy="drop_oldest" if live else "block", live=live).start()
+
+        last_report = time.perf_counter()
+        while not self.stopEvent.wait(0.05):
+            if self.pipeline.finished.is_set():
                 break
+            if time.perf_counter() - last_report >= self.stats_interval:
+                print(self.pipeline.format_stats())
+                last_report = time.perf_counter()
+        if not self.stopEvent.is_set():
+            # 视频文件播放结束，等待用户点击关闭
+            self.stopEvent.wait()
+
+        # 关闭并释放对应的视频资源
+        self.pipeline.stop()
+        self.pipeline.join(1.0)
+        print(self.pipeline.format_stats())
+        self.stopEvent.clear()
+        if self.cap is not None:
+            self.cap.release()
+        self.vid_finished.emit()
+
+    def on_vid_finished(self):
+        """在GUI线程中恢复按钮和初始图像"""
+        self.page5.up_load_button_3.setEnabled(True)
+        self.page4.up_load_button_2.setEnabled(True)
+        self.reset_vid()
+
+    def infer_frame(self, frame):
+        """推理阶段：运行YOLO并绘制检测框"""
+        result = self.model(frame, conf=self.conf_thres)[0]
+        return result.plot(), result
+
+    def display_result(self, payload):
+        """显示阶段：展示检测结果并按间隔保存记录"""
+        im_record, result = payload
+        if(self.IS_vid == 1):
+            self.cam_sink.show(im_record)
+        else:
+            self.vid_sink.show(im_record)
+        time_re = str(time.strftime('result_%Y-%m-%d_%H-%M-%S_%A'))
+
+        if self.record_enabled and self.vid_i % self.vid_gap == 0:
+            cv2.imwrite("record/vid/{}.jpg".format(time_re), im_record)
+        # 统计每个类别的数目，如果这个类别检测到的数量大于0，则将这个类别在界面上进行展示
+        result_names = result.names
+        result_nums = [0 for i in range(0, len(result_names))]
+        cls_ids = list(result.boxes.cls.cpu().numpy())
+        for cls_id in cls_ids:
+            result_nums[int(cls_id)] = result_nums[int(cls_id)] + 1
+        result_info = ""
+        for idx_cls, cls_num in enumerate(result_nums):
+            if cls_num > 0:
+                result_info = result_info + "{}:{}\n".format(result_names[idx_cls], cls_num)
+        self.vid_i = self.vid_i + 1
 
     def open_folder(self):
         """打开文件夹并读取其中的图片"""
@@ -306,77 +364,74 @@ class MainWindow(QMainWindow):
         # 如果有图片文件，开始轮流播放
         if self.image_files:
             self.current_index = 0
-            self.display_image(self.image_files[self.current_index])
             print(f"找到 {len(self.image_files)} 张图片")
-            # 启动计时器，每3秒切换一次图片
+            # 后台线程预读、增强并批量推理，计时器只负责显示已完成的帧
+            self.stop_prefetch()
+            process_batch, cache_params = self.make_slide_processor()
+            self.prefetcher = SlideshowPrefetcher(self.image_files, process_batch,
+                                                  batch_size=self.slide_batch_size,
+                                                  buffer_size=self.slide_buffer_size,
+                                                  cache=self.slide_cache,
+                                                  cache_params=cache_params).start()
             self.timer.start(25)
         else:
             print("未找到任何图片")
 
-    def display_image(self, image_path):
-        """在标签中显示图片"""
-        # 对图片进行增强处理
-        enhanced_image_path = self.enhance_image(image_path)
-
-        # 加载增强后的图片
-        pixmap = QPixmap(enhanced_image_path)
-        pixmap = self.process_image(pixmap)
-
-        if not pixmap.isNull():
-            # 缩放图片以适应标签大小
-            pixmap = pixmap.scaled(self.page2.label.width(), self.page2.label.height(), Qt.KeepAspectRatio)
-            self.page3.pictures_img.setPixmap(pixmap)
-            print(self.current_index)
-        else:
-            print(f"无法加载图片: {image_path}")
-
     def show_next_image(self):
-        """显示下一张图片"""
-        self.current_index = (self.current_index + 1) % len(self.image_files)
-        self.display_image(self.image_files[self.current_index])
+        """显示下一张已处理好的图片，未就绪时跳过本次计时"""
+        item = self.prefetcher.next_ready()
+        if item is None:
+            return
+        self.current_index, frame = item
+        self.pic_sink.show(frame)
+        if self.prefetcher.shown % 100 == 0:
+            print(self.prefetcher.format_stats())
+
+    def stop_prefetch(self):
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+            print(self.prefetcher.format_stats())
+            self.prefetcher = None
 
     def closeEvent1(self, event):
         """关闭窗口时停止计时器"""
         self.timer.stop()
+        self.stop_prefetch()
         self.reset_vid()
 
-    def process_image(self, pixmap):
-        """处理图片的函数"""
-        if not pixmap.isNull():
-            # 将 QPixmap 转换为 QImage
-            qimage = pixmap.toImage()
+    def make_slide_processor(self):
+        """
+        返回轮播后台线程使用的 (process_batch, cache_params)
 
-            # 将 QImage 转换为 OpenCV 格式的图像
-            cv_image = self.qimage_to_cv(qimage)
+        YOLO 推理不是线程安全的，后台线程不使用GUI线程的 self.model，
+        而是在处理第一批时加载自己的模型实例。权重和置信度在开始轮播时确定，
+        之后 open_cam / open_mp4 / close_vid 切换 self.model 不影响正在进行的轮播。
+        """
+        weights, conf = self.model_path, self.conf_thres
+        model = []
 
-            # 使用 YOLO 模型进行推理
-            results = self.model(cv_image, conf=self.conf_thres)  # 读取图像并执行检测的逻辑
-            result = results[0]  # 获取检测结果
-            img_array = result.plot()  # 在图像上绘制检测结果
+        def process_batch(frames):
+            """在后台线程中增强一批图片并批量推理，返回绘制了检测结果的图像"""
+            if not model:
+                model.append(self.models.create(weights))
+            enhanced = [self.slide_enhancer.enhance(frame) for frame in frames]
+            results = model[0](enhanced, conf=conf, verbose=False)
+            return [result.plot() for result in results]
 
-            # 将检测结果转换回 QPixmap
-            pixmap = QPixmap.fromImage(self.cv_to_qimage(img_array))
+        def cache_params():
+            """轮播缓存键中的参数部分：模型权重、置信度阈值和增强参数"""
+            return {"model": weights, "conf": conf, "enhancer": self.slide_enhancer.config}
 
-        return pixmap
+        return process_batch, cache_params
 
     def qimage_to_cv(self, qimage):
         """将 QImage 转换为 OpenCV 格式的图像"""
-        # 获取 QImage 的尺寸
-        width = qimage.width()
-        height = qimage.height()
-        qimage = qimage.convertToFormat(QImage.Format_RGB888)
-        byte_array = qimage.bits().tobytes()
-        cv_image = np.frombuffer(byte_array, np.uint8).reshape(height, width, 3)
-        return cv_image
+        return qimage_to_frame(qimage)
 
     def cv_to_qimage(self, cv_image):
-        """将 OpenCV 格式的图像转换为 QImage"""
-        # 将 OpenCV 图像转换为 RGB 格式
-        cv_image = cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB)
-        height, width, channel = cv_image.shape
-        bytes_per_line = 3 * width
-        qimage = QImage(cv_image.data, width, height, bytes_per_line, QImage.Format_RGB888)
-        return qimage
+        """将 OpenCV 格式的图像转换为 QImage（复制一份，可脱离原数组使用）"""
+        qimage, _ = frame_to_qimage(cv_image)
+        return qimage.copy()
 
     # 摄像头重置
     def reset_vid(self):
@@ -397,84 +452,10 @@ class MainWindow(QMainWindow):
         self.stopEvent.set()
         self.reset_vid()
 
-    #图片处理
-    @staticmethod
-    def enhance_infrared_image(image_path, output_path, save_steps=False):
-        smoke_n = 0.5  # 可以视情况调整
-
-        # 只计算处理时间（不包括I/O）
-        process_start = time.time()
-
-        # 读取图像不计入处理时间
-        ir_image = cv2.imread(image_path, cv2.IMREAD_COLOR)
-        if ir_image is None:
-            raise ValueError(f"无法读取图像: {image_path}")
-
-        ir_image = cv2.resize(cv2.cvtColor(ir_image, cv2.COLOR_BGR2RGB),
-                              (960, 540), interpolation=cv2.INTER_AREA)
-
-        if save_steps:
-            plt.imsave(f"{os.path.splitext(output_path)[0]}_1_original.png", ir_image)
-
-        gray = cv2.cvtColor(ir_image, cv2.COLOR_RGB2GRAY)
-
-        clahe = cv2.createCLAHE(clipLimit=1.2, tileGridSize=(8, 8))
-        enhanced = clahe.apply(gray)
-
-        denoised = cv2.fastNlMeansDenoising(
-            enhanced, None, h=7,
-            templateWindowSize=5,
-            searchWindowSize=5
-        )
-
-        small_img = cv2.resize(denoised, (256, 256), interpolation=cv2.INTER_AREA)
-        p_low, p_high = np.percentile(small_img, [2, 98])
-        stretched = np.clip((denoised.astype(np.float32) - p_low) * 255.0 / (p_high - p_low), 0, 255)
-
-        gamma = 0.7 - 0.05 * smoke_n
-        gamma_corrected = np.power(stretched / 255.0, gamma) * 255.0
-
-        lab = cv2.cvtColor(gamma_corrected.astype(np.uint8), cv2.COLOR_GRAY2RGB)
-        lab = cv2.cvtColor(lab, cv2.COLOR_RGB2LAB)
-        l, a, b = cv2.split(lab)
-        l = cv2.createCLAHE(clipLimit=1.0).apply(l)
-        enhanced_lab = cv2.cvtColor(cv2.merge((l, a, b)), cv2.COLOR_LAB2RGB)
-
-        # 处理结束时间点（保存前）
-        process_time = time.time() - process_start
-
-        # 保存图像不计入处理时间
-        plt.imsave(output_path, enhanced_lab)
-
-        print(f'处理完成 {os.path.basename(image_path)}，处理耗时: {process_time:.2f}秒')
-
     def enhance_frame(self, frame):
-        # 将帧保存为临时文件
-        temp_path = "images/tmp/temp_frame.jpg"
-        cv2.imwrite(temp_path, frame)
-
-        # 调用 enhance_infrared_image 函数进行增强
-        enhanced_path = "images/tmp/enhanced_frame.jpg"
-        self.enhance_infrared_image(temp_path, enhanced_path, save_steps=False)
-
-        # 读取增强后的图像
-        enhanced_frame = cv2.imread(enhanced_path)
-
-        # 删除临时文件
-        os.remove(temp_path)
-
-        return enhanced_frame
-
-    def enhance_image(self, image_path):
-        """对图片进行增强处理"""
-        # 生成增强后的图片保存路径
-        base_name = os.path.basename(image_path)
-        enhanced_image_path = os.path.join("images/tmp", f"enhanced_{base_name}")
-
-        # 调用 enhance_infrared_image 函数进行增强
-        MainWindow.enhance_infrared_image(image_path, enhanced_image_path, save_steps=False)
+        """在内存中增强一帧BGR图像"""
+        return self.enhancer.enhance(frame)
 
-        return enhanced_image_path
 
 if __name__ == '__main__':
     app = QApplication([])
@@ -0,0 +1,96 @@
+import argparse
+import csv
+import os
+import time
+
+import cv2
+import numpy as np
+
+from denoisers import DENOISERS, make_denoiser
+from ir_enhancer import InfraredEnhancer
+from testpicir2 import calculate_edge_strength, estimate_noise_level
+
+
+def load_inputs(input_dir, limit=None):
+    """按文件名顺序读取图片，缩放并做灰度CLAHE，得到与增强流程中降噪输入一致的帧"""
+    valid_exts = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+    file_list = sorted(f for f in os.listdir(input_dir) if f.lower().endswith(valid_exts))
+    if limit:
+        file_list = file_list[:limit]
+
+    enhancer = InfraredEnhancer()
+    inputs = []
+    for filename in file_list:
+        img = cv2.imread(os.path.join(input_dir, filename), cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"跳过无法读取的图像: {filename}")
+            continue
+        gray = cv2.cvtColor(enhancer.resize(img), cv2.COLOR_BGR2GRAY)
+        inputs.append((filename, enhancer.clahe.apply(gray)))
+    return inputs
+
+
+def compare_denoisers(inputs, names, save_dir=None):
+    """逐个降噪器处理全部输入，返回每个降噪器的耗时和质量指标汇总"""
+    base_noise = np.mean([estimate_noise_level(gray) for _, gray in inputs])
+    base_edge = np.mean([calculate_edge_strength(gray) for _, gray in inputs])
+
+    rows = []
+    for name in names:
+        denoiser = make_denoiser(name)
+        enhancer = InfraredEnhancer(denoiser=denoiser) if save_dir else None
+        if save_dir:
+            os.makedirs(os.path.join(save_dir, name), exist_ok=True)
+
+        durations, noises, edges = [], [], []
+        for filename, gray in inputs:
+            start = time.perf_counter()
+            denoised = denoiser(gray)
+            durations.append((time.perf_counter() - start) * 1000)
+            noises.append(estimate_noise_level(denoised))
+            edges.append(calculate_edge_strength(denoised))
+            if save_dir:
+                # 保存使用该降噪器的完整增强结果，便于后续跑检测对比
+                cv2.imwrite(os.path.join(save_dir, name, filename), enhancer.finish(denoised))
+
+        rows.append({
+            'denoiser': name,
+            'ms_mean': np.mean(durations),
+            'ms_p95': np.percentile(durations, 95),
+            'noise': np.mean(noises),
+            'noise_ratio': np.mean(noises) / base_noise,
+            'edge_strength': np.mean(edges),
+            'edge_ratio': np.mean(edges) / base_edge,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='降噪算法耗时/质量对比')
+    parser.add_argument('--input_dir', required=True, help='输入文件夹路径（视频帧按文件名排序）')
+    parser.add_argument('--denoisers', default=','.join(DENOISERS), help='逗号分隔的降噪器名称')
+    parser.add_argument('--limit', type=int, default=None, help='最多处理的图片数量')
+    parser.add_argument('--csv', default=None, help='结果保存为CSV')
+    parser.add_argument('--save_dir', default=None, help='保存每种降噪器的增强结果')
+
+    args = parser.parse_args()
+    names = [name.strip() for name in args.denoisers.split(',') if name.strip()]
+
+    inputs = load_inputs(args.input_dir, args.limit)
+    if not inputs:
+        print("未找到可处理的图像文件")
+        raise SystemExit(1)
+    print(f"共 {len(inputs)} 张图像，对比降噪器: {', '.join(names)}")
+
+    rows = compare_denoisers(inputs, names, args.save_dir)
+
+    print(f"\n{'降噪器':<12}{'ms/帧':>10}{'p95':>10}{'噪声':>10}{'噪声比':>10}{'边缘强度':>12}{'边缘保留':>10}")
+    for row in sorted(rows, key=lambda r: r['ms_mean']):
+        print(f"{row['denoiser']:<12}{row['ms_mean']:>10.2f}{row['ms_p95']:>10.2f}{row['noise']:>10.3f}"
+              f"{row['noise_ratio']:>10.3f}{row['edge_strength']:>12.2f}{row['edge_ratio']:>10.3f}")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
@@ -0,0 +1,124 @@
+import collections
+
+import cv2
+import numpy as np
+
+
+class NLMDenoiser:
+    """非局部均值降噪（原有算法，质量最好也最慢）"""
+
+    def __init__(self, h=7, template_window=5, search_window=5):
+        self.h = h
+        self.template_window = template_window
+        self.search_window = search_window
+
+    def __call__(self, gray):
+        return cv2.fastNlMeansDenoising(
+            gray, None, h=self.h,
+            templateWindowSize=self.template_window,
+            searchWindowSize=self.search_window
+        )
+
+
+class BilateralDenoiser:
+    """双边滤波，保边且比NLM快一个数量级"""
+
+    def __init__(self, d=5, sigma_color=25, sigma_space=5):
+        self.d = d
+        self.sigma_color = sigma_color
+        self.sigma_space = sigma_space
+
+    def __call__(self, gray):
+        return cv2.bilateralFilter(gray, self.d, self.sigma_color, self.sigma_space)
+
+
+class GuidedDenoiser:
+    """以自身为引导图的导向滤波（He et al.），全部由盒式滤波组成，耗时与半径无关"""
+
+    def __init__(self, radius=4, eps=0.01):
+        self.ksize = (2 * radius + 1, 2 * radius + 1)
+        self.eps = eps
+
+    def __call__(self, gray):
+        img = gray.astype(np.float32) * (1.0 / 255.0)
+        mean_i = cv2.boxFilter(img, -1, self.ksize)
+        var_i = cv2.boxFilter(img * img, -1, self.ksize) - mean_i * mean_i
+        a = var_i / (var_i + self.eps)
+        b = mean_i - a * mean_i
+        q = cv2.boxFilter(a, -1, self.ksize) * img + cv2.boxFilter(b, -1, self.ksize)
+        return cv2.convertScaleAbs(q, alpha=255.0)
+
+
+class BoxDenoiser:
+    """可分离的均值滤波，最快但会模糊边缘"""
+
+    def __init__(self, ksize=3):
+        self.ksize = (ksize, ksize)
+
+    def __call__(self, gray):
+        return cv2.blur(gray, self.ksize)
+
+
+class MedianDenoiser:
+    """中值滤波，对热像仪的椒盐噪声和坏点有效"""
+
+    def __init__(self, ksize=3):
+        self.ksize = ksize
+
+    def __call__(self, gray):
+        return cv2.medianBlur(gray, self.ksize)
+
+
+class TemporalNLMDenoiser:
+    """
+    视频时域NLM降噪（fastNlMeansDenoisingMulti）
+
+    保留最近 temporal_window 帧，对窗口中间的帧降噪，
+    因此输出比输入滞后 temporal_window // 2 帧；帧数不足时退化为单帧NLM。
+    切换视频源时需要调用 reset()。
+    """
+
+    def __init__(self, h=7, template_window=5, search_window=5, temporal_window=3):
+        self.h = h
+        self.template_window = template_window
+        self.search_window = search_window
+        self.temporal_window = temporal_window | 1
+        self._frames = collections.deque(maxlen=self.temporal_window)
+        self._single = NLMDenoiser(h, template_window, search_window)
+
+    def reset(self):
+        self._frames.clear()
+
+    def __call__(self, gray):
+        if self._frames and self._frames[-1].shape != gray.shape:
+            self._frames.clear()
+        self._frames.append(gray)
+        if len(self._frames) < self.temporal_window:
+            return self._single(gray)
+        return cv2.fastNlMeansDenoisingMulti(
+            list(self._frames), self.temporal_window // 2, self.temporal_window,
+            None, h=self.h,
+            templateWindowSize=self.template_window,
+            searchWindowSize=self.search_window
+        )
+
+
+DENOISERS = {
+    "nlm": NLMDenoiser,
+    "bilateral": BilateralDenoiser,
+    "guided": GuidedDenoiser,
+    "box": BoxDenoiser,
+    "median": MedianDenoiser,
+    "nlm_multi": TemporalNLMDenoiser,
+}
+
+# 时域降噪器会混合相邻帧且输出滞后，只能用于连续的视频帧；
+# 批量处理互不相关的单张图片时只能选择下列降噪器
+STILL_DENOISERS = sorted(name for name, cls in DENOISERS.items() if cls is not TemporalNLMDenoiser)
+
+
+def make_denoiser(name="nlm", **params):
+    """按名称创建降噪器，params 传给对应类的构造函数"""
+    if name not in DENOISERS:
+        raise ValueError(f"未知的降噪器: {name}，可选: {', '.join(DENOISERS)}")
+    return DENOISERS[name](**params)
@@ -0,0 +1,136 @@
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+# 火焰颜色的HSV范围（OpenCV 色调 0-180），与 adjust_for_fire_detection 的规则一致
+FIRE_HSV_RANGES = (
+    ((0, 150, 100), (10, 255, 255)),
+    ((160, 150, 100), (180, 255, 255)),
+)
+
+
+def hsv_fire_mask(hsv):
+    """按HSV规则得到火焰颜色掩码（0/255）"""
+    (lower1, upper1), (lower2, upper2) = FIRE_HSV_RANGES
+    return cv2.bitwise_or(cv2.inRange(hsv, lower1, upper1), cv2.inRange(hsv, lower2, upper2))
+
+
+def exact_fire_mask(bgr):
+    """精确规则：BGR -> HSV -> 两段 inRange"""
+    return hsv_fire_mask(cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV))
+
+
+class FireColorLUT:
+    """
+    量化BGR -> 火焰/非火焰 查找表
+
+    每个通道取高 bits 位，共 (2^bits)^3 个颜色格。构建时对全部 2^24 种颜色
+    执行一次精确HSV规则，格内火焰颜色占比不低于 min_fraction 的格记为火焰。
+    调用时用 cv2.calcBackProject 一次查表直接从BGR帧得到掩码，不再做HSV转换；
+    只有落在规则边界附近的格会与精确规则不一致，可用 validate() 评估。
+    """
+
+    def __init__(self, bits=6, min_fraction=0.5):
+        if not 1 <= bits <= 8:
+            raise ValueError(f"bits 必须在 1~8 之间: {bits}")
+        self.bits = bits
+        self.min_fraction = min_fraction
+        self.table = self._build()
+
+    def _build(self):
+        levels = 1 << self.bits
+        step = 256 // levels
+        counts = np.zeros((levels, levels, levels), np.uint32)
+        g, r = np.mgrid[0:256, 0:256].astype(np.uint8)
+        plane = np.empty((256, 256, 3), np.uint8)
+        plane[..., 1], plane[..., 2] = g, r
+        # 每次处理一个蓝色取值的 256x256 颜色平面
+        for b in range(256):
+            plane[..., 0] = b
+            fire = exact_fire_mask(plane) > 0
+            counts[b // step] += fire.reshape(levels, step, levels, step).sum(axis=(1, 3), dtype=np.uint32)
+        fraction = counts / float(step ** 3)
+        table = np.where(fraction >= self.min_fraction, 255, 0).astype(np.float32)
+        # 显式包装为三维 Mat，否则 (n, n, n) 数组会被当作 n 通道的二维矩阵
+        return cv2.Mat(table, wrap_channels=False)
+
+    def __call__(self, bgr):
+        """BGR帧 -> 火焰掩码（0/255）"""
+        return cv2.calcBackProject([bgr], [0, 1, 2], self.table, [0, 256, 0, 256, 0, 256], 1)
+
+    def validate(self, frames):
+        """与精确HSV规则逐像素比较，返回一致率、精确率、召回率、IoU和两种方法的耗时"""
+        tp = fp = fn = total = 0
+        exact_time = lut_time = 0.0
+        for frame in frames:
+            start = time.perf_counter()
+            exact = exact_fire_mask(frame) > 0
+            exact_time += time.perf_counter() - start
+            start = time.perf_counter()
+            approx = self(frame) > 0
+            lut_time += time.perf_counter() - start
+
+            tp += np.count_nonzero(exact & approx)
+            fp += np.count_nonzero(approx & ~exact)
+            fn += np.count_nonzero(exact & ~approx)
+            total += exact.size
+        count = max(len(frames), 1)
+        return {
+            'bits': self.bits,
+            'agreement': 1.0 - (fp + fn) / max(total, 1),
+            'precision': tp / max(tp + fp, 1),
+            'recall': tp / max(tp + fn, 1),
+            'iou': tp / max(tp + fp + fn, 1),
+            'fire_ratio': (tp + fn) / max(total, 1),
+            'exact_ms': exact_time / count * 1000,
+            'lut_ms': lut_time / count * 1000,
+        }
+
+
+def load_frames(input_dir, limit=None):
+    valid_exts = ('.png', '.jpg', '.jpeg', '.bmp')
+    file_list = sorted(f for f in os.listdir(input_dir) if f.lower().endswith(valid_exts))
+    if limit:
+        file_list = file_list[:limit]
+    frames = []
+    for filename in file_list:
+        img = cv2.imread(os.path.join(input_dir, filename), cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"跳过无法读取的图像: {filename}")
+            continue
+        frames.append(img)
+    return frames
+
+
+def synthetic_frames(count=8, size=(960, 540)):
+    """没有输入目录时使用合成热像上色帧（HOT 伪彩色含大量红/橙色）"""
+    from bench_stages import synthetic_ir_frame
+    return [cv2.applyColorMap(synthetic_ir_frame(*size, seed=seed, fires=4)[0], cv2.COLORMAP_HOT)
+            for seed in range(count)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='火焰颜色查找表与精确HSV规则的一致性验证')
+    parser.add_argument('--input_dir', default=None, help='上色后的图像文件夹（缺省使用合成帧）')
+    parser.add_argument('--bits', default='4,5,6', help='逗号分隔的每通道量化位数')
+    parser.add_argument('--min_fraction', type=float, default=0.5, help='颜色格内火焰占比阈值')
+    parser.add_argument('--limit', type=int, default=None, help='最多使用的图片数量')
+
+    args = parser.parse_args()
+    frames = load_frames(args.input_dir, args.limit) if args.input_dir else synthetic_frames()
+    if not frames:
+        print("未找到可处理的图像文件")
+        raise SystemExit(1)
+    print(f"共 {len(frames)} 帧")
+
+    print(f"{'位数':>4}{'一致率':>10}{'精确率':>10}{'召回率':>10}{'IoU':>8}{'HSV(ms)':>10}{'LUT(ms)':>10}{'建表(s)':>10}")
+    for bits in (int(b) for b in args.bits.split(',') if b.strip()):
+        start = time.perf_counter()
+        classifier = FireColorLUT(bits, args.min_fraction)
+        build_time = time.perf_counter() - start
+        row = classifier.validate(frames)
+        print(f"{bits:>4}{row['agreement']:>10.4%}{row['precision']:>10.4f}{row['recall']:>10.4f}{row['iou']:>8.4f}"
+              f"{row['exact_ms']:>10.2f}{row['lut_ms']:>10.2f}{build_time:>10.2f}")
\ No newline at end of file
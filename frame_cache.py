@@ -0,0 +1,118 @@
+import collections
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+
+class FrameCache:
+    """
+    按字节数限制的LRU帧缓存，可选溢出到磁盘
+
+    内存中的帧总大小超过 max_bytes 时淘汰最久未使用的帧；设置了 spill_dir 时
+    被淘汰的帧以 .npy 写入磁盘（总大小不超过 spill_bytes），再次命中时读回内存。
+    键可以是任意可哈希对象，通常为 (文件路径, 修改时间, 参数摘要)。
+    线程安全；get() 返回的帧与缓存共享内存，调用方不应修改。
+    """
+
+    def __init__(self, max_bytes=512 << 20, spill_dir=None, spill_bytes=4 << 30):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_bytes = spill_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_bytes = 0
+        self.disk_used = 0
+        self._frames = collections.OrderedDict()
+        self._spilled = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def get(self, key):
+        """命中时返回帧，否则返回 None"""
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return frame
+            entry = self._spilled.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            path, nbytes = entry
+            self.disk_used -= nbytes
+        try:
+            frame = np.load(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        finally:
+            self._remove_file(path)
+        with self._lock:
+            self.disk_hits += 1
+        self.put(key, frame)
+        return frame
+
+    def put(self, key, frame):
+        if frame.nbytes > self.max_bytes:
+            return
+        evicted = []
+        with self._lock:
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self.memory_bytes -= old.nbytes
+            self._frames[key] = frame
+            self.memory_bytes += frame.nbytes
+            while self.memory_bytes > self.max_bytes:
+                old_key, old_frame = self._frames.popitem(last=False)
+                self.memory_bytes -= old_frame.nbytes
+                evicted.append((old_key, old_frame))
+        if self.spill_dir:
+            for old_key, old_frame in evicted:
+                self._spill(old_key, old_frame)
+
+    def _spill(self, key, frame):
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        path = os.path.join(self.spill_dir, f"{name}.npy")
+        np.save(path, frame)
+        stale = []
+        with self._lock:
+            self._spilled[key] = (path, frame.nbytes)
+            self.disk_used += frame.nbytes
+            while self.disk_used > self.spill_bytes and self._spilled:
+                _, (old_path, nbytes) = self._spilled.popitem(last=False)
+                self.disk_used -= nbytes
+                stale.append(old_path)
+        for old_path in stale:
+            self._remove_file(old_path)
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            spilled = [path for path, _ in self._spilled.values()]
+            self._frames.clear()
+            self._spilled.clear()
+            self.memory_bytes = 0
+            self.disk_used = 0
+        for path in spilled:
+            self._remove_file(path)
+
+    def hit_rate(self):
+        total = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / total if total else 0.0
+
+    def format_stats(self):
+        return (f"缓存命中率 {self.hit_rate():.1%} (内存 {self.hits}, 磁盘 {self.disk_hits}, 未命中 {self.misses}), "
+                f"内存 {len(self._frames)} 帧 {self.memory_bytes / 2 ** 20:.1f}/{self.max_bytes / 2 ** 20:.0f}MB, "
+                f"磁盘 {len(self._spilled)} 帧 {self.disk_used / 2 ** 20:.1f}MB")
@@ -0,0 +1,205 @@
+import collections
+import threading
+import time
+
+
+class FrameQueue:
+    """
+    有界帧队列
+
+    policy:
+    "drop_oldest" - 队列满时丢弃最旧的帧，生产者永不阻塞（适合实时摄像头）
+    "block" - 队列满时阻塞生产者，直到消费者取走（适合视频文件，不丢帧）
+    """
+
+    def __init__(self, maxsize=2, policy="drop_oldest"):
+        if policy not in ("drop_oldest", "block"):
+            raise ValueError(f"未知的队列策略: {policy}")
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.dropped = 0
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        """放入一帧；队列关闭后返回 False"""
+        with self._cond:
+            while len(self._items) >= self.maxsize and not self._closed:
+                if self.policy == "drop_oldest":
+                    self._items.popleft()
+                    self.dropped += 1
+                else:
+                    self._cond.wait(0.1)
+            if self._closed:
+                return False
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=0.1):
+        """取出一帧；超时或队列已关闭且为空时返回 None"""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed and not self._items
+
+    def depth(self):
+        return len(self._items)
+
+
+class StageStats:
+    """单个阶段的计数器：处理帧数、出错帧数、滑动窗口FPS、平均耗时"""
+
+    def __init__(self, name, window=30):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self._stamps = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, duration):
+        with self._lock:
+            self.count += 1
+            self.busy_time += duration
+            self._stamps.append(time.perf_counter())
+
+    def fps(self):
+        with self._lock:
+            if len(self._stamps) < 2:
+                return 0.0
+            span = self._stamps[-1] - self._stamps[0]
+            return (len(self._stamps) - 1) / span if span > 0 else 0.0
+
+    def snapshot(self):
+        avg_ms = self.busy_time / self.count * 1000 if self.count else 0.0
+        return {"count": self.count, "errors": self.errors, "fps": self.fps(), "avg_ms": avg_ms}
+
+
+class FramePipeline:
+    """
+    分阶段的视频处理流水线：采集线程 -> 若干处理阶段 -> 显示阶段
+
+    read_fn() 返回 (success, frame)，与 cv2.VideoCapture.read 一致。
+    stages 为 [(名称, 函数)] 列表，每个阶段独占一个线程，
+    上一阶段的返回值作为下一阶段的输入，最后一个阶段通常负责显示。
+    采集队列容量为 1 且总是保留最新帧（live=True 时），避免摄像头缓冲区堆积旧帧；
+    阶段之间的队列容量和满队列策略由 queue_size / policy 指定。
+    阶段函数出错时打印错误并丢弃该帧，流水线继续运行；采集出错时视为输入结束。
+    任何情况下各线程退出前都会关闭下游队列，最终设置 finished。
+    """
+
+    def __init__(self, read_fn, stages, queue_size=2, policy="drop_oldest", live=True):
+        self.read_fn = read_fn
+        self.stages = list(stages)
+        self.live = live
+        capture_policy = "drop_oldest" if live else policy
+        capture_size = 1 if live else queue_size
+        self.queues = [FrameQueue(capture_size, capture_policy)]
+        self.queues += [FrameQueue(queue_size, policy) for _ in self.stages[1:]]
+        self.stats = [StageStats("capture")] + [StageStats(name) for name, _ in self.stages]
+        self.latency_ms = 0.0
+        self._stop = threading.Event()
+        self._threads = []
+        self.finished = threading.Event()
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._capture_loop, daemon=True)]
+        for index in range(len(self.stages)):
+            self._threads.append(threading.Thread(target=self._stage_loop, args=(index,), daemon=True))
+        for th in self._threads:
+            th.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for queue in self.queues:
+            queue.close()
+
+    def join(self, timeout=None):
+        for th in self._threads:
+            th.join(timeout)
+
+    def _capture_loop(self):
+        stats = self.stats[0]
+        try:
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                success, frame = self.read_fn()
+                if not success:
+                    if self.live:
+                        time.sleep(0.005)
+                        continue
+                    break
+                stats.record(time.perf_counter() - start)
+                if not self.queues[0].put((start, frame)):
+                    break
+        except Exception as e:
+            stats.errors += 1
+            print(f"采集出错，停止读取: {e}")
+        finally:
+            self.queues[0].close()
+
+    def _stage_loop(self, index):
+        name, fn = self.stages[index]
+        stats = self.stats[index + 1]
+        in_queue = self.queues[index]
+        out_queue = self.queues[index + 1] if index + 1 < len(self.queues) else None
+        try:
+            while not self._stop.is_set():
+                item = in_queue.get()
+                if item is None:
+                    if in_queue.closed:
+                        break
+                    continue
+                captured_at, payload = item
+                start = time.perf_counter()
+                try:
+                    payload = fn(payload)
+                except Exception as e:
+                    stats.errors += 1
+                    print(f"阶段 {name} 处理出错，丢弃该帧: {e}")
+                    continue
+                end = time.perf_counter()
+                stats.record(end - start)
+                if out_queue is None:
+                    # 采集到显示完成的端到端延迟（指数平滑）
+                    self.latency_ms = 0.9 * self.latency_ms + 0.1 * (end - captured_at) * 1000
+                elif not out_queue.put((captured_at, payload)):
+                    break
+        finally:
+            if out_queue is not None:
+                out_queue.close()
+            else:
+                self.finished.set()
+
+    def snapshot(self):
+        """各阶段FPS、平均耗时以及队列深度/丢帧计数"""
+        return {
+            "stages": {s.name: s.snapshot() for s in self.stats},
+            "queues": [{"depth": q.depth(), "dropped": q.dropped} for q in self.queues],
+            "latency_ms": self.latency_ms,
+        }
+
+    def format_stats(self):
+        snap = self.snapshot()
+        stages = " | ".join(
+            f"{name} {s['fps']:.1f}fps {s['avg_ms']:.1f}ms" + (f" 出错{s['errors']}" if s["errors"] else "")
+            for name, s in snap["stages"].items()
+        )
+        queues = " ".join(f"q{i}={q['depth']}/{q['dropped']}" for i, q in enumerate(snap["queues"]))
+        return f"{stages} | 队列(深度/丢帧) {queues} | 延迟 {snap['latency_ms']:.0f}ms"
@@ -0,0 +1,75 @@
+import threading
+
+import cv2
+import numpy as np
+from PySide6.QtCore import QObject, Qt, Signal
+from PySide6.QtGui import QImage, QPixmap
+
+
+def frame_to_qimage(frame):
+    """
+    将BGR或灰度 numpy 帧包装为共享内存的 QImage（不复制像素）
+
+    返回 (qimage, frame)，调用方必须在 qimage 使用期间持有返回的 frame。
+    """
+    if not frame.flags["C_CONTIGUOUS"]:
+        frame = np.ascontiguousarray(frame)
+    height, width = frame.shape[:2]
+    fmt = QImage.Format_Grayscale8 if frame.ndim == 2 else QImage.Format_BGR888
+    return QImage(frame.data, width, height, frame.strides[0], fmt), frame
+
+
+def qimage_to_frame(qimage):
+    """将 QImage 转换为BGR numpy 帧（只复制一次，并正确处理行对齐）"""
+    qimage = qimage.convertToFormat(QImage.Format_BGR888)
+    width, height, stride = qimage.width(), qimage.height(), qimage.bytesPerLine()
+    buffer = np.frombuffer(qimage.constBits(), np.uint8, count=stride * height)
+    return buffer.reshape(height, stride)[:, :width * 3].reshape(height, width, 3).copy()
+
+
+class FrameSink(QObject):
+    """
+    线程安全的帧显示器
+
+    任意线程调用 show(frame) 即可，实际显示通过排队信号在GUI线程完成。
+    GUI线程来不及显示时只保留最新的一帧，不会在事件队列中堆积。
+    帧在GUI线程中按标签大小缩放一次，再以共享内存方式构造 QImage。
+    """
+
+    _frame_ready = Signal()
+
+    def __init__(self, label, parent=None):
+        super().__init__(parent)
+        self.label = label
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pending = None
+        # 当前显示的帧，QImage 与它共享内存，需要一直持有
+        self._frame = None
+        self._frame_ready.connect(self._deliver, Qt.QueuedConnection)
+
+    def show(self, frame):
+        """提交一帧BGR图像等待显示，可在任意线程调用"""
+        with self._lock:
+            waiting = self._pending is not None
+            if waiting:
+                self.dropped += 1
+            self._pending = frame
+        if not waiting:
+            self._frame_ready.emit()
+
+    def _deliver(self):
+        with self._lock:
+            frame, self._pending = self._pending, None
+        if frame is None:
+            return
+
+        frame_height, frame_width = frame.shape[:2]
+        scale = min(self.label.width() / frame_width, self.label.height() / frame_height)
+        if scale > 0 and abs(scale - 1.0) > 1e-3:
+            size = (max(1, int(frame_width * scale)), max(1, int(frame_height * scale)))
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+            frame = cv2.resize(frame, size, interpolation=interpolation)
+
+        qimage, self._frame = frame_to_qimage(frame)
+        self.label.setPixmap(QPixmap.fromImage(qimage))
@@ -0,0 +1,262 @@
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+HEADER = "store.json"
+INDEX = "index.jsonl"
+# 新块文件先分配的帧数，写满后倍增到 chunk_frames
+INITIAL_CHUNK_FRAMES = 8
+
+
+def _chunk_name(chunk):
+    return f"chunk_{chunk:05d}.npy"
+
+
+def is_frame_store(path):
+    return os.path.isfile(os.path.join(path, HEADER))
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _load_index(root):
+    records = {}
+    path = os.path.join(root, INDEX)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 中断时写了一半的行
+                records[record["name"]] = record
+    return records
+
+
+class FrameStoreWriter:
+    """
+    把尺寸相同的帧追加写入分块的内存映射文件，代替逐张保存小图片
+
+    目录结构：
+        store.json        帧尺寸、类型、每块帧数
+        chunk_00000.npy   (帧数, *帧尺寸) 的 .npy 文件，以内存映射方式写入；每块最多 chunk_frames 帧，
+                          先分配 INITIAL_CHUNK_FRAMES 帧、写满后倍增，close() 时截到实际写入的帧数
+        index.jsonl       每帧一行 {"name", "chunk", "slot", ...元数据}，同名以最后一行为准
+
+    帧尺寸由第一帧（或已有存储的 store.json）确定，之后的帧必须一致。
+    gray=True 时三通道帧先转换为灰度（与 FrameStore(gray=True) 读取时的转换相同）再存储，
+    单通道存储占用三分之一的空间，按灰度读取时也不再需要转换。
+    目录已存在时在末尾继续追加。索引行在帧数据写入之后才追加，中断时不会引用未写入的帧。
+    与 AsyncImageWriter 提供相同的 write_group / flush / close / config / format_stats 接口，
+    可直接替换批处理脚本中的图像写出器。线程安全。
+    """
+
+    def __init__(self, root, chunk_frames=256, gray=False):
+        self.root = root
+        self.chunk_frames = chunk_frames
+        self.gray = gray
+        self.shape = None
+        self.dtype = None
+        self.written = 0
+        self.bytes_written = 0
+        self._chunk = None
+        self._chunk_id = -1
+        self._next = 0
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        os.makedirs(root, exist_ok=True)
+        if is_frame_store(root):
+            with open(os.path.join(root, HEADER), encoding="utf-8") as f:
+                header = json.load(f)
+            self.shape = tuple(header["shape"])
+            self.dtype = np.dtype(header["dtype"])
+            self.chunk_frames = header["chunk_frames"]
+            records = _load_index(root)
+            # 同名帧重复写入时旧位置作废但不回收，续写位置取所有记录之后
+            self._next = max((r["chunk"] * self.chunk_frames + r["slot"] + 1 for r in records.values()), default=0)
+        self._index = open(os.path.join(root, INDEX), "a", encoding="utf-8")
+        if self._index.tell() and not _ends_with_newline(self._index.name):
+            self._index.write("\n")  # 中断时写了一半的行，新记录另起一行
+
+    @property
+    def config(self):
+        return {"format": "frame_store", "chunk_frames": self.chunk_frames, "gray": self.gray}
+
+    def _start(self, frame):
+        self.shape = frame.shape
+        self.dtype = frame.dtype
+        with open(os.path.join(self.root, HEADER), "w", encoding="utf-8") as f:
+            json.dump({"shape": list(self.shape), "dtype": self.dtype.str, "chunk_frames": self.chunk_frames}, f)
+
+    def _open_chunk(self, chunk_id):
+        self._trim_chunk()
+        path = os.path.join(self.root, _chunk_name(chunk_id))
+        if os.path.exists(path):
+            self._chunk = np.load(path, mmap_mode="r+")
+        else:
+            frames = min(INITIAL_CHUNK_FRAMES, self.chunk_frames)
+            self._chunk = np.lib.format.open_memmap(path, "w+", self.dtype, (frames, *self.shape))
+        self._chunk_id = chunk_id
+
+    def _resize_chunk(self, frames):
+        """
+        改变当前块文件的帧数：重写 .npy 头中的尺寸，再扩展或截断文件
+
+        numpy 写 .npy 头时为第0维预留了足够的位数，改变帧数后头的长度不变，已写入的帧原地保留。
+        """
+        path = self._chunk.filename
+        offset = self._chunk.offset
+        self._chunk.flush()
+        self._chunk = None  # 先释放映射，Windows 下映射中的文件不能改变大小
+        with open(path, "r+b") as f:
+            np.lib.format.write_array_header_1_0(f, {"descr": np.lib.format.dtype_to_descr(self.dtype),
+                                                     "fortran_order": False, "shape": (frames, *self.shape)})
+            if f.tell() != offset:
+                raise ValueError(f"块文件 {path} 的文件头长度变化，无法改变帧数")
+            f.truncate(offset + frames * int(np.prod(self.shape)) * self.dtype.itemsize)
+        self._chunk = np.load(path, mmap_mode="r+")
+
+    def _trim_chunk(self):
+        """当前块截到实际写入的帧数（最后一块不保留空位）"""
+        if self._chunk is None:
+            return
+        used = min(self._next - self._chunk_id * self.chunk_frames, self.chunk_frames)
+        if 0 < used < len(self._chunk):
+            self._resize_chunk(used)
+        self._chunk.flush()
+
+    def append(self, name, frame, **meta):
+        """追加一帧，返回所在块文件的路径"""
+        with self._lock:
+            if self.gray and frame.ndim == 3:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if self.shape is None:
+                self._start(frame)
+            if frame.shape != self.shape or frame.dtype != self.dtype:
+                raise ValueError(f"帧 {name} 的尺寸 {frame.shape}/{frame.dtype} "
+                                 f"与存储的 {self.shape}/{self.dtype} 不一致")
+            chunk_id, slot = divmod(self._next, self.chunk_frames)
+            if chunk_id != self._chunk_id:
+                self._open_chunk(chunk_id)
+            if slot >= len(self._chunk):
+                self._resize_chunk(min(max(2 * len(self._chunk), slot + 1), self.chunk_frames))
+            self._chunk[slot] = frame
+            self._next += 1
+            self._index.write(json.dumps(dict(meta, name=name, chunk=chunk_id, slot=slot), ensure_ascii=False) + "\n")
+            self._index.flush()
+            self.written += 1
+            self.bytes_written += frame.nbytes
+            return os.path.join(self.root, _chunk_name(chunk_id))
+
+    def write_group(self, entries, on_done=None):
+        """按 (路径, 帧) 追加，帧名取路径中的文件名；返回各帧所在块文件的路径"""
+        paths = [self.append(os.path.basename(path), frame) for path, frame in entries]
+        if on_done is not None:
+            on_done(paths)
+        return paths
+
+    def flush(self):
+        with self._lock:
+            if self._chunk is not None:
+                self._chunk.flush()
+
+    def close(self):
+        with self._lock:
+            self._trim_chunk()
+            self._chunk = None
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def format_stats(self):
+        elapsed = max(time.perf_counter() - self._started, 1e-9)
+        return (f"帧存储 {self.root}: 追加 {self.written} 帧 {self.bytes_written / 2 ** 20:.1f}MB, "
+                f"{self.bytes_written / 2 ** 20 / elapsed:.1f}MB/s")
+
+
+class FrameStore:
+    """
+    只读打开 FrameStoreWriter 写出的帧存储
+
+    get() 返回块文件内存映射上的只读视图，不解码也不拷贝；
+    gray=True 且存储的是三通道帧时转换为灰度（此时会生成新数组）。
+    """
+
+    def __init__(self, root, gray=False):
+        self.root = root
+        self.gray = gray
+        with open(os.path.join(root, HEADER), encoding="utf-8") as f:
+            header = json.load(f)
+        self.shape = tuple(header["shape"])
+        self.dtype = np.dtype(header["dtype"])
+        self.records = _load_index(root)
+        self._chunks = {}
+
+    def names(self, exts=None):
+        """按写入顺序返回帧名，可按扩展名过滤"""
+        return [name for name in self.records if exts is None or name.lower().endswith(exts)]
+
+    def meta(self, name):
+        return self.records.get(name)
+
+    def _chunk(self, chunk_id):
+        chunk = self._chunks.get(chunk_id)
+        if chunk is None:
+            chunk = self._chunks[chunk_id] = np.load(os.path.join(self.root, _chunk_name(chunk_id)), mmap_mode="r")
+        return chunk
+
+    def get(self, name):
+        """返回帧，不存在时返回 None"""
+        record = self.records.get(name)
+        if record is None:
+            return None
+        frame = self._chunk(record["chunk"])[record["slot"]]
+        if self.gray and frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, name):
+        return name in self.records
+
+
+class ImageFolder:
+    """与 FrameStore 接口相同的普通图片文件夹，get() 按 flags 读取图片"""
+
+    def __init__(self, folder, flags=cv2.IMREAD_COLOR):
+        self.root = folder
+        self.flags = flags
+
+    def names(self, exts=None):
+        return [name for name in os.listdir(self.root) if exts is None or name.lower().endswith(exts)]
+
+    def get(self, name):
+        return cv2.imread(os.path.join(self.root, name), self.flags)
+
+    def __contains__(self, name):
+        return os.path.isfile(os.path.join(self.root, name))
+
+
+def open_frames(path, flags=cv2.IMREAD_COLOR):
+    """
+    打开图片文件夹或帧存储目录，两者都提供 names() / get(name)
+
+    flags 为 cv2.imread 的读取标志；对帧存储只区分是否读取为灰度。
+    """
+    if is_frame_store(path):
+        return FrameStore(path, gray=flags >= 0 and not flags & cv2.IMREAD_COLOR)
+    return ImageFolder(path, flags)
@@ -0,0 +1,236 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+import scipy.fft
+from scipy import stats
+from scipy.fftpack import dct
+
+from frame_store import open_frames
+
+
+def noise_dct_mad(img):
+    """基于DCT变换的噪声水平估计（float64 DCT + 排序求中位数的MAD）"""
+    dct_coeffs = dct(dct(img, axis=0, norm='ortho'), axis=1, norm='ortho')
+    abs_dct = np.abs(dct_coeffs)
+    robust_std = stats.median_abs_deviation(abs_dct.flatten(), scale='normal')
+    return robust_std
+
+
+# MAD 换算为正态分布标准差的系数，与 stats.median_abs_deviation(scale='normal') 一致
+_MAD_NORMAL_SCALE = 0.6744897501960817
+
+
+def _select_median(values):
+    """用 np.partition 选择中位数（O(n)，原地打乱 values 的顺序）"""
+    k = values.size // 2
+    values.partition(k)
+    if values.size % 2:
+        return values[k]
+    # 偶数个时另一个中位数是前半部分的最大值（比两个位置同时 partition 快得多）
+    return (values[:k].max() + values[k]) / 2
+
+
+def noise_dct32_mad(img):
+    """与 noise_dct_mad 相同的估计，改用 float32 DCT 和选择法求中位数"""
+    # scipy.fft 的 float32 DCT 支持任意尺寸，实测比 cv2.dct 快
+    abs_dct = np.abs(scipy.fft.dctn(np.asarray(img, np.float32), norm='ortho')).ravel()
+    deviation = np.abs(abs_dct - _select_median(abs_dct.copy()))
+    return float(_select_median(deviation)) / _MAD_NORMAL_SCALE
+
+
+# Immerkær 快速噪声估计的拉普拉斯差分核
+_IMMERKAER_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], np.float32)
+
+
+def noise_laplacian(img):
+    """Immerkær 快速噪声估计：一次3x3卷积，直接估计加性高斯噪声的标准差（与DCT估计的量纲不同）"""
+    img = np.asarray(img, np.float32)
+    h, w = img.shape[:2]
+    response = cv2.filter2D(img, cv2.CV_32F, _IMMERKAER_KERNEL)[1:-1, 1:-1]
+    return float(cv2.norm(response, cv2.NORM_L1)) * np.sqrt(np.pi / 2) / (6 * (w - 2) * (h - 2))
+
+
+NOISE_ESTIMATORS = {
+    "dct": noise_dct_mad,
+    "dct32": noise_dct32_mad,
+    "laplacian": noise_laplacian,
+}
+
+
+def estimate_noise_level(img, method="dct"):
+    """噪声水平估计，method 见 NOISE_ESTIMATORS（默认保持原有的DCT估计）"""
+    return NOISE_ESTIMATORS[method](img)
+
+
+class ImageStats:
+    """
+    一帧灰度图像的共享中间结果，各指标从中派生
+
+    hist      8/16位整数图像的完整直方图（每个灰度值一个bin），均值、方差、
+              百分位、动态范围都由它精确算出，不再逐像素遍历
+    gradient  float32 梯度幅值，按算子（sobel / scharr）各计算一次
+    三通道图像先转为灰度；浮点图像没有直方图，相关指标直接按像素计算。
+    """
+
+    def __init__(self, img, noise_method="dct"):
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        self.img = img
+        self.noise_method = noise_method
+        self._hist = None
+        self._moments = None
+        self._gradients = {}
+
+    @property
+    def hist(self):
+        if self._hist is None:
+            if self.img.dtype == np.uint8:
+                self._hist = cv2.calcHist([self.img], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+            elif self.img.dtype == np.uint16:
+                self._hist = np.bincount(self.img.ravel(), minlength=1 << 16)
+        return self._hist
+
+    def moments(self):
+        """(均值, 方差)"""
+        if self._moments is None:
+            hist = self.hist
+            if hist is None:
+                self._moments = (self.img.mean(), self.img.var())
+            else:
+                values = np.arange(hist.size, dtype=np.float64)
+                n = hist.sum()
+                mean = hist @ values / n
+                self._moments = (mean, hist @ (values - mean) ** 2 / n)
+        return self._moments
+
+    def percentile(self, q):
+        """与 np.percentile（线性插值）相同的百分位"""
+        hist = self.hist
+        if hist is None:
+            return np.percentile(self.img, q)
+        cum = np.cumsum(hist)
+        pos = (cum[-1] - 1) * q / 100
+        lo = int(np.floor(pos))
+        v_lo = np.searchsorted(cum, lo, side='right')
+        v_hi = np.searchsorted(cum, min(lo + 1, cum[-1] - 1), side='right')
+        return v_lo + (v_hi - v_lo) * (pos - lo)
+
+    def gradient(self, operator="sobel"):
+        """梯度幅值（float32）"""
+        magnitude = self._gradients.get(operator)
+        if magnitude is None:
+            if operator == "scharr":
+                gx = cv2.Scharr(self.img, cv2.CV_32F, 1, 0)
+                gy = cv2.Scharr(self.img, cv2.CV_32F, 0, 1)
+            else:
+                gx = cv2.Sobel(self.img, cv2.CV_32F, 1, 0, ksize=3)
+                gy = cv2.Sobel(self.img, cv2.CV_32F, 0, 1, ksize=3)
+            magnitude = self._gradients[operator] = cv2.magnitude(gx, gy)
+        return magnitude
+
+
+def _entropy(s):
+    hist = s.hist
+    if hist is None:
+        hist = np.histogram(s.img, bins=256, range=[0, 256])[0]
+    elif hist.size > 256:
+        hist = hist.reshape(256, -1).sum(axis=1)  # 16位图像按高8位统计
+    p = hist[hist > 0] / hist.sum()
+    return -np.sum(p * np.log2(p))
+
+
+def _dynamic_range(s):
+    hist = s.hist
+    if hist is None:
+        max_val = s.img.max()
+        min_val = s.img[s.img > 0].min() if np.any(s.img > 0) else 1e-6
+    else:
+        nonzero = np.flatnonzero(hist)
+        max_val = nonzero[-1]
+        positive = nonzero[nonzero > 0]
+        min_val = positive[0] if positive.size else 1e-6  # 避免除以0
+    with np.errstate(divide='ignore'):
+        return 20 * np.log10(max_val / min_val)
+
+
+# 指标名 -> 由 ImageStats 计算指标的函数
+METRICS = {
+    "brightness": lambda s: s.moments()[0],
+    "variance": lambda s: s.moments()[1],
+    "contrast": lambda s: np.sqrt(s.moments()[1]) / (s.moments()[0] + 1e-6),
+    "entropy": _entropy,
+    "dynamic_range": _dynamic_range,
+    "p1": lambda s: s.percentile(1),
+    "p50": lambda s: s.percentile(50),
+    "p99": lambda s: s.percentile(99),
+    "avg_gradient": lambda s: cv2.mean(s.gradient("sobel"))[0],
+    "edge_strength": lambda s: cv2.mean(s.gradient("scharr"))[0],
+    "noise": lambda s: estimate_noise_level(s.img, s.noise_method),
+}
+
+
+def compute_metrics(img, names=None, noise_method="dct"):
+    """
+    计算一帧图像的指标，names 为 METRICS 中的指标名（默认全部），返回 {指标名: 值}
+
+    同一帧的直方图和梯度只计算一次，被所有指标共用。
+    """
+    s = ImageStats(img, noise_method)
+    return {name: float(METRICS[name](s)) for name in (names or METRICS)}
+
+
+def legacy_metrics(img):
+    """test.py 与 testpicir2.py 原来的实现（各自遍历像素、float64梯度），用于对比耗时和数值"""
+    from test import calculate_avg_gradient, calculate_entropy
+    from testpicir2 import calculate_brightness, calculate_contrast, calculate_dynamic_range, calculate_edge_strength
+    return {
+        "brightness": calculate_brightness(img),
+        "variance": img.var(),
+        "contrast": calculate_contrast(img),
+        "entropy": calculate_entropy(img),
+        "dynamic_range": calculate_dynamic_range(img),
+        "avg_gradient": calculate_avg_gradient(img),
+        "edge_strength": calculate_edge_strength(img),
+        "noise": noise_dct_mad(img),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='统一指标计算与 test.py / testpicir2.py 原实现的耗时、数值对比')
+    parser.add_argument('--input_dir', required=True, help='输入文件夹或帧存储目录')
+    parser.add_argument('--limit', type=int, default=None, help='最多处理的图片数量')
+    parser.add_argument('--noise_method', default='dct', choices=list(NOISE_ESTIMATORS), help='噪声估计方法')
+
+    args = parser.parse_args()
+    frames = open_frames(args.input_dir, cv2.IMREAD_GRAYSCALE)
+    names = sorted(frames.names(('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')))[:args.limit]
+    if not names:
+        print("未找到可处理的图像文件")
+        raise SystemExit(1)
+
+    legacy_time = unified_time = 0.0
+    max_rel_err = {}
+    for name in names:
+        # 原流程中两个脚本各自读取一次图像
+        start = time.perf_counter()
+        legacy = legacy_metrics(frames.get(name))
+        frames.get(name)
+        legacy_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        unified = compute_metrics(frames.get(name), noise_method=args.noise_method)
+        unified_time += time.perf_counter() - start
+
+        for key, value in legacy.items():
+            err = abs(unified[key] - value) / max(abs(value), 1e-12)
+            max_rel_err[key] = max(max_rel_err.get(key, 0.0), err)
+
+    print(f"共 {len(names)} 张图像")
+    print(f"原实现(两次读取+各自计算): {legacy_time / len(names) * 1000:.1f} ms/张")
+    print(f"统一指标(一次读取, 全部 {len(METRICS)} 项): {unified_time / len(names) * 1000:.1f} ms/张 "
+          f"({legacy_time / max(unified_time, 1e-9):.1f}x)")
+    print("与原实现的最大相对误差:")
+    for key, err in max_rel_err.items():
+        print(f"  {key:<14}{err:.2e}")
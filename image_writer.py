@@ -0,0 +1,155 @@
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+# 保存格式对应的扩展名（keep 表示沿用输出文件名中的扩展名）
+FORMATS = {"keep": None, "png": ".png", "jpg": ".jpg", "bmp": ".bmp", "tiff": ".tiff", "webp": ".webp"}
+
+
+class AsyncImageWriter:
+    """
+    后台线程编码并保存图像（OpenCV），替代 plt.imsave
+
+    write() 只把 (路径, BGR帧) 放入有界队列后立即返回；队列满时阻塞调用方，
+    阻塞次数和时长记为 stalls / stall_time。编码结果先写入临时文件再改名，
+    中断时不会留下写了一半的图片。
+
+    约定：flush() 返回时此前提交的图像都已落盘；close() 先 flush 再结束写出线程，
+    程序退出前必须调用 close()（或使用 with 语句）。写出失败的图像记入 errors，
+    不会中断其余图像。一组图像全部写出成功后才调用该组的 on_done(路径列表)
+    （在写出线程中调用），批处理清单应在此时记录，而不是在提交时。
+    """
+
+    def __init__(self, fmt="keep", jpeg_quality=95, png_compression=3, queue_size=16, threads=1):
+        if fmt not in FORMATS:
+            raise ValueError(f"未知的图像格式: {fmt}，可选: {', '.join(FORMATS)}")
+        self.fmt = fmt
+        self.jpeg_quality = jpeg_quality
+        self.png_compression = png_compression
+        self.written = 0
+        self.bytes_written = 0
+        self.busy_time = 0.0
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.errors = []
+        self._queue = queue.Queue(max(1, queue_size))
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._threads = [threading.Thread(target=self._write_loop, daemon=True) for _ in range(max(1, threads))]
+        for th in self._threads:
+            th.start()
+
+    @property
+    def config(self):
+        """影响输出文件内容的参数（供批处理清单使用）"""
+        return {"format": self.fmt, "jpeg_quality": self.jpeg_quality, "png_compression": self.png_compression}
+
+    def output_path(self, path):
+        """按保存格式替换扩展名后的实际输出路径（只用于最终结果）"""
+        ext = FORMATS[self.fmt]
+        return path if ext is None else os.path.splitext(path)[0] + ext
+
+    def _encode_params(self, ext):
+        ext = ext.lower()
+        if ext in (".jpg", ".jpeg"):
+            return [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        if ext == ".png":
+            return [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]
+        if ext == ".webp":
+            return [cv2.IMWRITE_WEBP_QUALITY, self.jpeg_quality]
+        return []
+
+    def write(self, path, frame, on_done=None):
+        """提交一帧BGR图像，返回实际输出路径"""
+        return self.write_group([(path, frame)], on_done)[0]
+
+    def write_group(self, entries, on_done=None):
+        """
+        提交一组 (路径, BGR帧)，由同一个写出线程依次写出；返回实际输出路径列表
+
+        约定最终结果在最后：保存格式只改最后一项的扩展名，前面的中间步骤
+        （如 *_1_original.png）沿用给定的文件名。
+        """
+        entries = list(entries)
+        if entries:
+            path, frame = entries[-1]
+            entries[-1] = (self.output_path(path), frame)
+        item = (entries, on_done)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            start = time.perf_counter()
+            self._queue.put(item)
+            with self._lock:
+                self.stalls += 1
+                self.stall_time += time.perf_counter() - start
+        return [path for path, _ in entries]
+
+    def _write_one(self, path, frame):
+        ext = os.path.splitext(path)[1]
+        ok, encoded = cv2.imencode(ext, frame, self._encode_params(ext))
+        if not ok:
+            raise ValueError(f"编码失败: {path}")
+        tmp_path = f"{path}.tmp{ext}"
+        encoded.tofile(tmp_path)
+        os.replace(tmp_path, path)
+        return encoded.nbytes
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            entries, on_done = item
+            failed = False
+            for path, frame in entries:
+                start = time.perf_counter()
+                try:
+                    nbytes = self._write_one(path, frame)
+                    with self._lock:
+                        self.written += 1
+                        self.bytes_written += nbytes
+                except Exception as e:
+                    failed = True
+                    print(f"保存 {path} 失败: {e}")
+                    with self._lock:
+                        self.errors.append((path, str(e)))
+                with self._lock:
+                    self.busy_time += time.perf_counter() - start
+            try:
+                if on_done is not None and not failed:
+                    on_done([path for path, _ in entries])
+            except Exception as e:
+                print(f"写出回调失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """等待已提交的图像全部写出"""
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+        for _ in self._threads:
+            self._queue.put(None)
+        for th in self._threads:
+            th.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def format_stats(self):
+        elapsed = max(time.perf_counter() - self._started, 1e-9)
+        busy = max(self.busy_time, 1e-9)
+        return (f"写出 {self.written} 张 {self.bytes_written / 2 ** 20:.1f}MB, "
+                f"{self.bytes_written / 2 ** 20 / elapsed:.1f}MB/s (写出线程忙碌时 {self.bytes_written / 2 ** 20 / busy:.1f}MB/s), "
+                f"平均 {self.busy_time / max(self.written, 1) * 1000:.1f}ms/张, "
+                f"队列阻塞 {self.stalls} 次 {self.stall_time:.2f}秒, 失败 {len(self.errors)}")
@@ -0,0 +1,275 @@
+import cv2
+import numpy as np
+
+from denoisers import NLMDenoiser, make_denoiser
+from stage_timer import timed
+
+
+def estimate_smoke_density(gray_image):
+    """优化后的烟雾浓度估计函数"""
+    small_img = cv2.resize(gray_image, (256, 256), interpolation=cv2.INTER_AREA)
+    smoothed = cv2.GaussianBlur(small_img, (3, 3), 0)
+
+    grad_x = cv2.Scharr(smoothed, cv2.CV_64F, 1, 0)
+    grad_y = cv2.Scharr(smoothed, cv2.CV_64F, 0, 1)
+    gradient_magnitude = cv2.magnitude(grad_x, grad_y)
+
+    if np.max(gradient_magnitude) > 0:
+        gradient_magnitude /= np.max(gradient_magnitude)
+
+    mean_gradient = np.mean(gradient_magnitude)
+    smoke_density = (1.0 - mean_gradient) * 0.4 + 0.1
+    return np.clip(smoke_density, 0.1, 0.6)
+
+
+class InfraredEnhancer:
+    """
+    红外图像增强器（输入输出均为内存中的BGR帧）
+
+    所有参数、CLAHE对象和查找表在构造时一次性创建，
+    每次调用 enhance() 只做逐帧计算，可在多个入口之间复用。
+
+    参数:
+    target_size - 输出分辨率 (宽, 高)
+    interpolation - 缩放插值方式
+    clahe_clip / clahe_grid - 灰度CLAHE参数
+    lab_clip - LAB亮度通道CLAHE参数
+    nlm_h / nlm_template / nlm_search - 非局部均值降噪参数
+    denoiser - 降噪器名称（见 denoisers.DENOISERS）或可调用对象，None 表示使用上述NLM参数
+    stretch_size - 计算拉伸百分位数时使用的缩略图尺寸
+    percentiles - 直方图拉伸的上下百分位
+    smoke_n - 固定烟雾浓度（auto_smoke=False 时使用）
+    auto_smoke - 是否根据拉伸结果自动估计烟雾浓度
+    exposure - None 表示不做曝光调整，否则为 (目标亮度, 容差)
+    """
+
+    def __init__(self, target_size=(960, 540), interpolation=cv2.INTER_AREA,
+                 clahe_clip=1.2, clahe_grid=(8, 8), lab_clip=1.0,
+                 nlm_h=7, nlm_template=5, nlm_search=5,
+                 stretch_size=(256, 256), percentiles=(2, 98),
+                 smoke_n=0.5, auto_smoke=False, exposure=None, denoiser=None):
+        self.target_size = tuple(target_size)
+        self.interpolation = interpolation
+        if denoiser is None:
+            denoiser = NLMDenoiser(nlm_h, nlm_template, nlm_search)
+        elif isinstance(denoiser, str):
+            denoiser = make_denoiser(denoiser)
+        self.denoiser = denoiser
+
+        # 全部增强参数（批处理清单据此判断参数是否变化）
+        self.config = {
+            "class": type(self).__name__, "target_size": self.target_size, "interpolation": interpolation,
+            "clahe_clip": clahe_clip, "clahe_grid": tuple(clahe_grid), "lab_clip": lab_clip,
+            "denoiser": dict({k: v for k, v in vars(denoiser).items() if not k.startswith("_")},
+                             name=type(denoiser).__name__),
+            "stretch_size": tuple(stretch_size), "percentiles": list(percentiles),
+            "smoke_n": smoke_n, "auto_smoke": auto_smoke, "exposure": exposure,
+        }
+        self.stretch_size = tuple(stretch_size)
+        self.percentiles = list(percentiles)
+        self.smoke_n = smoke_n
+        self.auto_smoke = auto_smoke
+        self.exposure = exposure
+
+        self.clahe = cv2.createCLAHE(clipLimit=clahe_clip, tileGridSize=clahe_grid)
+        self.lab_clahe = cv2.createCLAHE(clipLimit=lab_clip)
+
+        # 拉伸与伽马校正都是逐像素的灰度映射，合并成 256 项查找表
+        self._levels = np.arange(256, dtype=np.float32)
+        self._fixed_gamma = 0.7 - 0.05 * smoke_n
+
+    @timed("enhance.resize")
+    def resize(self, frame):
+        """缩放到目标分辨率"""
+        if frame.shape[1::-1] == self.target_size:
+            return frame
+        return cv2.resize(frame, self.target_size, interpolation=self.interpolation)
+
+    @timed("enhance.clahe")
+    def equalize(self, gray):
+        """灰度CLAHE"""
+        return self.clahe.apply(gray)
+
+    @timed("enhance.denoise")
+    def denoise(self, enhanced):
+        """降噪（默认为非局部均值）"""
+        return self.denoiser(enhanced)
+
+    @timed("enhance.percentile")
+    def percentile_bounds(self, denoised):
+        """在缩略图上计算直方图拉伸的上下百分位数"""
+        small_img = cv2.resize(denoised, self.stretch_size, interpolation=self.interpolation)
+        p_low, p_high = np.percentile(small_img, self.percentiles)
+        return p_low, p_high
+
+    def stretch_levels(self, p_low, p_high):
+        """拉伸映射，运算顺序与逐像素计算相同（先乘 255 再除），保证结果一致"""
+        return np.clip((self._levels - p_low) * 255.0 / max(p_high - p_low, 1e-6), 0, 255)
+
+    def stretch_lut(self, denoised):
+        """根据缩略图百分位数计算拉伸映射"""
+        return self.stretch_levels(*self.percentile_bounds(denoised))
+
+    def gamma_lut(self, stretched_levels, gamma):
+        """伽马校正映射，结果截断为 uint8"""
+        return (np.power(stretched_levels / 255.0, gamma) * 255.0).astype(np.uint8)
+
+    @timed("enhance.smoke_density")
+    def smoke_density(self, denoised, stretched_levels):
+        """根据拉伸结果估计烟雾浓度"""
+        return estimate_smoke_density(cv2.LUT(denoised, stretched_levels.astype(np.uint8)))
+
+    def smoke_gamma(self, denoised, stretched_levels):
+        """计算伽马值：固定烟雾浓度或根据拉伸结果自动估计"""
+        if not self.auto_smoke:
+            return self._fixed_gamma
+        return 0.7 - 0.05 * self.smoke_density(denoised, stretched_levels)
+
+    @timed("enhance.lab_clahe")
+    def lab_enhance(self, gray):
+        """LAB亮度通道CLAHE，返回BGR图像"""
+        lab = cv2.cvtColor(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR), cv2.COLOR_BGR2LAB)
+        l, a, b = cv2.split(lab)
+        l = self.lab_clahe.apply(l)
+        return cv2.cvtColor(cv2.merge((l, a, b)), cv2.COLOR_LAB2BGR)
+
+    def brightness(self, img):
+        return np.mean(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+
+    def exposure_gain(self, current_brightness):
+        """根据当前亮度计算曝光增益 (alpha, beta)，无需调整时返回 None"""
+        target_brightness, tolerance = self.exposure
+        if abs(current_brightness - target_brightness) <= tolerance:
+            return None
+        if current_brightness < target_brightness - tolerance:
+            alpha = min(2.0, target_brightness / max(1, current_brightness))
+            beta = min(30, target_brightness - current_brightness) / 2
+        else:
+            alpha = max(0.5, target_brightness / max(1, current_brightness))
+            beta = max(-30, target_brightness - current_brightness) / 2
+        return alpha, beta
+
+    @timed("enhance.exposure")
+    def apply_gain(self, img, gain):
+        if gain is None:
+            return img
+        alpha, beta = gain
+        return cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
+
+    def adjust_exposure(self, img):
+        """自动曝光调整（仅在配置了 exposure 时生效）"""
+        if self.exposure is None:
+            return img
+        return self.apply_gain(img, self.exposure_gain(self.brightness(img)))
+
+    def enhance_resized(self, frame):
+        """对已缩放到目标分辨率的BGR帧做增强"""
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return self.finish(self.denoise(self.equalize(gray)))
+
+    def finish(self, denoised):
+        """降噪之后的拉伸、伽马校正、LAB增强和曝光调整"""
+        stretched_levels = self.stretch_lut(denoised)
+        gamma = self.smoke_gamma(denoised, stretched_levels)
+        gamma_corrected = cv2.LUT(denoised, self.gamma_lut(stretched_levels, gamma))
+
+        return self.adjust_exposure(self.lab_enhance(gamma_corrected))
+
+    def enhance(self, frame):
+        """增强一帧BGR图像，返回目标分辨率的BGR图像"""
+        return self.enhance_resized(self.resize(frame))
+
+    def enhance_file(self, image_path):
+        """读取图像文件并增强"""
+        ir_image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if ir_image is None:
+            raise ValueError(f"无法读取图像: {image_path}")
+        return self.enhance(ir_image)
+
+
+class VideoInfraredEnhancer(InfraredEnhancer):
+    """
+    视频流增强器：复用帧间统计量
+
+    固定机位下，拉伸百分位数、烟雾浓度和曝光亮度变化缓慢。
+    本类每 refresh_interval 帧（或检测到场景突变时）才重新计算百分位数和烟雾浓度，
+    并用系数为 ema 的指数滑动平均平滑，其余帧直接复用缓存的查找表；
+    曝光亮度逐帧测量但同样经过平滑，避免增益在容差边界来回跳变造成闪烁。
+    场景突变检测：比较当前帧与上次刷新帧 32x18 缩略图的平均绝对差。
+    """
+
+    def __init__(self, *args, refresh_interval=10, ema=0.3, scene_threshold=2.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refresh_interval = max(1, refresh_interval)
+        self.ema = ema
+        self.scene_threshold = scene_threshold
+        self.reset()
+
+    def reset(self):
+        """清空缓存的统计量（切换视频源时调用）"""
+        if hasattr(self.denoiser, "reset"):
+            self.denoiser.reset()
+        self.frame_count = 0
+        self.refresh_count = 0
+        self.scene_cuts = 0
+        self._thumb = None
+        self._bounds = None
+        self._smoke = None
+        self._brightness = None
+        self._lut = None
+
+    def _smooth(self, old, new, cut):
+        if old is None or cut:
+            return new
+        return old + self.ema * (new - old)
+
+    def scene_changed(self, gray):
+        thumb = cv2.resize(gray, (32, 18), interpolation=cv2.INTER_AREA)
+        changed = self._thumb is not None and cv2.absdiff(thumb, self._thumb).mean() > self.scene_threshold
+        return changed, thumb
+
+    def enhance_resized(self, frame):
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        cut, thumb = self.scene_changed(gray)
+        refresh = self._lut is None or cut or self.frame_count % self.refresh_interval == 0
+        self.frame_count += 1
+
+        denoised = self.denoise(self.equalize(gray))
+
+        if refresh:
+            self.refresh_count += 1
+            self.scene_cuts += int(cut)
+            self._thumb = thumb
+            bounds = np.array(self.percentile_bounds(denoised))
+            self._bounds = self._smooth(self._bounds, bounds, cut)
+            stretched_levels = self.stretch_levels(*self._bounds)
+            gamma = self._fixed_gamma
+            if self.auto_smoke:
+                self._smoke = self._smooth(self._smoke, self.smoke_density(denoised, stretched_levels), cut)
+                gamma = 0.7 - 0.05 * self._smoke
+            self._lut = self.gamma_lut(stretched_levels, gamma)
+
+        result = self.lab_enhance(cv2.LUT(denoised, self._lut))
+
+        if self.exposure is None:
+            return result
+        # 亮度均值很便宜，逐帧测量但经过平滑后再决定曝光增益
+        self._brightness = self._smooth(self._brightness, self.brightness(result), cut)
+        return self.apply_gain(result, self.exposure_gain(self._brightness))
+
+
+def make_default_enhancer(**kwargs):
+    """ok-pi.py / 界面程序使用的增强参数（固定烟雾浓度，无曝光调整）"""
+    return InfraredEnhancer(**kwargs)
+
+
+def make_auto_enhancer(**kwargs):
+    """ok-pi-auto.py 使用的增强参数（自动烟雾浓度 + 自动曝光）"""
+    params = dict(interpolation=cv2.INTER_LINEAR, auto_smoke=True, exposure=(113, 5))
+    params.update(kwargs)
+    return InfraredEnhancer(**params)
+
+
+def make_video_enhancer(**kwargs):
+    """界面视频/摄像头模式使用的增强器（默认参数 + 帧间统计复用）"""
+    return VideoInfraredEnhancer(**kwargs)
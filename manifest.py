@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+
+def params_hash(params):
+    """处理参数的摘要（参数按键排序后序列化）"""
+    text = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def content_hash(*datas):
+    """一个或多个输入文件内容的摘要"""
+    digest = hashlib.blake2b(digest_size=16)
+    for data in datas:
+        digest.update(memoryview(np.ascontiguousarray(data)).cast("B"))
+    return digest.hexdigest()
+
+
+def read_bytes(path):
+    """读取文件全部内容（uint8 数组，可直接交给 cv2.imdecode）"""
+    return np.fromfile(path, np.uint8)
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class BatchManifest:
+    """
+    批处理清单：记录输出目录中每个条目由哪份输入内容、哪组参数生成
+
+    清单是输出目录下的 JSONL 文件，每成功写出一个条目追加一行：
+    {"name", "hash", "params", "stat", "outputs"}，同名条目以最后一行为准，
+    因此中断后重新运行会从上次停下的位置继续。
+
+    is_current() 判断条目是否可以跳过：参数摘要相同、记录的输出文件都还在，
+    并且输入内容摘要相同。输入文件的大小和修改时间与记录一致时直接认为内容未变，
+    不再读取文件；否则读取内容计算摘要（例如文件被复制或 touch 过）。
+    """
+
+    FILENAME = "manifest.jsonl"
+
+    def __init__(self, output_dir, params, filename=FILENAME, force=False):
+        self.path = os.path.join(output_dir, filename)
+        self.params = params_hash(params)
+        self.force = force
+        self.records = {}
+        self.skipped = 0
+        self.recorded = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+        if self._file.tell() and not _ends_with_newline(self.path):
+            # 上次中断时最后一行只写了一半，先换行，否则新记录会接在这半行后面一起作废
+            self._file.write("\n")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 中断时写了一半的行
+                self.records[record["name"]] = record
+
+    @staticmethod
+    def _stat(paths):
+        return [[st.st_size, st.st_mtime_ns] for st in (os.stat(path) for path in paths)]
+
+    def is_current(self, name, paths, datas=None):
+        """
+        条目是否已按当前参数处理过且输入未变
+
+        paths 为该条目的全部输入文件；datas 为已读取的文件内容，
+        不给出时只做大小/修改时间的快速判断，不读取文件。
+        返回 False 且给出了 datas 时，会记下内容摘要供 record() 使用。
+        """
+        paths = [paths] if isinstance(paths, str) else list(paths)
+        record = None if self.force else self.records.get(name)
+        usable = (record is not None and record["params"] == self.params
+                  and all(os.path.exists(path) for path in record["outputs"]))
+
+        if datas is None:
+            if usable and record["stat"] == self._stat(paths):
+                self._skip()
+                return True
+            return False
+
+        digest = content_hash(*datas)
+        stat = self._stat(paths)
+        if usable and record["hash"] == digest:
+            # 内容未变，只更新文件属性，下次走快速判断
+            self._append(dict(record, stat=stat))
+            self._skip()
+            return True
+        with self._lock:
+            self._pending[name] = (digest, stat)
+        return False
+
+    def check(self, name, paths):
+        """先做快速判断，必要时读取文件计算摘要；返回 (是否跳过, 文件内容列表)"""
+        paths = [paths] if isinstance(paths, str) else list(paths)
+        if self.is_current(name, paths):
+            return True, None
+        datas = [read_bytes(path) for path in paths]
+        return self.is_current(name, paths, datas), datas
+
+    def _skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def record(self, name, outputs):
+        """条目的全部输出写出成功后调用"""
+        with self._lock:
+            digest, stat = self._pending.pop(name)
+        self._append({"name": name, "hash": digest, "params": self.params, "stat": stat,
+                      "outputs": [os.path.abspath(path) for path in outputs]})
+        with self._lock:
+            self.recorded += 1
+
+    def _append(self, record):
+        with self._lock:
+            self.records[record["name"]] = record
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def format_report(self, total):
+        ratio = self.skipped / total if total else 0.0
+        return f"清单: 跳过未变化的条目 {self.skipped}/{total} ({ratio:.1%})，新处理并记录 {self.recorded}"
\ No newline at end of file
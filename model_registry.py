@@ -0,0 +1,75 @@
+import threading
+import time
+
+import numpy as np
+from ultralytics import YOLO
+
+
+class ModelRegistry:
+    """
+    YOLO 模型注册表：每个权重文件只加载一次并预热
+
+    get() 返回已加载的模型；首次请求时加载权重并在全零图像上推理一次，
+    避免第一帧真实图像承担CUDA初始化/图优化等一次性开销。
+    preload() 可在后台线程中提前加载，之后切换模式只需查表。
+    YOLO 推理不是线程安全的：get() 返回的是共享实例，只能在同一个线程中使用；
+    需要在其他线程推理时用 create() 加载一个独立的实例。
+    """
+
+    def __init__(self, loader=YOLO, warmup_size=(640, 640), warmup_runs=1):
+        self.loader = loader
+        self.warmup_size = warmup_size
+        self.warmup_runs = warmup_runs
+        self.timings = {}
+        self._models = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _weights_lock(self, weights):
+        with self._lock:
+            return self._locks.setdefault(weights, threading.Lock())
+
+    def get(self, weights):
+        """返回指定权重的模型，必要时加载并预热"""
+        model = self._models.get(weights)
+        if model is not None:
+            return model
+
+        with self._weights_lock(weights):
+            model = self._models.get(weights)
+            if model is not None:
+                return model
+            model = self._models[weights] = self.create(weights)
+            return model
+
+    def create(self, weights):
+        """加载并预热一个独立的模型实例（不登记、不与 get() 共享）"""
+        start = time.perf_counter()
+        model = self.loader(weights)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        dummy = np.zeros((self.warmup_size[1], self.warmup_size[0], 3), dtype=np.uint8)
+        for _ in range(self.warmup_runs):
+            model(dummy, verbose=False)
+        warmup_time = time.perf_counter() - start
+
+        self.timings[weights] = {"load_s": load_time, "warmup_s": warmup_time}
+        print(f"模型加载 {weights}: 加载 {load_time:.2f}s, 预热 {warmup_time:.2f}s")
+        return model
+
+    def preload(self, weights_list, background=True):
+        """预加载一组权重；background=True 时在守护线程中进行"""
+        def load_all():
+            for weights in weights_list:
+                self.get(weights)
+
+        if not background:
+            load_all()
+            return None
+        th = threading.Thread(target=load_all, daemon=True)
+        th.start()
+        return th
+
+    def loaded(self):
+        return list(self._models)
@@ -0,0 +1,101 @@
+import argparse
+import csv
+import time
+
+import cv2
+import numpy as np
+from scipy import stats
+
+from frame_store import open_frames
+from image_metrics import NOISE_ESTIMATORS
+
+
+def load_frames(input_dir, limit=None):
+    """按文件名顺序读取图片（与 testpicir2 相同的 IMREAD_ANYDEPTH），input_dir 也可以是帧存储"""
+    frames = open_frames(input_dir, cv2.IMREAD_ANYDEPTH)
+    names = sorted(frames.names(('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')))[:limit]
+    return [(name, frame) for name, frame in ((name, frames.get(name)) for name in names) if frame is not None]
+
+
+def synthetic_frames(count=24, size=(640, 360), seed=0):
+    """平滑背景叠加不同强度高斯噪声的合成帧（没有样本图像时使用）"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    inputs = []
+    for i in range(count):
+        base = cv2.GaussianBlur((rng.random((h, w)) * 200).astype(np.float32), (31, 31), 0)
+        sigma = 1 + 14 * i / max(count - 1, 1)
+        frame = np.clip(base + rng.normal(0, sigma, (h, w)), 0, 255).astype(np.uint8)
+        inputs.append((f"synthetic_{i:03d}_sigma{sigma:.1f}", frame))
+    return inputs
+
+
+def calibrate_noise_estimators(inputs, names, reference="dct"):
+    """
+    逐个估计器处理全部帧，与参考估计器（当前的 float64 DCT+MAD）对比
+
+    scale 为最小二乘拟合 参考值 ≈ scale x 估计值 的系数，用于量纲不同的估计器（laplacian）；
+    rel_err 为按 scale 换算后相对参考值的误差。spearman 反映排序是否一致。
+    """
+    values = {}
+    durations = {}
+    for name in dict.fromkeys([reference, *names]):
+        estimator = NOISE_ESTIMATORS[name]
+        estimator(inputs[0][1])  # 预热（FFT计划、内存分配）
+        values[name], durations[name] = [], []
+        for _, frame in inputs:
+            start = time.perf_counter()
+            values[name].append(estimator(frame))
+            durations[name].append((time.perf_counter() - start) * 1000)
+        values[name] = np.asarray(values[name], np.float64)
+
+    ref = values[reference]
+    ref_ms = np.mean(durations[reference])
+    rows = []
+    for name in dict.fromkeys([reference, *names]):
+        est = values[name]
+        scale = float(est @ ref / max(est @ est, 1e-12))
+        rel_err = np.abs(scale * est - ref) / np.maximum(np.abs(ref), 1e-12)
+        constant = np.ptp(ref) == 0 or np.ptp(est) == 0
+        rows.append({
+            'estimator': name,
+            'ms_mean': np.mean(durations[name]),
+            'speedup': ref_ms / np.mean(durations[name]),
+            'scale': scale,
+            'rel_err_median': np.median(rel_err),
+            'rel_err_max': rel_err.max(),
+            'pearson': 1.0 if constant else stats.pearsonr(est, ref)[0],
+            'spearman': 1.0 if constant else stats.spearmanr(est, ref)[0],
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='噪声估计方法的耗时与一致性校准')
+    parser.add_argument('--input_dir', default=None, help='输入文件夹或帧存储目录（不指定时使用合成帧）')
+    parser.add_argument('--estimators', default=','.join(NOISE_ESTIMATORS), help='逗号分隔的估计方法名称')
+    parser.add_argument('--limit', type=int, default=None, help='最多处理的图片数量')
+    parser.add_argument('--csv', default=None, help='结果保存为CSV')
+
+    args = parser.parse_args()
+    names = [name.strip() for name in args.estimators.split(',') if name.strip()]
+
+    inputs = load_frames(args.input_dir, args.limit) if args.input_dir else synthetic_frames()
+    if not inputs:
+        print("未找到可处理的图像文件")
+        raise SystemExit(1)
+    print(f"共 {len(inputs)} 张图像，参考方法: dct，对比: {', '.join(names)}")
+
+    rows = calibrate_noise_estimators(inputs, names)
+
+    print(f"\n{'方法':<12}{'ms/帧':>10}{'加速比':>8}{'比例系数':>10}{'误差中位':>10}{'误差最大':>10}"
+          f"{'Pearson':>10}{'Spearman':>10}")
+    for row in rows:
+        print(f"{row['estimator']:<12}{row['ms_mean']:>10.2f}{row['speedup']:>8.1f}{row['scale']:>10.4f}"
+              f"{row['rel_err_median']:>10.2%}{row['rel_err_max']:>10.2%}{row['pearson']:>10.4f}{row['spearman']:>10.4f}")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
@@ -1,55 +1,48 @@
 import argparse
 import os
 import cv2
-import numpy as np
-import matplotlib.pyplot as plt
 import time
 
+from batch_runner import StreamingBatchRunner
+from denoisers import STILL_DENOISERS
+from frame_store import FrameStoreWriter
+from image_writer import FORMATS, AsyncImageWriter
+from ir_enhancer import make_auto_enhancer
+from manifest import BatchManifest
+from stage_timer import TIMER
 
-def adjust_exposure(img, target_brightness=113, tolerance=5):
-    """自动曝光调整函数（适配RGB图像）"""
-    start_time = time.time()
 
-    # 转换到灰度图（输入为RGB格式）
-    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-    current_brightness = np.mean(gray)
+ENHANCER = make_auto_enhancer()
 
-    if abs(current_brightness - target_brightness) <= tolerance:
-        print(f"亮度正常 ({current_brightness:.1f})，不需调整")
-        return img
 
-    # 计算调整参数
-    if current_brightness < target_brightness - tolerance:
-        alpha = min(2.0, target_brightness / max(1, current_brightness))
-        beta = min(30, target_brightness - current_brightness) / 2
-        print(f"过暗 ({current_brightness:.1f})，增益 α={alpha:.2f}, β={beta:.1f}")
-    else:
-        alpha = max(0.5, target_brightness / max(1, current_brightness))
-        beta = max(-30, target_brightness - current_brightness) / 2
-        print(f"过亮 ({current_brightness:.1f})，增益 α={alpha:.2f}, β={beta:.1f}")
-
-    # 应用调整
-    adjusted = cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
+def read_image(image_path):
+    ir_image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if ir_image is None:
+        raise ValueError(f"无法读取图像: {image_path}")
+    return ir_image
 
-    print(f"曝光调整耗时: {time.time() - start_time:.4f}s")
-    return adjusted
 
+def decode_image(data, image_path):
+    """从已读取的文件内容解码（批处理时文件内容同时用于计算清单摘要）"""
+    ir_image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if ir_image is None:
+        raise ValueError(f"无法读取图像: {image_path}")
+    return ir_image
 
-def estimate_smoke_density(gray_image):
-    """优化烟雾浓度估计"""
-    small_img = cv2.resize(gray_image, (256, 256), interpolation=cv2.INTER_AREA)
-    smoothed = cv2.GaussianBlur(small_img, (3, 3), 0)
 
-    grad_x = cv2.Scharr(smoothed, cv2.CV_64F, 1, 0)
-    grad_y = cv2.Scharr(smoothed, cv2.CV_64F, 0, 1)
-    gradient_magnitude = cv2.magnitude(grad_x, grad_y)
+def enhance_for_output(ir_image, output_path, enhancer, save_steps=False):
+    """增强一帧，返回待保存的 [(路径, BGR图像)]，最终结果在最后"""
+    ir_image = enhancer.resize(ir_image)
+    outputs = []
+    if save_steps:
+        outputs.append((f"{os.path.splitext(output_path)[0]}_1_original.png", ir_image))
+    outputs.append((output_path, enhancer.enhance_resized(ir_image)))
+    return outputs
 
-    if np.max(gradient_magnitude) > 0:
-        gradient_magnitude /= np.max(gradient_magnitude)
 
-    mean_gradient = np.mean(gradient_magnitude)
-    smoke_density = (1.0 - mean_gradient) * 0.4 + 0.1
-    return np.clip(smoke_density, 0.1, 0.6)
+def save_outputs(outputs, writer, on_done=None):
+    """交给写出线程保存，返回实际输出路径"""
+    return writer.write_group(outputs, on_done)
 
 
 def enhance_infrared_image(image_path, output_path, save_steps=False):
@@ -57,47 +50,17 @@ def enhance_infrared_image(image_path, output_path, save_steps=False):
     process_start = time.time()
 
     # 读取图像
-    ir_image = cv2.imread(image_path, cv2.IMREAD_COLOR)
-    if ir_image is None:
-        raise ValueError(f"无法读取图像: {image_path}")
+    ir_image = read_image(image_path)
 
-    # 初始处理
-    ir_image = cv2.resize(cv2.cvtColor(ir_image, cv2.COLOR_BGR2RGB), (960, 540))
-    if save_steps:
-        plt.imsave(f"{os.path.splitext(output_path)[0]}_1_original.png", ir_image)
-
-    # 灰度处理
-    gray = cv2.cvtColor(ir_image, cv2.COLOR_RGB2GRAY)
-    clahe = cv2.createCLAHE(clipLimit=1.2, tileGridSize=(8, 8))
-    enhanced = clahe.apply(gray)
-
-    # 降噪
-    denoised = cv2.fastNlMeansDenoising(enhanced, None, h=7, templateWindowSize=5, searchWindowSize=5)
-
-    # 直方图拉伸
-    small_img = cv2.resize(denoised, (256, 256))
-    p_low, p_high = np.percentile(small_img, [2, 98])
-    stretched = np.clip((denoised.astype(np.float32) - p_low) * 255.0 / (p_high - p_low), 0, 255)
-
-    # 伽马校正
-    gamma = 0.7 - 0.05 * estimate_smoke_density(stretched.astype(np.uint8))
-    gamma_corrected = np.power(stretched / 255.0, gamma) * 255.0
-
-    # LAB增强
-    lab = cv2.cvtColor(gamma_corrected.astype(np.uint8), cv2.COLOR_GRAY2RGB)
-    lab = cv2.cvtColor(lab, cv2.COLOR_RGB2LAB)
-    l, a, b = cv2.split(lab)
-    l = cv2.createCLAHE(clipLimit=1.0).apply(l)
-    enhanced_lab = cv2.cvtColor(cv2.merge((l, a, b)), cv2.COLOR_LAB2RGB)
-
-    # 自动曝光调整
-    final_image = adjust_exposure(enhanced_lab)
+    # 初始处理、灰度CLAHE、降噪、拉伸、伽马、LAB增强与自动曝光
+    outputs = enhance_for_output(ir_image, output_path, ENHANCER, save_steps)
 
     # 保存结果
-    plt.imsave(output_path, final_image)
+    with AsyncImageWriter() as writer:
+        save_outputs(outputs, writer)
     process_time = time.time() - process_start
     print(f'总处理耗时: {process_time:.2f}秒')
-    return final_image, process_time
+    return cv2.cvtColor(outputs[-1][1], cv2.COLOR_BGR2RGB), process_time
 
 
 if __name__ == "__main__":
@@ -105,36 +68,81 @@ if __name__ == "__main__":
     parser.add_argument('--input_dir', required=True, help='输入文件夹路径')
     parser.add_argument('--output_dir', required=True, help='输出文件夹路径')
     parser.add_argument('--save_steps', action='store_true', help='保存处理中间步骤')
+    parser.add_argument('--timing', action='store_true', help='统计各阶段耗时并写入输出目录')
+    parser.add_argument('--denoiser', default='nlm', choices=STILL_DENOISERS,
+                        help='降噪算法（时域降噪 nlm_multi 只用于视频，不适用于单张图片）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='增强线程数')
+    parser.add_argument('--prefetch', type=int, default=8, help='预读解码的帧数')
+    parser.add_argument('--unordered', action='store_true', help='按完成顺序保存（默认按输入顺序）')
+    parser.add_argument('--force', action='store_true', help='忽略处理清单，重新处理全部图像')
+    parser.add_argument('--image_format', default='keep', choices=list(FORMATS), help='最终结果的保存格式（keep 沿用输入文件的扩展名；--save_steps 的中间步骤固定为 png）')
+    parser.add_argument('--jpeg_quality', type=int, default=95, help='JPEG/WebP 质量 (0-100)')
+    parser.add_argument('--png_compression', type=int, default=3, help='PNG 压缩级别 (0-9)')
+    parser.add_argument('--write_queue', type=int, default=16, help='写出队列长度（满时增强流水线等待）')
+    parser.add_argument('--frame_store', action='store_true',
+                        help='结果以单通道灰度追加到输出目录下的帧存储 frames/，不再逐张保存图片')
 
     args = parser.parse_args()
+    TIMER.enable(args.timing)
+    ENHANCER = make_auto_enhancer(denoiser=args.denoiser)
     os.makedirs(args.output_dir, exist_ok=True)
 
     # 支持的文件格式
     valid_exts = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
     file_list = [f for f in os.listdir(args.input_dir) if f.lower().endswith(valid_exts)]
 
-    total_time = 0.0
-    processed = 0
-
-    for filename in file_list:
-        input_path = os.path.join(args.input_dir, filename)
-        output_path = os.path.join(args.output_dir, filename)
+    def make_worker():
+        # 每个增强线程使用独立的增强器
+        enhancer = make_auto_enhancer(denoiser=args.denoiser)
 
+        def process(filename, ir_image):
+            return enhance_for_output(ir_image, os.path.join(args.output_dir, filename), enhancer, args.save_steps)
+        return process
 
-        try:
-            print(f'\n处理中: {filename}')
-            _, duration = enhance_infrared_image(input_path, output_path, args.save_steps)
-            total_time += duration
-            processed += 1
-        except Exception as e:
-            print(f'处理 {filename} 失败: {str(e)}')
+    # 输出目录中的处理清单：输入内容和参数都未变化的图像直接跳过，中断后可续跑
+    if args.frame_store:
+        # 增强结果是灰度图经LAB转换的三通道图像，帧存储只保留灰度，后续指标脚本按灰度读取时无需转换
+        writer = FrameStoreWriter(os.path.join(args.output_dir, "frames"), gray=True)
+    else:
+        writer = AsyncImageWriter(args.image_format, args.jpeg_quality, args.png_compression, args.write_queue)
+    manifest = BatchManifest(args.output_dir, {"pipeline": "ok-pi-auto", "enhancer": ENHANCER.config,
+                                               "save_steps": args.save_steps, "output": writer.config}, force=args.force)
 
-    # 输出统计信息
-    if processed > 0:
+    def read(filename):
+        input_path = os.path.join(args.input_dir, filename)
+        skip, datas = manifest.check(filename, input_path)
+        if skip:
+            return StreamingBatchRunner.SKIP
+        return decode_image(datas[0], input_path)
+
+    def write(filename, outputs):
+        # 文件真正落盘后才记入清单
+        save_outputs(outputs, writer, lambda paths: manifest.record(filename, paths))
+
+    # 读取 / 增强 / 保存 三段流水并行
+    runner = StreamingBatchRunner(
+        read=read,
+        make_worker=make_worker,
+        write=write,
+        workers=args.workers,
+        prefetch=args.prefetch,
+        ordered=not args.unordered,
+    )
+    runner.run(file_list)
+    writer.close()
+    manifest.close()
+
+    if file_list:
         print(f"\n{'=' * 40}")
-        print(f"处理完成: 成功 {processed}/{len(file_list)}")
-        print(f"总耗时: {total_time:.2f}秒 | 平均: {total_time / processed:.2f}秒/张")
+        print(runner.format_report())
+        print(manifest.format_report(len(file_list)))
+        print(writer.format_stats())
         print(f"输出目录: {os.path.abspath(args.output_dir)}")
         print('=' * 40)
     else:
-        print("未找到可处理的图像文件")
\ No newline at end of file
+        print("未找到可处理的图像文件")
+
+    if TIMER.enabled:
+        print(TIMER.report())
+        TIMER.write_csv(os.path.join(args.output_dir, "stage_timing.csv"))
+        TIMER.write_json(os.path.join(args.output_dir, "stage_timing.json"))
\ No newline at end of file
@@ -1,77 +1,68 @@
 import argparse
 import os
 import cv2
-import numpy as np
-import matplotlib.pyplot as plt
 import time
 
+from batch_runner import StreamingBatchRunner
+from denoisers import STILL_DENOISERS
+from frame_store import FrameStoreWriter
+from image_writer import FORMATS, AsyncImageWriter
+from ir_enhancer import make_default_enhancer
+from manifest import BatchManifest
+from stage_timer import TIMER
 
-def estimate_smoke_density(gray_image):
-    """优化后的烟雾浓度估计函数"""
-    small_img = cv2.resize(gray_image, (256, 256), interpolation=cv2.INTER_AREA)
-    smoothed = cv2.GaussianBlur(small_img, (3, 3), 0)
 
-    grad_x = cv2.Scharr(smoothed, cv2.CV_64F, 1, 0)
-    grad_y = cv2.Scharr(smoothed, cv2.CV_64F, 0, 1)
-    gradient_magnitude = cv2.magnitude(grad_x, grad_y)
+ENHANCER = make_default_enhancer()
 
-    if np.max(gradient_magnitude) > 0:
-        gradient_magnitude /= np.max(gradient_magnitude)
-
-    mean_gradient = np.mean(gradient_magnitude)
-    smoke_density = (1.0 - mean_gradient) * 0.4 + 0.1
-    return np.clip(smoke_density, 0.1, 0.6)
 
+def read_image(image_path):
+    ir_image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if ir_image is None:
+        raise ValueError(f"无法读取图像: {image_path}")
+    return ir_image
 
-def enhance_infrared_image(image_path, output_path, save_steps=False):
-    smoke_n = 0.5  # 可以视情况调整
 
-    # 只计算处理时间（不包括I/O）
-    process_start = time.time()
-
-    # 读取图像不计入处理时间
-    ir_image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+def decode_image(data, image_path):
+    """从已读取的文件内容解码（批处理时文件内容同时用于计算清单摘要）"""
+    ir_image = cv2.imdecode(data, cv2.IMREAD_COLOR)
     if ir_image is None:
         raise ValueError(f"无法读取图像: {image_path}")
+    return ir_image
 
-    ir_image = cv2.resize(cv2.cvtColor(ir_image, cv2.COLOR_BGR2RGB),
-                          (960, 540), interpolation=cv2.INTER_AREA)
 
+def enhance_for_output(ir_image, output_path, enhancer, save_steps=False):
+    """增强一帧，返回待保存的 [(路径, BGR图像)]，最终结果在最后"""
+    ir_image = enhancer.resize(ir_image)
+    outputs = []
     if save_steps:
-        plt.imsave(f"{os.path.splitext(output_path)[0]}_1_original.png", ir_image)
+        outputs.append((f"{os.path.splitext(output_path)[0]}_1_original.png", ir_image))
+    outputs.append((output_path, enhancer.enhance_resized(ir_image)))
+    return outputs
 
-    gray = cv2.cvtColor(ir_image, cv2.COLOR_RGB2GRAY)
 
-    clahe = cv2.createCLAHE(clipLimit=1.2, tileGridSize=(8, 8))
-    enhanced = clahe.apply(gray)
+def save_outputs(outputs, writer, on_done=None):
+    """交给写出线程保存，返回实际输出路径"""
+    return writer.write_group(outputs, on_done)
 
-    denoised = cv2.fastNlMeansDenoising(
-        enhanced, None, h=7,
-        templateWindowSize=5,
-        searchWindowSize=5
-    )
 
-    small_img = cv2.resize(denoised, (256, 256), interpolation=cv2.INTER_AREA)
-    p_low, p_high = np.percentile(small_img, [2, 98])
-    stretched = np.clip((denoised.astype(np.float32) - p_low) * 255.0 / (p_high - p_low), 0, 255)
+def enhance_infrared_image(image_path, output_path, save_steps=False):
+    # 读取图像不计入处理时间
+    ir_image = read_image(image_path)
 
-    gamma = 0.7 - 0.05 * smoke_n
-    gamma_corrected = np.power(stretched / 255.0, gamma) * 255.0
+    # 只计算处理时间（不包括I/O）
+    process_start = time.time()
 
-    lab = cv2.cvtColor(gamma_corrected.astype(np.uint8), cv2.COLOR_GRAY2RGB)
-    lab = cv2.cvtColor(lab, cv2.COLOR_RGB2LAB)
-    l, a, b = cv2.split(lab)
-    l = cv2.createCLAHE(clipLimit=1.0).apply(l)
-    enhanced_lab = cv2.cvtColor(cv2.merge((l, a, b)), cv2.COLOR_LAB2RGB)
+    outputs = enhance_for_output(ir_image, output_path, ENHANCER, save_steps)
 
     # 处理结束时间点（保存前）
     process_time = time.time() - process_start
 
     # 保存图像不计入处理时间
-    plt.imsave(output_path, enhanced_lab)
+    with AsyncImageWriter() as writer:
+        save_outputs(outputs, writer)
 
     print(f'处理完成 {os.path.basename(image_path)}，处理耗时: {process_time:.2f}秒')
-    return enhanced_lab, process_time
+    return cv2.cvtColor(outputs[-1][1], cv2.COLOR_BGR2RGB), process_time
 
 
 if __name__ == "__main__":
@@ -79,40 +70,83 @@ if __name__ == "__main__":
     parser.add_argument('--input_dir', type=str, required=True, help='输入文件夹路径')
     parser.add_argument('--output_dir', type=str, required=True, help='输出文件夹路径')
     parser.add_argument('--save_steps', action='store_true', help='是否保存中间步骤')
+    parser.add_argument('--timing', action='store_true', help='统计各阶段耗时并写入输出目录')
+    parser.add_argument('--denoiser', type=str, default='nlm', choices=STILL_DENOISERS,
+                        help='降噪算法（时域降噪 nlm_multi 只用于视频，不适用于单张图片）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='增强线程数')
+    parser.add_argument('--prefetch', type=int, default=8, help='预读解码的帧数')
+    parser.add_argument('--unordered', action='store_true', help='按完成顺序保存（默认按输入顺序）')
+    parser.add_argument('--force', action='store_true', help='忽略处理清单，重新处理全部图像')
+    parser.add_argument('--image_format', default='keep', choices=list(FORMATS), help='最终结果的保存格式（keep 沿用输入文件的扩展名；--save_steps 的中间步骤固定为 png）')
+    parser.add_argument('--jpeg_quality', type=int, default=95, help='JPEG/WebP 质量 (0-100)')
+    parser.add_argument('--png_compression', type=int, default=3, help='PNG 压缩级别 (0-9)')
+    parser.add_argument('--write_queue', type=int, default=16, help='写出队列长度（满时增强流水线等待）')
+    parser.add_argument('--frame_store', action='store_true',
+                        help='结果以单通道灰度追加到输出目录下的帧存储 frames/，不再逐张保存图片')
 
     args = parser.parse_args()
+    TIMER.enable(args.timing)
+    ENHANCER = make_default_enhancer(denoiser=args.denoiser)
 
     # 创建输出目录
     os.makedirs(args.output_dir, exist_ok=True)
 
     # 支持的文件格式
     supported_formats = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+    file_list = [f for f in os.listdir(args.input_dir) if f.lower().endswith(supported_formats)]
+
+    def make_worker():
+        # 每个增强线程使用独立的增强器
+        enhancer = make_default_enhancer(denoiser=args.denoiser)
 
-    # 初始化统计变量
-    total_process_time = 0.0
-    processed_count = 0
-
-    # 遍历输入目录
-    for filename in os.listdir(args.input_dir):
-        if filename.lower().endswith(supported_formats):
-            input_path = os.path.join(args.input_dir, filename)
-            output_path = os.path.join(args.output_dir, filename)
-
-            try:
-                print(f'\n正在处理: {filename}')
-                _, process_time = enhance_infrared_image(input_path, output_path, args.save_steps)
-                total_process_time += process_time
-                processed_count += 1
-            except Exception as e:
-                print(f'处理 {filename} 时发生错误: {str(e)}')
-
-    # 输出统计信息
-    if processed_count > 0:
+        def process(filename, ir_image):
+            return enhance_for_output(ir_image, os.path.join(args.output_dir, filename), enhancer, args.save_steps)
+        return process
+
+    # 输出目录中的处理清单：输入内容和参数都未变化的图像直接跳过，中断后可续跑
+    if args.frame_store:
+        # 增强结果是灰度图经LAB转换的三通道图像，帧存储只保留灰度，后续指标脚本按灰度读取时无需转换
+        writer = FrameStoreWriter(os.path.join(args.output_dir, "frames"), gray=True)
+    else:
+        writer = AsyncImageWriter(args.image_format, args.jpeg_quality, args.png_compression, args.write_queue)
+    manifest = BatchManifest(args.output_dir, {"pipeline": "ok-pi", "enhancer": ENHANCER.config,
+                                               "save_steps": args.save_steps, "output": writer.config}, force=args.force)
+
+    def read(filename):
+        input_path = os.path.join(args.input_dir, filename)
+        skip, datas = manifest.check(filename, input_path)
+        if skip:
+            return StreamingBatchRunner.SKIP
+        return decode_image(datas[0], input_path)
+
+    def write(filename, outputs):
+        # 文件真正落盘后才记入清单
+        save_outputs(outputs, writer, lambda paths: manifest.record(filename, paths))
+
+    # 读取 / 增强 / 保存 三段流水并行：读取线程预读解码，多个增强线程，保存线程写出
+    runner = StreamingBatchRunner(
+        read=read,
+        make_worker=make_worker,
+        write=write,
+        workers=args.workers,
+        prefetch=args.prefetch,
+        ordered=not args.unordered,
+    )
+    runner.run(file_list)
+    writer.close()
+    manifest.close()
+
+    # 输出统计信息：吞吐量与各阶段利用率
+    if file_list:
         print(f"\n{'=' * 40}")
-        print(f"总处理图片数量: {processed_count}张")
-        print(f"总处理时间: {total_process_time:.2f}秒")
-        print(f"平均每张处理时间: {total_process_time / processed_count:.2f}秒")
-        print(f"处理速度: {processed_count / total_process_time:.2f} FPS")
+        print(runner.format_report())
+        print(manifest.format_report(len(file_list)))
+        print(writer.format_stats())
         print('=' * 40)
     else:
-        print("没有找到可处理的图像文件")
\ No newline at end of file
+        print("没有找到可处理的图像文件")
+
+    if TIMER.enabled:
+        print(TIMER.report())
+        TIMER.write_csv(os.path.join(args.output_dir, "stage_timing.csv"))
+        TIMER.write_json(os.path.join(args.output_dir, "stage_timing.json"))
\ No newline at end of file
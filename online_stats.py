@@ -0,0 +1,217 @@
+import json
+import math
+
+# 分位数的默认相对误差：0.1% 时 p50/p95 在两次报告之间的小幅变化仍能分辨，
+# 桶数约为 ln(最大值/最小值) / 0.002，对单个指标的数值跨度仍只有几千个
+DEFAULT_ALPHA = 0.001
+
+
+class QuantileSketch:
+    """
+    相对误差有界的可合并分位数草图（DDSketch 的简化实现）
+
+    数值按对数划分的桶计数，桶数只与数值的数量级跨度有关，与样本数无关；
+    估计的分位数与真实值的相对误差不超过 alpha。两个草图按桶相加即可合并，
+    合并结果与把两批数据一起加入完全相同。
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _key(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value):
+        if value > 0:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + 1
+        elif value < 0:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + 1
+        else:
+            self.zeros += 1
+        self.count += 1
+
+    def quantile(self, q):
+        """q 取 0~1；没有数据时返回 nan"""
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+    def merge(self, other):
+        if other.alpha != self.alpha:
+            raise ValueError(f"分位数草图精度不同，无法合并: {self.alpha} / {other.alpha}")
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def to_dict(self):
+        return {"alpha": self.alpha, "zeros": self.zeros, "count": self.count,
+                "positive": {str(k): v for k, v in self.positive.items()},
+                "negative": {str(k): v for k, v in self.negative.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["alpha"])
+        sketch.zeros = data["zeros"]
+        sketch.count = data["count"]
+        sketch.positive = {int(k): v for k, v in data["positive"].items()}
+        sketch.negative = {int(k): v for k, v in data["negative"].items()}
+        return sketch
+
+
+class RunningStat:
+    """
+    单个指标的在线统计：Welford 均值/方差、最小/最大值及其文件名、分位数草图
+
+    内存占用与样本数无关。非有限值（nan、inf）只计入 skipped，不参与统计。
+    merge() 按 Chan 的并行公式合并另一份统计，结果与一次性统计全部数据相同（浮点误差内）。
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.argmin = None
+        self.argmax = None
+        self.skipped = 0
+        self.sketch = QuantileSketch(alpha)
+
+    def add(self, value, name=None):
+        value = float(value)
+        if not math.isfinite(value):
+            self.skipped += 1
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min, self.argmin = value, name
+        if value > self.max:
+            self.max, self.argmax = value, name
+        self.sketch.add(value)
+
+    @property
+    def variance(self):
+        """总体方差（ddof=0）"""
+        return self.m2 / self.count if self.count else math.nan
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def merge(self, other):
+        if other.count:
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta * delta * self.count * other.count / total
+            self.mean += delta * other.count / total
+            self.count = total
+            if other.min < self.min:
+                self.min, self.argmin = other.min, other.argmin
+            if other.max > self.max:
+                self.max, self.argmax = other.max, other.argmax
+        self.skipped += other.skipped
+        self.sketch.merge(other.sketch)
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "m2": self.m2, "skipped": self.skipped,
+                "min": self.min if self.count else None, "argmin": self.argmin,
+                "max": self.max if self.count else None, "argmax": self.argmax,
+                "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        stat = cls()
+        stat.count = data["count"]
+        stat.mean = data["mean"]
+        stat.m2 = data["m2"]
+        stat.skipped = data["skipped"]
+        if stat.count:
+            stat.min, stat.argmin = data["min"], data["argmin"]
+            stat.max, stat.argmax = data["max"], data["argmax"]
+        stat.sketch = QuantileSketch.from_dict(data["sketch"])
+        return stat
+
+
+class MetricAggregator:
+    """
+    按行汇总指标报告：add(row) 对 row 中除 name_key 外的每一列更新一个 RunningStat
+
+    save() / load() 以JSON保存部分统计，多次运行或多台机器的结果可以 merge() 后再出报告。
+    """
+
+    def __init__(self, name_key="filename", alpha=DEFAULT_ALPHA):
+        self.name_key = name_key
+        self.alpha = alpha
+        self.stats = {}
+        self.rows = 0
+
+    def add(self, row):
+        name = row.get(self.name_key)
+        for key, value in row.items():
+            if key == self.name_key:
+                continue
+            stat = self.stats.get(key)
+            if stat is None:
+                stat = self.stats[key] = RunningStat(self.alpha)
+            stat.add(value, name)
+        self.rows += 1
+
+    def __getitem__(self, key):
+        return self.stats[key]
+
+    def merge(self, other):
+        """把 other 的统计合并进来（other 不会被修改，之后也不与本对象共享状态）"""
+        for key, stat in other.stats.items():
+            mine = self.stats.get(key)
+            if mine is None:
+                mine = self.stats[key] = RunningStat(stat.sketch.alpha)
+            mine.merge(stat)
+        self.rows += other.rows
+
+    def to_dict(self):
+        return {"name_key": self.name_key, "alpha": self.alpha, "rows": self.rows,
+                "stats": {key: stat.to_dict() for key, stat in self.stats.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregator = cls(data["name_key"], data["alpha"])
+        aggregator.rows = data["rows"]
+        aggregator.stats = {key: RunningStat.from_dict(stat) for key, stat in data["stats"].items()}
+        return aggregator
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
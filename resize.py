@@ -1,27 +1,128 @@
+import argparse
+import os
+
 import cv2
 
+from batch_runner import StreamingBatchRunner
+from image_writer import AsyncImageWriter
+from manifest import BatchManifest, read_bytes
+
+INTERPOLATIONS = {
+    "linear": cv2.INTER_LINEAR,
+    "area": cv2.INTER_AREA,
+    "cubic": cv2.INTER_CUBIC,
+    "nearest": cv2.INTER_NEAREST,
+}
 
-def resize_image(input_path, output_path):
+
+def resize_image(input_path, output_path, size=(256, 256)):
     """
     最简单的图片resize功能
     参数:
         input_path: 输入图片路径
         output_path: 输出图片路径
+        size: 目标尺寸 (宽, 高)
     """
     # 读取图片
     img = cv2.imread(input_path)
     if img is None:
         raise ValueError("无法读取图片，请检查路径")
 
-    # 调整尺寸为960x540
-    resized_img = cv2.resize(img, (256, 256))
+    # 调整尺寸
+    resized_img = cv2.resize(img, size)
 
     # 保存结果
     cv2.imwrite(output_path, resized_img)
 
 
-# 使用示例
-input_image = "wuxi_2_2697 (2).jpg"  # 替换为你的输入图片路径
-output_image = "resize_wuxi_2_2697(2).jpg"  # 替换为你的输出图片路径
+def parse_sizes(text):
+    """'960x540,640x360' -> [(960, 540), (640, 360)]"""
+    sizes = []
+    for item in text.split(','):
+        if item.strip():
+            w, h = item.lower().split('x')
+            sizes.append((int(w), int(h)))
+    return sizes
+
+
+def size_dir(output_dir, size):
+    return os.path.join(output_dir, f"{size[0]}x{size[1]}")
+
+
+def resize_to_sizes(img, sizes, interpolation=cv2.INTER_LINEAR):
+    """同一张已解码的图片缩放到多个尺寸，返回 [(尺寸, 图片)]"""
+    return [(size, cv2.resize(img, size, interpolation=interpolation)) for size in sizes]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='批量多尺寸缩放：每张图只解码一次，同时输出多个尺寸')
+    parser.add_argument('--input_dir', required=True, help='输入文件夹路径')
+    parser.add_argument('--output_dir', required=True, help='输出文件夹路径（每个尺寸一个子目录，如 960x540/）')
+    parser.add_argument('--sizes', default='960x540,640x360,256x256',
+                        help='逗号分隔的目标尺寸（增强 960x540、融合 640x360、烟雾浓度 256x256）')
+    parser.add_argument('--interpolation', default='linear', choices=list(INTERPOLATIONS),
+                        help='插值方法（linear 与 resize_image 一致；缩小时 area 质量更好）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='缩放线程数')
+    parser.add_argument('--prefetch', type=int, default=8, help='预读解码的帧数')
+    parser.add_argument('--jpeg_quality', type=int, default=95, help='JPEG 质量 (0-100)')
+    parser.add_argument('--png_compression', type=int, default=3, help='PNG 压缩级别 (0-9)')
+    parser.add_argument('--force', action='store_true', help='忽略处理清单，重新生成全部尺寸')
+
+    args = parser.parse_args()
+    sizes = parse_sizes(args.sizes)
+    interpolation = INTERPOLATIONS[args.interpolation]
+
+    valid_exts = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+    file_list = sorted(f for f in os.listdir(args.input_dir) if f.lower().endswith(valid_exts))
+
+    # 每个尺寸的输出目录各有一份处理清单，新增尺寸时已有尺寸不会重做
+    writer = AsyncImageWriter(jpeg_quality=args.jpeg_quality, png_compression=args.png_compression)
+    manifests = {}
+    for size in sizes:
+        os.makedirs(size_dir(args.output_dir, size), exist_ok=True)
+        manifests[size] = BatchManifest(size_dir(args.output_dir, size),
+                                        {"pipeline": "resize", "size": size, "interpolation": args.interpolation,
+                                         "output": writer.config}, force=args.force)
+
+    def read(filename):
+        input_path = os.path.join(args.input_dir, filename)
+        # 先按文件大小/修改时间快速判断，只有需要时才读取文件
+        pending = [size for size in sizes if not manifests[size].is_current(filename, input_path)]
+        if not pending:
+            return StreamingBatchRunner.SKIP
+        data = read_bytes(input_path)
+        pending = [size for size in pending if not manifests[size].is_current(filename, input_path, [data])]
+        if not pending:
+            return StreamingBatchRunner.SKIP
+        img = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError(f"无法读取图像: {input_path}")
+        return img, pending
+
+    def make_worker():
+        def process(filename, data):
+            img, pending = data
+            return resize_to_sizes(img, pending, interpolation)
+        return process
+
+    def write(filename, outputs):
+        for size, resized in outputs:
+            writer.write(os.path.join(size_dir(args.output_dir, size), filename), resized,
+                         lambda paths, m=manifests[size]: m.record(filename, paths))
+
+    runner = StreamingBatchRunner(read=read, make_worker=make_worker, write=write,
+                                  workers=args.workers, prefetch=args.prefetch)
+    runner.run(file_list)
+    writer.close()
+    for manifest in manifests.values():
+        manifest.close()
 
-resize_image(input_image, output_image)
\ No newline at end of file
+    if file_list:
+        print(f"\n{'=' * 40}")
+        print(runner.format_report())
+        for size, manifest in manifests.items():
+            print(f"{size[0]}x{size[1]}: {manifest.format_report(len(file_list))}")
+        print(writer.format_stats())
+        print('=' * 40)
+    else:
+        print("没有找到可处理的图像文件")
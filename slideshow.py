@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+
+import cv2
+
+from frame_pipeline import FrameQueue, StageStats
+from manifest import params_hash
+
+
+class SlideshowPrefetcher:
+    """
+    文件夹轮播的后台预取器
+
+    生产线程按播放顺序预读图片，攒够 batch_size 张后调用 process_batch
+    （增强 + 批量推理），结果放入容量为 buffer_size 的有界缓冲区。
+    GUI 计时器只调用 next_ready() 取出已经处理完的帧，不在GUI线程做任何计算。
+
+    process_batch(frames) 接收BGR帧列表，返回等长的显示帧列表。
+
+    给出 cache（FrameCache）时，处理结果按 (文件路径, 修改时间, 参数摘要) 缓存，
+    参数由 cache_params() 给出（如模型权重、置信度阈值）。循环播放的第二圈起
+    命中缓存的图片不再读取、增强和推理，直接进入显示缓冲区。
+
+    循环播放时如果一整圈都没有读到可显示的帧（文件全部损坏或被删除），
+    等待 retry_interval 秒后再重试下一圈，不在后台空转。
+    """
+
+    def __init__(self, image_files, process_batch, batch_size=4, buffer_size=16, loop=True,
+                 cache=None, cache_params=None, retry_interval=1.0):
+        self.image_files = list(image_files)
+        self.process_batch = process_batch
+        self.batch_size = max(1, batch_size)
+        self.loop = loop
+        self.cache = cache
+        self.cache_params = cache_params
+        self.retry_interval = retry_interval
+        self.buffer = FrameQueue(buffer_size, policy="block")
+        self.stats = StageStats("prefetch")
+        self.shown = 0
+        self.late = 0
+        self.dropped = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lap_frames = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.buffer.close()
+        if self._thread is not None:
+            self._thread.join(1.0)
+
+    def _indices(self):
+        while not self._stop.is_set():
+            self._lap_frames = 0
+            yield from range(len(self.image_files))
+            if not self.loop:
+                return
+            if self._lap_frames == 0:
+                print(f"{len(self.image_files)} 张图片都无法加载，{self.retry_interval:g}秒后重试")
+                self._stop.wait(self.retry_interval)
+
+    def _cache_key(self, index):
+        path = self.image_files[index]
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        params = params_hash(self.cache_params()) if self.cache_params is not None else ""
+        return path, mtime, params
+
+    def _produce(self):
+        batch = []
+        for index in self._indices():
+            if self._stop.is_set():
+                break
+            key = self._cache_key(index) if self.cache is not None else None
+            cached = self.cache.get(key) if key is not None else None
+            if cached is not None:
+                self._lap_frames += 1
+                # 命中缓存只需显示；先把之前攒下的批次处理掉以保持播放顺序
+                if batch:
+                    self._flush(batch)
+                    batch = []
+                if not self.buffer.put((index, cached)):
+                    break
+                continue
+            frame = cv2.imread(self.image_files[index], cv2.IMREAD_COLOR)
+            if frame is None:
+                print(f"无法加载图片: {self.image_files[index]}")
+                self.dropped += 1
+                continue
+            self._lap_frames += 1
+            batch.append((index, frame, key))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch and not self._stop.is_set():
+            self._flush(batch)
+        self.buffer.close()
+
+    def _flush(self, batch):
+        start = time.perf_counter()
+        outputs = self.process_batch([frame for _, frame, _ in batch])
+        duration = (time.perf_counter() - start) / len(batch)
+        for (index, _, key), output in zip(batch, outputs):
+            self.stats.record(duration)
+            if key is not None:
+                self.cache.put(key, output)
+            if not self.buffer.put((index, output)):
+                return
+
+    def next_ready(self):
+        """取出下一张已处理好的帧 (index, frame)；尚未就绪时记为一次迟到并返回 None"""
+        item = self.buffer.get(timeout=0)
+        if item is None:
+            if not self.buffer.closed:
+                self.late += 1
+            return None
+        self.shown += 1
+        return item
+
+    def format_stats(self):
+        text = (f"已显示 {self.shown} 帧, 迟到 {self.late} 次, 丢弃 {self.dropped} 帧, "
+                f"缓冲 {self.buffer.depth()}/{self.buffer.maxsize}, "
+                f"处理 {self.stats.fps():.1f}fps ({self.stats.snapshot()['avg_ms']:.1f}ms/帧)")
+        if self.cache is not None:
+            text += f", {self.cache.format_stats()}"
+        return text
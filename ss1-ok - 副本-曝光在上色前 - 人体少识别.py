@@ -1,20 +1,98 @@
 import cv2
 import numpy as np
 import time
+import argparse
+import collections
 import concurrent.futures
+import functools
+import itertools
 import os
 
+from fire_classifier import FireColorLUT, hsv_fire_mask
+from frame_pool import ProcessFrameRunner
+from frame_store import FrameStoreWriter
+from manifest import BatchManifest, read_bytes
+from stage_timer import TIMER, stage, timed
 
-def highlight_human_regions_from_fused(fused_image, thermal_path, output_size=(640, 360)):
+
+def gain_lut(*gains):
+    """依次乘以各增益并截断为 uint8 的查找表，与逐步 float32 相乘、clip、astype 的结果一致"""
+    lut = np.arange(256, dtype=np.uint8)
+    for gain in gains:
+        lut = np.clip(lut.astype(np.float32) * gain, 0, 255).astype(np.uint8)
+    return lut
+
+
+def hsv_lut(s_lut=None, v_lut=None):
+    """组合为 HSV 三通道查找表（色调不变），可用一次 cv2.LUT 完成"""
+    identity = np.arange(256, dtype=np.uint8)
+    return cv2.merge([identity, identity if s_lut is None else s_lut,
+                      identity if v_lut is None else v_lut]).reshape(1, 256, 3)
+
+
+def apply_hsv_lut(img, lut):
+    """BGR -> HSV -> 查表 -> BGR，返回 (BGR图像, HSV图像)"""
+    hsv = cv2.LUT(cv2.cvtColor(img, cv2.COLOR_BGR2HSV), lut)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR), hsv
+
+
+# 上色后的亮度增强 / 可见性增强 / 两者合成
+BRIGHTEN_LUT = hsv_lut(v_lut=gain_lut(1.3))
+VISIBILITY_LUT = hsv_lut(s_lut=gain_lut(1.85), v_lut=gain_lut(1.4))
+COLOR_STAGE_LUT = hsv_lut(s_lut=gain_lut(1.85), v_lut=gain_lut(1.3, 1.4))
+
+# 区域分类标志位
+REGION_HUMAN = 1
+REGION_POTENTIAL = 2
+REGION_HUMAN_SHAPE = 4
+REGION_POTENTIAL_ISOLATED = 8
+
+
+def label_contour_regions(contours, shape):
+    """
+    逐个填充外轮廓，得到标签图：背景为0，第 i 个轮廓的填充区域为 i + 1
+
+    RETR_EXTERNAL 的填充区域互不重叠，每个像素只属于一个轮廓。
+    轮廓不超过255个时使用 uint8 标签，便于之后直接用 cv2.LUT / cv2.calcHist。
+    """
+    region_labels = np.zeros(shape, np.uint8 if len(contours) < 256 else np.uint16)
+    for index, cnt in enumerate(contours):
+        cv2.drawContours(region_labels, [cnt], -1, index + 1, -1)
+    return region_labels
+
+
+def region_counts(region_labels, num_labels, mask=None):
+    """统计每个标签的像素数（给出 mask 时只统计 mask 内的像素）"""
+    if region_labels.dtype == np.uint8:
+        hist = cv2.calcHist([region_labels], [0], mask, [num_labels], [0, num_labels])
+        return hist.ravel().astype(np.int64)
+    if mask is not None:
+        return np.bincount(region_labels[mask > 0], minlength=num_labels)
+    return np.bincount(region_labels.ravel(), minlength=num_labels)
+
+
+def region_mask(region_labels, region_class, flag):
+    """按区域分类查表生成掩码：分类含 flag 的区域为 255"""
+    lut = np.where(region_class & flag, 255, 0).astype(np.uint8)
+    if region_labels.dtype == np.uint8:
+        return cv2.LUT(region_labels, lut)
+    return lut[region_labels]
+
+
+@timed("highlight_human_regions_from_fused")
+def highlight_human_regions_from_fused(fused_image, thermal_path, output_size=(640, 360), brighten=True):
     """处理已融合图像和热成像图，执行人体检测和上色操作"""
     # 1. 图像预处理
-    if isinstance(fused_image, str):  # 如果传入的是路径
-        fused_image = cv2.resize(cv2.imread(fused_image), output_size)
-    else:  # 否则假设已经是图像对象
-        fused_image = cv2.resize(fused_image, output_size)
+    with stage("highlight_human_regions_from_fused.load"):
+        if isinstance(fused_image, str):  # 如果传入的是路径
+            fused_image = cv2.resize(cv2.imread(fused_image), output_size)
+        else:  # 否则假设已经是图像对象
+            fused_image = cv2.resize(fused_image, output_size)
 
-    thermal = cv2.resize(cv2.imread(thermal_path, 0), output_size)
-    start_time = time.time()
+        if isinstance(thermal_path, str):  # 如果传入的是路径
+            thermal = cv2.resize(cv2.imread(thermal_path, 0), output_size)
+        else:  # 否则假设已经是灰度图像对象
+            thermal = cv2.resize(thermal_path, output_size)
 
     # 2. 热成像增强（优化CLAHE参数）
     clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
@@ -34,36 +112,38 @@ def highlight_human_regions_from_fused(fused_image, thermal_path, output_size=(6
 
     # 5. 人体区域分析 - 增强人体检测
     contours, _ = cv2.findContours(high_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    human_mask = np.zeros_like(high_mask)
-    extreme_mask = (thermal_enhanced > threshold_extreme).astype(np.uint8) * 255
+    contours = [cnt for cnt in contours if cv2.contourArea(cnt) >= 600]  # 略微降低面积阈值
 
-    # 增加一个辅助区域掩码，用于捕获可能的人体区域
-    potential_human_mask = np.zeros_like(high_mask)
+    # 一次标记得到每个候选轮廓的填充区域，像素面积/极高温像素数/平均强度都由标签统计得到
+    region_labels = label_contour_regions(contours, high_mask.shape)
+    num_labels = len(contours) + 1
+    extreme_mask = (thermal_enhanced > threshold_extreme).astype(np.uint8) * 255
+    extreme_counts = region_counts(region_labels, num_labels, extreme_mask)
+    region_areas = None
+    region_intensity = None
 
-    # 新增：用于人形识别的掩码
-    human_shape_mask = np.zeros_like(high_mask)
+    # 每个区域的分类结果（按位记录：人体 / 潜在人体 / 人形 / 孤立的潜在人体），下标即标签
+    region_class = np.zeros(max(num_labels, 256), np.uint8)
 
-    for cnt in contours:
+    for label, cnt in enumerate(contours, 1):
         area = cv2.contourArea(cnt)
-        if area < 600: continue  # 略微降低面积阈值
+        x, y, w, h = cv2.boundingRect(cnt)
 
         # 添加：针对小目标（如安全出口）的额外检查
         if area < 350:  # 较小的目标需要额外检查
-            x, y, w, h = cv2.boundingRect(cnt)
-
             # 计算实心度 - 轮廓面积与其凸包面积的比率
             # 安全出口通常具有较高的实心度（非常紧凑）
             hull = cv2.convexHull(cnt)
             hull_area = cv2.contourArea(hull)
             solidity = float(area) / hull_area if hull_area > 0 else 0
 
-            # 计算强度指标
-            contour_mask = np.zeros_like(thermal_enhanced)
-            cv2.drawContours(contour_mask, [cnt], -1, 255, -1)
-
-            # 获取区域的平均强度
-            region_pixels = cv2.bitwise_and(thermal_enhanced, thermal_enhanced, mask=contour_mask)
-            mean_intensity = np.mean(region_pixels[contour_mask > 0]) if np.any(contour_mask > 0) else 0
+            # 获取区域的平均强度（所有区域一次性统计）
+            if region_intensity is None:
+                region_areas = region_counts(region_labels, num_labels)
+                region_intensity = (np.bincount(region_labels.ravel(), weights=thermal_enhanced.ravel(),
+                                                minlength=num_labels)
+                                    / np.maximum(region_areas, 1))
+            mean_intensity = region_intensity[label]
 
             # 安全出口通常具有以下特征:
             # 1. 较小
@@ -76,7 +156,6 @@ def highlight_human_regions_from_fused(fused_image, thermal_path, output_size=(6
                 continue  # 跳过这个区域 - 可能是安全出口或类似的小物体
 
         # 快速形状判断
-        x, y, w, h = cv2.boundingRect(cnt)
         aspect_ratio = max(w, h) / (min(w, h) + 1e-5)
         if aspect_ratio > 3.6: continue
 
@@ -91,7 +170,7 @@ def highlight_human_regions_from_fused(fused_image, thermal_path, output_size=(6
                 compactness < 3.5 and  # 人体轮廓相对规则
                 w >= 20):  # 人的宽度通常不会太窄
             is_human_shape = True
-            cv2.drawContours(human_shape_mask, [cnt], -1, 255, -1)
+            region_class[label] |= REGION_HUMAN_SHAPE
 
         # 专门针对竖直烟雾的检测 - 修改为更精确的判别
         # 烟雾通常非常细长且宽度较小，而站立的人则宽度较大
@@ -108,9 +187,7 @@ def highlight_human_regions_from_fused(fused_image, thermal_path, output_size=(6
             continue  # 跳过确认为烟雾的区域
 
         # 极高温区域检测
-        contour_mask = np.zeros_like(extreme_mask)
-        cv2.drawContours(contour_mask, [cnt], -1, 255, -1)
-        extreme_ratio = np.sum(extreme_mask & contour_mask) / (area * 255 + 1e-5)
+        extreme_ratio = extreme_counts[label] * 255 / (area * 255 + 1e-5)
 
         # 判断是否是人体的规则 - 增强版
         is_human = False
@@ -126,11 +203,21 @@ def highlight_human_regions_from_fused(fused_image, thermal_path, output_size=(6
             is_human = True
         # 捕获可能是人体但极高温比例略高的边缘情况
         elif extreme_ratio < 0.62 and area > 300 and aspect_ratio < 2.0:
-            cv2.drawContours(potential_human_mask, [cnt], -1, 255, -1)
+            region_class[label] |= REGION_POTENTIAL
+            # 即使不与人体相连也保留的潜在区域：足够大，或者具有类似人体的比例
+            if region_areas is None:
+                region_areas = region_counts(region_labels, num_labels)
+            component_area = region_areas[label]
+            if (component_area > 400 or
+                    (h > 2 * w and w >= 20 and h >= 60)):
+                region_class[label] |= REGION_POTENTIAL_ISOLATED
 
         # 如果判断为人体，添加到人体掩码
         if is_human:
-            cv2.drawContours(human_mask, [cnt], -1, 255, -1)
+            region_class[label] |= REGION_HUMAN
+
+    # 各掩码都由标签图经分类查找表一次得到
+    human_mask = region_mask(region_labels, region_class, REGION_HUMAN)
 
     # 6. 掩码优化与增强
 
@@ -139,36 +226,24 @@ def highlight_human_regions_from_fused(fused_image, thermal_path, output_size=(6
 
     # 处理潜在人体区域
     combined_mask = human_mask.copy()
-    if np.sum(potential_human_mask) > 0:  # 如果存在潜在人体区域
+    if np.any(region_class & REGION_POTENTIAL):  # 如果存在潜在人体区域
+        potential_human_mask = region_mask(region_labels, region_class, REGION_POTENTIAL)
         # 轻微膨胀潜在区域，以便与确认的人体区域连接
         potential_dilated = cv2.dilate(potential_human_mask, kernel, iterations=2)
 
         # 检查是否有任何潜在区域与确认的人体区域相交
         overlap = cv2.bitwise_and(potential_dilated, human_mask)
-        if np.sum(overlap) > 0:  # 如果有重叠
+        if cv2.countNonZero(overlap) > 0:  # 如果有重叠
             # 将这些潜在区域添加到人体掩码中
             combined_mask = cv2.bitwise_or(human_mask, potential_human_mask)
-        else:
-            # 即使没有重叠，也检查是否有大面积的潜在人体区域（可能是孤立的人体）
-            # 找出潜在人体区域的连通组件
-            num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(potential_human_mask)
-            for i in range(1, num_labels):  # 跳过背景
-                component_area = stats[i, cv2.CC_STAT_AREA]
-                component_width = stats[i, cv2.CC_STAT_WIDTH]
-                component_height = stats[i, cv2.CC_STAT_HEIGHT]
-
-                # 如果连通区域足够大，或者具有类似人体的比例，则保留它
-                if (component_area > 400 or
-                        (component_height > 2 * component_width and component_width >= 20 and component_height >= 60)):
-                    # 创建该连通区域的掩码
-                    component_mask = np.zeros_like(potential_human_mask)
-                    component_mask[labels == i] = 255
-                    # 添加到组合掩码
-                    combined_mask = cv2.bitwise_or(combined_mask, component_mask)
+        elif np.any(region_class & REGION_POTENTIAL_ISOLATED):
+            # 即使没有重叠，也保留大面积或具有人体比例的潜在区域（可能是孤立的人体）
+            combined_mask = cv2.bitwise_or(combined_mask,
+                                           region_mask(region_labels, region_class, REGION_POTENTIAL_ISOLATED))
 
     # 新增：合并可能的人形区域
-    if np.sum(human_shape_mask) > 0:
-        combined_mask = cv2.bitwise_or(combined_mask, human_shape_mask)
+    if np.any(region_class & REGION_HUMAN_SHAPE):
+        combined_mask = cv2.bitwise_or(combined_mask, region_mask(region_labels, region_class, REGION_HUMAN_SHAPE))
 
     # 最终的人体掩码
     human_mask = combined_mask
@@ -185,14 +260,10 @@ def highlight_human_regions_from_fused(fused_image, thermal_path, output_size=(6
     colored = cv2.addWeighted(colored, 0.7, human_heat, 0.3, 0)
     colored = cv2.addWeighted(colored, 0.92, non_human_heat, 0.08, 0)
 
-    # 9. 亮度增强
-    hsv = cv2.cvtColor(colored, cv2.COLOR_BGR2HSV)
-    h, s, v = cv2.split(hsv)
-    v = np.clip(v.astype(np.float32) * 1.3, 0, 255).astype(np.uint8)
-    hsv = cv2.merge([h, s, v])
-    colored = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    # 9. 亮度增强（brighten=False 时留给 enhance_colors 与可见性增强合并处理）
+    if brighten:
+        colored, _ = apply_hsv_lut(colored, BRIGHTEN_LUT)
 
-    print(f"处理耗时: {time.time() - start_time:.2f}s")
     return colored, human_mask
 
 
@@ -205,31 +276,83 @@ def generate_heatmap(thermal_enhanced, human_mask, non_human_mask):
     return human_heat, non_human_heat
 
 
+@timed()
 def adjust_human_visibility(img):
     """可见性增强（直接处理内存数据）"""
-    start_time = time.time()
+    colored, _ = apply_hsv_lut(img, VISIBILITY_LUT)
+    return colored
+
+
+@timed()
+def enhance_colors(colored):
+    """
+    亮度增强（V×1.3）与可见性增强（S×1.85, V×1.4）合成为一次HSV往返
+
+    用于 highlight_human_regions_from_fused(..., brighten=False) 的输出，
+    返回 (BGR图像, HSV图像)，HSV 直接交给 adjust_for_fire_detection 复用。
+    分步处理时两次增益之间还有一次 HSV->BGR->HSV 往返，其取整会改变 S/V，
+    合成后少了这次取整：多数帧有百分之几的像素与分步结果相差 1~5 级。
+    """
+    return apply_hsv_lut(colored, COLOR_STAGE_LUT)
+
 
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-    h, s, v = cv2.split(hsv)
+# 火焰区域混合的目标颜色（BGR），与原图各占一半
+FIRE_BLEND_COLOR = (150, 30, 80)
+# 混色是逐通道的固定映射，预先用 addWeighted 算好查找表，保证与逐像素混合的取整一致
+FIRE_BLEND_LUT = cv2.addWeighted(
+    np.repeat(np.arange(256, dtype=np.uint8).reshape(256, 1, 1), 3, axis=2), 0.5,
+    np.full((256, 1, 3), FIRE_BLEND_COLOR, np.uint8), 0.5, 0
+)
 
-    s = np.clip(s.astype(np.float32) * 1.85, 0, 255).astype(np.uint8)
-    v = np.clip(v.astype(np.float32) * 1.4, 0, 255).astype(np.uint8)
 
-    hsv = cv2.merge([h, s, v])
-    end_time = time.time()
-    print(f"adjust_human_visibility 耗时: {end_time - start_time:.4f}s")
-    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+# 火焰混色分组的格子边长（像素）：落在相连格子中的火焰区域合并为一个处理框
+FIRE_BLEND_TILE = 32
 
 
-def adjust_for_fire_detection(img, human_mask):
-    """火焰抑制（直接处理内存数据）- 增强版，避免将人体误识别为火"""
-    start_time = time.time()
+def fire_blend_boxes(fire_mask, tile=FIRE_BLEND_TILE):
+    """
+    把火焰掩码按 tile x tile 的格子分组，返回每组的外接框 (x, y, w, h)
 
+    含有火焰像素且相连（含对角）的格子为一组：分散在画面各处的火焰各自只处理附近的区域，
+    大量细碎的火焰斑点也只产生格子数量级的处理框。
+    """
+    h, w = fire_mask.shape
+    gh, gw = -(-h // tile), -(-w // tile)
+    padded = cv2.copyMakeBorder(fire_mask, 0, gh * tile - h, 0, gw * tile - w, cv2.BORDER_CONSTANT, value=0)
+    # 整数倍的 INTER_AREA 缩小即格子内求平均，浮点平均大于0等价于格子内有火焰像素
+    grid = (cv2.resize(padded.astype(np.float32), (gw, gh), interpolation=cv2.INTER_AREA) > 0).astype(np.uint8)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(grid, connectivity=8)
+    boxes = []
+    for tx, ty, tw, th, _ in stats[1:]:
+        x, y = int(tx) * tile, int(ty) * tile
+        boxes.append((x, y, min(int(tw) * tile, w - x), min(int(th) * tile, h - y)))
+    return boxes
+
+
+def is_human_like_fire_contour(cnt):
+    """火焰轮廓是否具有人形特征（高大且不太宽），这类区域不做火焰抑制"""
+    area = cv2.contourArea(cnt)
+    if area < 500: return False  # 忽略小区域
+
+    x, y, w, h = cv2.boundingRect(cnt)
+    aspect_ratio = h / (w + 1e-5)
+    return aspect_ratio > 1.8 and h > 70 and w > 18 and w < h / 2
+
+
+@timed()
+def adjust_for_fire_detection(img, human_mask, hsv=None, fire_classifier=None):
+    """火焰抑制（直接处理内存数据）- 增强版，避免将人体误识别为火
+
+    hsv - 可选，img 对应的HSV图像（如 enhance_colors 的输出），给出时不再重复转换
+    fire_classifier - 可选，FireColorLUT，给出时直接从BGR查表得到火焰掩码（近似HSV规则，优先于 hsv）
+    """
     # 火焰颜色检测
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-    mask1 = cv2.inRange(hsv, np.array([0, 150, 100]), np.array([10, 255, 255]))
-    mask2 = cv2.inRange(hsv, np.array([160, 150, 100]), np.array([180, 255, 255]))
-    fire_mask = cv2.bitwise_or(mask1, mask2)
+    if fire_classifier is not None:
+        fire_mask = fire_classifier(img)
+    elif hsv is not None:
+        fire_mask = hsv_fire_mask(hsv)
+    else:
+        fire_mask = hsv_fire_mask(cv2.cvtColor(img, cv2.COLOR_BGR2HSV))
 
     # 形态学操作
     kernel = np.ones((5, 5), np.uint8)
@@ -242,37 +365,24 @@ def adjust_for_fire_detection(img, human_mask):
     fire_mask = cv2.bitwise_and(fire_mask, cv2.bitwise_not(dilated_human_mask))
 
     # 新增：额外检查可能的人形区域
-    # 获取火焰区域的轮廓
+    # 获取火焰区域的轮廓，类似人形的轮廓一次性从火焰掩码中填0移除（只改写轮廓内部的像素）
     fire_contours, _ = cv2.findContours(fire_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    for cnt in fire_contours:
-        area = cv2.contourArea(cnt)
-        if area < 500: continue  # 忽略小区域
-
-        x, y, w, h = cv2.boundingRect(cnt)
-        aspect_ratio = h / (w + 1e-5)
+    human_like = [cnt for cnt in fire_contours if is_human_like_fire_contour(cnt)]
+    if human_like:
+        cv2.drawContours(fire_mask, human_like, -1, 0, -1)
 
-        # 如果区域有类似人形的特征 (高大且不太宽)
-        if aspect_ratio > 1.8 and h > 70 and w > 18 and w < h / 2:
-            # 这可能是一个人，从火焰掩码中移除
-            temp_mask = np.zeros_like(fire_mask)
-            cv2.drawContours(temp_mask, [cnt], -1, 255, -1)
-            fire_mask = cv2.bitwise_and(fire_mask, cv2.bitwise_not(temp_mask))
-
-    # 颜色修正（添加安全检查）
+    # 颜色修正（添加安全检查）：按分组的处理框查表混色并按掩码写回，
+    # 分散在画面各处的火焰不会把处理范围扩大到整帧
     corrected = img.copy()
-    fire_pixels = np.where(fire_mask > 0)
-    if len(fire_pixels[0]) > 0:  # 如果存在火焰区域
-        blue_purple = np.full_like(img, (150, 30, 80))
-        corrected[fire_pixels] = cv2.addWeighted(
-            img[fire_pixels], 0.5,
-            blue_purple[fire_pixels], 0.5, 0
-        )
-
-    end_time = time.time()
-    print(f"adjust_for_fire_detection 耗时: {end_time - start_time:.4f}s")
+    for x, y, w, h in fire_blend_boxes(fire_mask):
+        roi = (slice(y, y + h), slice(x, x + w))
+        blended = cv2.LUT(img[roi], FIRE_BLEND_LUT)
+        np.copyto(corrected[roi], blended, where=fire_mask[roi][..., None] > 0)
+
     return corrected
 
 
+@timed()
 def adjust_exposure(img, target_brightness=127, tolerance=15):
     """
     自动曝光调整函数，根据图像亮度与目标值的差异调整曝光
@@ -285,8 +395,6 @@ def adjust_exposure(img, target_brightness=127, tolerance=15):
     返回:
     调整后的图像
     """
-    start_time = time.time()
-
     # 计算当前亮度
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     current_brightness = np.mean(gray)
@@ -311,33 +419,167 @@ def adjust_exposure(img, target_brightness=127, tolerance=15):
     # 应用亮度调整
     adjusted = cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
 
-    end_time = time.time()
-    print(f"adjust_exposure 耗时: {end_time - start_time:.4f}s")
     return adjusted
 
 
-def process_image_pair(fused_path, thermal_path, output_dir, target_brightness=127, tolerance=15):
-    """处理已融合的图像和热成像图像并保存结果"""
-    try:
-        # 加载融合图像
-        fused_image = cv2.imread(fused_path)
+@functools.lru_cache(maxsize=None)
+def fire_color_lut(bits):
+    """按量化位数构建火焰颜色查找表，每个进程只构建一次"""
+    return FireColorLUT(bits)
+
+
+def process_frame_pair(fused_image, thermal, target_brightness=127, tolerance=15, fire_lut_bits=0):
+    """
+    处理内存中的一对图像（融合图像、热成像灰度图），返回最终结果图
+
+    fire_lut_bits 非0时用该位数的 FireColorLUT 检测火焰颜色，否则用HSV规则
+    """
+    # 首先进行曝光调整 - 修改: 曝光调整移到了人体检测和上色之前
+    exposure_adjusted = adjust_exposure(fused_image, target_brightness, tolerance)
 
-        # 首先进行曝光调整 - 修改: 曝光调整移到了人体检测和上色之前
-        exposure_adjusted = adjust_exposure(fused_image, target_brightness, tolerance)
+    # 处理图像 - 传入调整后的图像给人体检测函数
+    colored, human_mask = highlight_human_regions_from_fused(exposure_adjusted, thermal, brighten=False)
+    enhanced_colored, enhanced_hsv = enhance_colors(colored)
+    fire_classifier = fire_color_lut(fire_lut_bits) if fire_lut_bits else None
+    return adjust_for_fire_detection(enhanced_colored, human_mask, enhanced_hsv, fire_classifier)
 
-        # 处理图像 - 传入调整后的图像给人体检测函数
-        colored, human_mask = highlight_human_regions_from_fused(exposure_adjusted, thermal_path)
-        enhanced_colored = adjust_human_visibility(colored)
-        fire_suppressed = adjust_for_fire_detection(enhanced_colored, human_mask)
+
+def load_image_pair(filename, fused_dir, thermal_dir, manifest=None):
+    """
+    读取一对图像，返回 (融合图像, 热成像灰度图)
+
+    文件只读取一次：给出 manifest 时用同一份内容计算摘要，内容未变返回 None（跳过）。
+    """
+    paths = [os.path.join(fused_dir, filename), os.path.join(thermal_dir, filename)]
+    datas = [read_bytes(path) for path in paths]
+    if manifest is not None and manifest.is_current(filename, paths, datas):
+        return None
+    return cv2.imdecode(datas[0], cv2.IMREAD_COLOR), cv2.imdecode(datas[1], cv2.IMREAD_GRAYSCALE)
+
+
+def save_result(filename, frame, output_dir, store=None):
+    """保存一帧结果，返回实际写入的文件（帧存储时为所在的块文件）"""
+    if store is not None:
+        return store.append(filename, frame)
+    output_path = os.path.join(output_dir, filename)
+    cv2.imwrite(output_path, frame)
+    return output_path
+
+
+def process_image_pair(filename, fused_dir, thermal_dir, output_dir, target_brightness=127, tolerance=15,
+                       store=None, manifest=None, fire_lut_bits=0):
+    """
+    处理已融合的图像和热成像图像并保存结果（给出 store 时追加到帧存储）
+
+    返回 (状态, 文件名, 输出文件)，状态为 None 表示清单判断内容未变而跳过。
+    """
+    try:
+        pair = load_image_pair(filename, fused_dir, thermal_dir, manifest)
+        if pair is None:
+            return None, filename, None
+        fused_image, thermal = pair
+        if fused_image is None or thermal is None:
+            raise ValueError("无法读取图像")
+        fire_suppressed = process_frame_pair(fused_image, thermal, target_brightness, tolerance, fire_lut_bits)
 
         # 保存结果
-        filename = os.path.basename(fused_path)
-        output_path = os.path.join(output_dir, filename)
-        cv2.imwrite(output_path, fire_suppressed)
-        return True, filename
+        return True, filename, save_result(filename, fire_suppressed, output_dir, store)
     except Exception as e:
-        print(f"处理 {os.path.basename(fused_path)} 时出错: {str(e)}")
-        return False, os.path.basename(fused_path)
+        print(f"处理 {filename} 时出错: {str(e)}")
+        return False, filename, None
+
+
+def run_thread_pool(common_files, fused_dir, thermal_dir, output_dir, target_brightness, tolerance, workers=None,
+                    on_success=None, store=None, manifest=None, fire_lut_bits=0):
+    """
+    线程池：每个线程完成一对图像的读取、处理和保存，返回成功数量
+
+    on_success(文件名, 输出文件) 在保存成功后调用；给出 manifest 时在线程内用读到的内容判断是否跳过。
+    """
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        futures = []
+        for filename in common_files:
+            futures.append(executor.submit(
+                process_image_pair,
+                filename,
+                fused_dir,
+                thermal_dir,
+                output_dir,
+                target_brightness,
+                tolerance,
+                store,
+                manifest,
+                fire_lut_bits
+            ))
+
+        # 处理完成统计
+        success_count = 0
+        for future in concurrent.futures.as_completed(futures):
+            status, fname, output = future.result()
+            if status:
+                print(f"成功处理: {fname}")
+                success_count += 1
+                if on_success is not None:
+                    on_success(fname, output)
+    return success_count
+
+
+def run_process_pool(common_files, fused_dir, thermal_dir, output_dir, target_brightness, tolerance,
+                     workers=None, threads_per_worker=1, io_threads=4, on_success=None, store=None, manifest=None,
+                     fire_lut_bits=0):
+    """
+    进程池：主进程用 io_threads 个线程读图/存图，图像经共享内存交给工作进程处理
+
+    返回成功数量；on_success(文件名, 输出文件) 在保存成功后调用（在I/O线程中）。
+    给出 manifest 时在I/O线程中用读到的内容判断是否跳过。
+    与线程池相同，单个文件读取、处理或保存出错只打印并计为失败，不中断整批处理。
+    各工作进程内的阶段耗时随结果汇总到主进程的 TIMER。
+    """
+    def load(filename):
+        return load_image_pair(filename, fused_dir, thermal_dir, manifest)
+
+    def save(filename, future):
+        try:
+            output = save_result(filename, future.result(), output_dir, store)
+            print(f"成功处理: {filename}")
+            if on_success is not None:
+                on_success(filename, output)
+            return True
+        except Exception as e:
+            print(f"处理 {filename} 时出错: {str(e)}")
+            return False
+
+    success_count = 0
+    with ProcessFrameRunner(process_frame_pair, workers, threads_per_worker) as runner, \
+            concurrent.futures.ThreadPoolExecutor(io_threads) as io_pool:
+        # 预读窗口与共享内存槽数一致，避免一次性解码整个目录
+        loads = collections.deque()
+        saves = collections.deque()
+        files = iter(common_files)
+        for filename in itertools.islice(files, runner.slots):
+            loads.append((filename, io_pool.submit(load, filename)))
+        while loads:
+            filename, load_future = loads.popleft()
+            next_file = next(files, None)
+            if next_file is not None:
+                loads.append((next_file, io_pool.submit(load, next_file)))
+            try:
+                pair = load_future.result()
+                if pair is None:
+                    continue
+                fused, thermal = pair
+                if fused is None or thermal is None:
+                    raise ValueError("无法读取图像")
+                future = runner.submit((fused, thermal), target_brightness, tolerance, fire_lut_bits)
+            except Exception as e:
+                print(f"处理 {filename} 时出错: {str(e)}")
+                continue
+            saves.append(io_pool.submit(save, filename, future))
+            while saves and saves[0].done():
+                success_count += saves.popleft().result()
+        for save_future in saves:
+            success_count += save_future.result()
+    return success_count
 
 
 if __name__ == "__main__":
@@ -353,6 +595,22 @@ if __name__ == "__main__":
     TARGET_BRIGHTNESS = 101  # 目标亮度值(0-255)，中间值为127
     TOLERANCE = 5  # 允许的亮度偏差范围
 
+    parser = argparse.ArgumentParser(description='融合图像人体上色与火焰抑制')
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread',
+                        help='thread: 线程池; process: 工作进程 + 共享内存传图')
+    parser.add_argument('--workers', type=int, default=None, help='工作线程/进程数（默认按CPU核数）')
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help='每个工作进程的OpenCV线程数（进程模式默认1；线程模式下设置全局线程数）')
+    parser.add_argument('--force', action='store_true', help='忽略处理清单，重新处理全部图像')
+    parser.add_argument('--timing', action='store_true',
+                        help='统计各阶段耗时（含工作进程），写入输出目录的 stage_timing.csv / stage_timing.json')
+    parser.add_argument('--frame-store', action='store_true',
+                        help='结果追加到输出目录下的帧存储 frames/，不再逐张保存图片')
+    parser.add_argument('--fire-lut', type=int, default=0, choices=range(0, 9), metavar='BITS',
+                        help='用每通道 BITS 位的BGR查找表检测火焰颜色（近似HSV规则，可先用 fire_classifier.py 验证）；0 为关闭')
+    args = parser.parse_args()
+    TIMER.enable(args.timing)
+
     print(f"自动曝光参数：目标亮度={TARGET_BRIGHTNESS}，容差范围=±{TOLERANCE}")
 
     # 获取匹配的文件列表
@@ -365,30 +623,46 @@ if __name__ == "__main__":
 
     print(f"发现 {len(common_files)} 对需要处理的图像")
 
-    # 使用线程池并行处理
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = []
-        for filename in common_files:
-            fused_path = os.path.join(FUSED_DIR, filename)
-            thermal_path = os.path.join(THERMAL_DIR, filename)
-            futures.append(executor.submit(
-                process_image_pair,
-                fused_path,
-                thermal_path,
-                OUTPUT_DIR,
-                TARGET_BRIGHTNESS,
-                TOLERANCE
-            ))
-
-        # 处理完成统计
-        success_count = 0
-        for future in concurrent.futures.as_completed(futures):
-            status, fname = future.result()
-            if status:
-                print(f"成功处理: {fname}")
-                success_count += 1
+    # 输出目录中的处理清单：两张输入图像和参数都未变化的图像对直接跳过，中断后可续跑
+    store = FrameStoreWriter(os.path.join(OUTPUT_DIR, "frames")) if args.frame_store else None
+    manifest = BatchManifest(OUTPUT_DIR, {"pipeline": "ss1-fusion", "target_brightness": TARGET_BRIGHTNESS,
+                                          "tolerance": TOLERANCE, "frame_store": args.frame_store,
+                                          "fire_lut": args.fire_lut}, force=args.force)
+    # 这里只按文件大小/修改时间快速判断；其余图像对由读取线程用读到的内容计算摘要，文件只读一次
+    pending_files = [f for f in common_files
+                     if not manifest.is_current(f, [os.path.join(FUSED_DIR, f), os.path.join(THERMAL_DIR, f)])]
+
+    def record(filename, output):
+        # 帧存储模式下记录帧所在的块文件，块文件被删除时对应的图像对会重新处理
+        manifest.record(filename, [output])
+
+    if args.executor == 'process':
+        # 使用工作进程并行处理
+        success_count = run_process_pool(pending_files, FUSED_DIR, THERMAL_DIR, OUTPUT_DIR,
+                                         TARGET_BRIGHTNESS, TOLERANCE, args.workers, args.threads_per_worker or 1,
+                                         on_success=record, store=store, manifest=manifest,
+                                         fire_lut_bits=args.fire_lut)
+    else:
+        # 使用线程池并行处理
+        if args.threads_per_worker:
+            cv2.setNumThreads(args.threads_per_worker)
+        success_count = run_thread_pool(pending_files, FUSED_DIR, THERMAL_DIR, OUTPUT_DIR,
+                                        TARGET_BRIGHTNESS, TOLERANCE, args.workers, on_success=record, store=store,
+                                        manifest=manifest, fire_lut_bits=args.fire_lut)
+    if store is not None:
+        store.close()
+    manifest.close()
 
     total_time = time.time() - total_start
-    print(f"\n处理完成: {success_count}/{len(common_files)} 成功")
+    print(f"\n处理完成: {success_count}/{len(common_files) - manifest.skipped} 成功")
+    print(manifest.format_report(len(common_files)))
     print(f"总耗时: {total_time:.2f}秒")
-    print(f"输出目录: {os.path.abspath(OUTPUT_DIR)}")
\ No newline at end of file
+    if store is not None:
+        print(store.format_stats())
+    print(f"输出目录: {os.path.abspath(OUTPUT_DIR)}")
+
+    if TIMER.enabled:
+        print("\n阶段耗时统计：")
+        print(TIMER.report())
+        TIMER.write_csv(os.path.join(OUTPUT_DIR, "stage_timing.csv"))
+        TIMER.write_json(os.path.join(OUTPUT_DIR, "stage_timing.json"))
\ No newline at end of file
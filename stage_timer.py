@@ -0,0 +1,195 @@
+import contextlib
+import csv
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+# 直方图桶：1µs ~ 100s，每个数量级 20 个对数桶（相对误差约 12%）
+_BUCKETS_PER_DECADE = 20
+_MIN_SECONDS = 1e-6
+_NUM_BUCKETS = 8 * _BUCKETS_PER_DECADE + 1
+
+
+class StageHistogram:
+    """单个阶段的耗时直方图，同时记录精确的次数、总和与极值"""
+
+    def __init__(self):
+        self.counts = [0] * _NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds <= _MIN_SECONDS:
+            index = 0
+        else:
+            index = min(_NUM_BUCKETS - 1, int(math.log10(seconds / _MIN_SECONDS) * _BUCKETS_PER_DECADE) + 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        for index, value in enumerate(other.counts):
+            self.counts[index] += value
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        """由直方图估计分位数（取桶的几何中心，并限制在实际极值范围内）"""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, value in enumerate(self.counts):
+            seen += value
+            if seen >= rank and value:
+                if index == 0:
+                    return self.min
+                center = _MIN_SECONDS * 10 ** ((index - 0.5) / _BUCKETS_PER_DECADE)
+                return min(max(center, self.min), self.max)
+        return self.max
+
+
+class _NullStage:
+    """关闭计时时使用的空上下文，几乎没有开销"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class StageTimer:
+    """
+    阶段耗时收集器
+
+    用法:
+        with TIMER.stage("clahe"):
+            ...
+        @timed("adjust_exposure")
+        def adjust_exposure(...): ...
+
+    enabled=False 时 stage() 返回共享的空上下文，被装饰函数只多一次属性判断。
+    结果可用 report() 打印，或用 write_csv()/write_json() 导出 p50/p95/p99 和调用次数。
+    多进程时工作进程用 drain() 取出自己的直方图交回主进程，主进程 merge() 汇总。
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def drain(self):
+        """取出已收集的直方图并清空"""
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+        return histograms
+
+    def merge(self, histograms):
+        """合并 drain() 取出的直方图（来自其他进程）"""
+        with self._lock:
+            for name, other in histograms.items():
+                histogram = self._histograms.get(name)
+                if histogram is None:
+                    histogram = self._histograms[name] = StageHistogram()
+                histogram.merge(other)
+
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = StageHistogram()
+            histogram.add(seconds)
+
+    @contextlib.contextmanager
+    def _timed_stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def stage(self, name):
+        """计时上下文管理器"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._timed_stage(name)
+
+    def timed(self, name=None):
+        """计时装饰器，默认以函数名作为阶段名"""
+        def decorator(fn):
+            stage_name = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(stage_name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def rows(self):
+        """每个阶段一行汇总，时间单位为毫秒"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+        rows = []
+        for name, histogram in items:
+            rows.append({
+                "stage": name,
+                "count": histogram.count,
+                "total_ms": histogram.total * 1000,
+                "mean_ms": histogram.total / histogram.count * 1000,
+                "p50_ms": histogram.percentile(50) * 1000,
+                "p95_ms": histogram.percentile(95) * 1000,
+                "p99_ms": histogram.percentile(99) * 1000,
+                "max_ms": histogram.max * 1000,
+            })
+        return rows
+
+    def report(self):
+        lines = [f"{'阶段':<40}{'次数':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'总计(s)':>10}"]
+        for row in self.rows():
+            lines.append(f"{row['stage']:<40}{row['count']:>8}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+                         f"{row['p99_ms']:>10.2f}{row['total_ms'] / 1000:>10.2f}")
+        return "\n".join(lines)
+
+    def write_csv(self, path):
+        rows = self.rows()
+        fieldnames = ["stage", "count", "total_ms", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.rows(), f, indent=2, ensure_ascii=False)
+
+
+# 全局收集器，设置环境变量 STAGE_TIMING=1 时默认开启
+TIMER = StageTimer(enabled=os.environ.get("STAGE_TIMING") == "1")
+stage = TIMER.stage
+timed = TIMER.timed
@@ -1,7 +1,9 @@
-import os
 import cv2
 import numpy as np
-from typing import Dict, List
+
+from frame_store import open_frames
+from image_metrics import compute_metrics
+from online_stats import MetricAggregator
 
 
 def calculate_entropy(image: np.ndarray) -> float:
@@ -20,29 +22,26 @@ def calculate_avg_gradient(image: np.ndarray) -> float:
     return np.mean(gradient)
 
 
-def batch_process(folder_path: str) -> Dict[str, List[float]]:
-    """批量处理文件夹中的红外图像"""
-    results = {"entropy": [], "gradient": []}
+def batch_process(folder_path: str) -> MetricAggregator:
+    """批量处理文件夹（或帧存储目录）中的红外图像，结果逐张计入在线统计"""
+    results = MetricAggregator()
     valid_exts = (".jpg", ".jpeg", ".png", ".bmp")
+    frames = open_frames(folder_path, cv2.IMREAD_GRAYSCALE)
 
-    for filename in os.listdir(folder_path):
-        if not filename.lower().endswith(valid_exts):
-            continue
-
-        filepath = os.path.join(folder_path, filename)
+    for filename in frames.names(valid_exts):
         try:
             # 读取灰度图并校验数据
-            img = cv2.imread(filepath, cv2.IMREAD_GRAYSCALE)
+            img = frames.get(filename)
             if img is None:
                 raise ValueError(f"无法读取图像: {filename}")
 
-            # 计算指标
-            entropy = calculate_entropy(img)
-            avg_grad = calculate_avg_gradient(img)
+            # 计算指标（共用一次直方图和float32梯度）
+            metrics = compute_metrics(img, ("entropy", "avg_gradient"))
+            entropy = metrics["entropy"]
+            avg_grad = metrics["avg_gradient"]
 
             # 保存结果
-            results["entropy"].append(entropy)
-            results["gradient"].append(avg_grad)
+            results.add({"filename": filename, "entropy": entropy, "gradient": avg_grad})
             print(f"{filename}: 信息熵={entropy:.2f} bits, 平均梯度={avg_grad:.2f}")
 
         except Exception as e:
@@ -51,24 +50,21 @@ def batch_process(folder_path: str) -> Dict[str, List[float]]:
     return results
 
 
-def analyze_results(results: Dict[str, List[float]]) -> None:
+def analyze_results(results: MetricAggregator) -> None:
     """分析统计结果"""
-    if not results["entropy"]:
+    if not results.rows:
         print("未找到有效图像")
         return
 
-    # 计算极值和均值
-    max_entropy = max(results["entropy"])
-    max_gradient = max(results["gradient"])
-    avg_entropy = np.mean(results["entropy"])
-    avg_gradient = np.mean(results["gradient"])
+    entropy = results["entropy"]
+    gradient = results["gradient"]
 
     # 输出统计报告
     print("\n===== 统计分析 =====")
-    print(f"最高信息熵: {max_entropy:.2f} bits")
-    print(f"最高平均梯度: {max_gradient:.2f}")
-    print(f"信息熵平均值: {avg_entropy:.2f} bits")
-    print(f"平均梯度均值: {avg_gradient:.2f}")
+    print(f"最高信息熵: {entropy.max:.2f} bits ({entropy.argmax})")
+    print(f"最高平均梯度: {gradient.max:.2f} ({gradient.argmax})")
+    print(f"信息熵平均值: {entropy.mean:.2f} bits (p50 {entropy.quantile(0.5):.2f}, p95 {entropy.quantile(0.95):.2f})")
+    print(f"平均梯度均值: {gradient.mean:.2f} (p50 {gradient.quantile(0.5):.2f}, p95 {gradient.quantile(0.95):.2f})")
 
 
 if __name__ == "__main__":
@@ -1,12 +1,17 @@
+import argparse
+import collections
+import concurrent.futures
 import os
+
 import cv2
 import numpy as np
-from skimage import exposure, feature
 from tqdm import tqdm
-from scipy import stats
-from scipy.fftpack import dct
 import pandas as pd
 
+from frame_store import open_frames
+from image_metrics import NOISE_ESTIMATORS, compute_metrics, estimate_noise_level
+from online_stats import MetricAggregator
+
 
 def calculate_dynamic_range(img):
     """计算16位红外图像动态范围（分贝）"""
@@ -15,14 +20,6 @@ def calculate_dynamic_range(img):
     return 20 * np.log10(max_val / min_val)
 
 
-def estimate_noise_level(img):
-    """基于DCT变换的噪声水平估计"""
-    dct_coeffs = dct(dct(img, axis=0, norm='ortho'), axis=1, norm='ortho')
-    abs_dct = np.abs(dct_coeffs)
-    robust_std = stats.median_abs_deviation(abs_dct.flatten(), scale='normal')
-    return robust_std
-
-
 def calculate_edge_strength(img):
     """使用Scharr算子计算边缘强度"""
     grad_x = cv2.Scharr(img, cv2.CV_64F, 1, 0)
@@ -40,55 +37,157 @@ def calculate_brightness(img):
     return img.mean()
 
 
-def process_images(folder_a, folder_b):
-    """处理去烟前和去烟后的图像，计算各项指标"""
+IMAGE_EXTS = ('.png', '.jpg', '.tiff')
+
+# 报告中的指标名 -> image_metrics 中的指标名
+PAIR_METRICS = {
+    'Noise': 'noise',
+    'DynamicRange': 'dynamic_range',
+    'Variance': 'variance',
+    'EdgeStrength': 'edge_strength',
+    'Contrast': 'contrast',
+    'Brightness': 'brightness',
+}
+
+
+def compute_pair_metrics(filename, img_a, img_b, noise_method="dct"):
+    """计算一对图像（去烟前、去烟后）的各项指标，图像无效或尺寸不符时返回 None"""
+    if img_a is None or img_b is None:
+        print(f"Warning: {filename} skipped (invalid image)")
+        return None
+
+    # 调整A图像尺寸
+    img_a = cv2.resize(img_a, (640, 360), interpolation=cv2.INTER_AREA)
+
+    if img_a.shape != img_b.shape:
+        print(f"Shape mismatch after resize: {filename}")
+        return None
+
+    # 计算各项指标：每张图的直方图和梯度只算一次，所有指标共用
+    names = list(PAIR_METRICS.values())
+    pre = compute_metrics(img_a, names, noise_method)
+    post = compute_metrics(img_b, names, noise_method)
+    row = {'filename': filename}
+    for metric, name in PAIR_METRICS.items():
+        row[f'pre_{metric}'] = pre[name]
+        row[f'post_{metric}'] = post[name]
+    return row
+
+
+def process_images(folder_a, folder_b, noise_method="dct"):
+    """处理去烟前和去烟后的图像，计算各项指标（两个目录都可以是帧存储）"""
     metrics = []
+    frames_a = open_frames(folder_a, cv2.IMREAD_ANYDEPTH)
+    frames_b = open_frames(folder_b, cv2.IMREAD_ANYDEPTH)
 
     # 获取匹配的文件列表
-    files = sorted(f for f in os.listdir(folder_a) if f.lower().endswith(('.png', '.jpg', '.tiff')))
+    files = sorted(frames_a.names(IMAGE_EXTS))
 
     for filename in tqdm(files, desc="Processing Images"):
-        # 读取并预处理图像
-        img_a = cv2.imread(os.path.join(folder_a, filename), cv2.IMREAD_ANYDEPTH)
-        img_b = cv2.imread(os.path.join(folder_b, filename), cv2.IMREAD_ANYDEPTH)
-
-        if img_a is None or img_b is None:
-            print(f"Warning: {filename} skipped (invalid image)")
-            continue
-
-        # 调整A图像尺寸
-        img_a = cv2.resize(img_a, (640, 360), interpolation=cv2.INTER_AREA)
-
-        if img_a.shape != img_b.shape:
-            print(f"Shape mismatch after resize: {filename}")
-            continue
-
-        # 转换为8bit计算质量指标
-        img_a_8bit = exposure.rescale_intensity(img_a, out_range=(0, 255)).astype('uint8')
-        img_b_8bit = exposure.rescale_intensity(img_b, out_range=(0, 255)).astype('uint8')
-
-        # 计算各项指标
-        metrics.append({
-            'filename': filename,
-            'pre_Noise': estimate_noise_level(img_a),
-            'post_Noise': estimate_noise_level(img_b),
-            'pre_DynamicRange': calculate_dynamic_range(img_a),
-            'post_DynamicRange': calculate_dynamic_range(img_b),
-            'pre_Variance': img_a.var(),
-            'post_Variance': img_b.var(),
-            'pre_EdgeStrength': calculate_edge_strength(img_a),
-            'post_EdgeStrength': calculate_edge_strength(img_b),
-            'pre_Contrast': calculate_contrast(img_a),
-            'post_Contrast': calculate_contrast(img_b),
-            'pre_Brightness': calculate_brightness(img_a),
-            'post_Brightness': calculate_brightness(img_b)
-        })
+        row = compute_pair_metrics(filename, frames_a.get(filename), frames_b.get(filename), noise_method)
+        if row is not None:
+            metrics.append(row)
 
     return pd.DataFrame(metrics)
 
 
-def analyze_results(df):
-    """分析结果，计算平均值和最优值"""
+# 工作进程内的状态：打开的两个图像目录（帧存储的索引每个进程只加载一次）和噪声估计方法
+_METRICS_WORKER = {}
+
+
+def _init_metrics_worker(folder_a, folder_b, noise_method):
+    # 并行已由进程数提供，每个进程的OpenCV只用一个线程
+    cv2.setNumThreads(1)
+    _METRICS_WORKER["a"] = open_frames(folder_a, cv2.IMREAD_ANYDEPTH)
+    _METRICS_WORKER["b"] = open_frames(folder_b, cv2.IMREAD_ANYDEPTH)
+    _METRICS_WORKER["noise_method"] = noise_method
+
+
+def _pair_metrics_job(filename):
+    """工作进程：读取一对图像并计算全部指标"""
+    return compute_pair_metrics(filename, _METRICS_WORKER["a"].get(filename), _METRICS_WORKER["b"].get(filename),
+                                _METRICS_WORKER["noise_method"])
+
+
+def iter_pair_metrics(folder_a, folder_b, files, workers=None, ordered=True, window=None, noise_method="dct"):
+    """
+    用进程池计算每对图像的指标，逐行返回（无效图像对返回 None）
+
+    在途任务数不超过 window（默认 4 x 进程数），内存占用与文件数量无关。
+    ordered=False 时按完成顺序返回，慢图像不会阻塞后面的结果。
+    """
+    workers = workers or os.cpu_count() or 1
+    window = window or 4 * workers
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_metrics_worker,
+                                                initargs=(folder_a, folder_b, noise_method)) as pool:
+        pending = collections.deque() if ordered else set()
+        for filename in files:
+            if len(pending) >= window:
+                if ordered:
+                    yield pending.popleft().result()
+                else:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            future = pool.submit(_pair_metrics_job, filename)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+        if ordered:
+            for future in pending:
+                yield future.result()
+        else:
+            for future in concurrent.futures.as_completed(pending):
+                yield future.result()
+
+
+def stream_metrics(folder_a, folder_b, csv_path, workers=None, ordered=True, chunk_size=256, noise_method="dct",
+                   aggregator=None):
+    """
+    并行计算各项指标并分块追加写入 CSV，返回写入的行数
+
+    每积累 chunk_size 行写出一次，不在内存中保留全部结果。
+    ordered=True 时CSV行顺序与 process_images 相同。
+    给出 aggregator（MetricAggregator）时每行同时计入在线统计，报告无需再读回CSV。
+    """
+    files = sorted(open_frames(folder_a, cv2.IMREAD_ANYDEPTH).names(IMAGE_EXTS))
+    rows = []
+    written = 0
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        for row in tqdm(iter_pair_metrics(folder_a, folder_b, files, workers, ordered, noise_method=noise_method),
+                        total=len(files), desc="Processing Images"):
+            if row is not None:
+                rows.append(row)
+                if aggregator is not None:
+                    aggregator.add(row)
+            if len(rows) >= chunk_size:
+                pd.DataFrame(rows).to_csv(f, header=written == 0, index=False)
+                written += len(rows)
+                rows = []
+        if rows or written == 0:
+            pd.DataFrame(rows).to_csv(f, header=written == 0, index=False)
+            written += len(rows)
+    return written
+
+
+REPORT_METRICS = ['Noise', 'DynamicRange', 'Variance', 'EdgeStrength', 'Contrast', 'Brightness']
+
+
+def _column_summary(results, column):
+    """一列指标的均值、极值及对应文件名、p50/p95；results 为 DataFrame 或 MetricAggregator"""
+    if isinstance(results, MetricAggregator):
+        stat = results[column]
+        return {'mean': stat.mean, 'min': stat.min, 'max': stat.max, 'argmin': stat.argmin, 'argmax': stat.argmax,
+                'p50': stat.quantile(0.5), 'p95': stat.quantile(0.95)}
+    values = results[column]
+    return {'mean': values.mean(), 'min': values.min(), 'max': values.max(),
+            'argmin': results['filename'][values.idxmin()], 'argmax': results['filename'][values.idxmax()],
+            'p50': values.quantile(0.5), 'p95': values.quantile(0.95)}
+
+
+def analyze_results(results):
+    """分析结果，计算平均值和最优值；results 为完整的 DataFrame 或在线汇总的 MetricAggregator"""
     analysis = {}
 
     # 各指标最优方向
@@ -102,57 +201,95 @@ def analyze_results(df):
     }
 
     # 统计平均和最优值
-    for metric in ['Noise', 'DynamicRange', 'Variance', 'EdgeStrength', 'Contrast', 'Brightness']:
-        pre_vals = df[f'pre_{metric}']
-        post_vals = df[f'post_{metric}']
+    for metric in REPORT_METRICS:
+        pre = _column_summary(results, f'pre_{metric}')
+        post = _column_summary(results, f'post_{metric}')
 
         # 平均值变化
         analysis[f'avg_{metric}'] = {
-            'pre': pre_vals.mean(),
-            'post': post_vals.mean(),
-            'delta': post_vals.mean() - pre_vals.mean()
+            'pre': pre['mean'],
+            'post': post['mean'],
+            'delta': post['mean'] - pre['mean']
+        }
+
+        # 分布（中位数、p95）
+        analysis[f'dist_{metric}'] = {
+            'pre_p50': pre['p50'],
+            'pre_p95': pre['p95'],
+            'post_p50': post['p50'],
+            'post_p95': post['p95']
         }
 
         # 最优值判断
         if optimal_direction[metric] == 'lower':
             analysis[f'best_{metric}'] = {
-                'pre': pre_vals.min(),
-                'post': post_vals.min(),
-                'improvement': post_vals.min() < pre_vals.min()
+                'pre': pre['min'],
+                'post': post['min'],
+                'pre_file': pre['argmin'],
+                'post_file': post['argmin'],
+                'improvement': post['min'] < pre['min']
             }
         else:
             analysis[f'best_{metric}'] = {
-                'pre': pre_vals.max(),
-                'post': post_vals.max(),
-                'improvement': post_vals.max() > pre_vals.max()
+                'pre': pre['max'],
+                'post': post['max'],
+                'pre_file': pre['argmax'],
+                'post_file': post['argmax'],
+                'improvement': post['max'] > pre['max']
             }
 
     return analysis
 
 
-if __name__ == "__main__":
-    # 输入路径设置
-    folder_a = "images-hw"  # 去烟前图像
-    folder_b = "main" # 去烟后图像
+def build_report(analysis):
+    """statistical_report.csv 的内容"""
+    return pd.DataFrame({
+        'Metric': ['NoiseLevel', 'DynamicRange', 'Variance', 'EdgeStrength', 'Contrast', 'Brightness'],
+        'Average_Pre': [analysis[f'avg_{m}']['pre'] for m in REPORT_METRICS],
+        'Average_Post': [analysis[f'avg_{m}']['post'] for m in REPORT_METRICS],
+        'Best_Pre': [analysis[f'best_{m}']['pre'] for m in REPORT_METRICS],
+        'Best_Post': [analysis[f'best_{m}']['post'] for m in REPORT_METRICS]
+    })
+
 
-    # 处理图像并保存结果
-    df = process_images(folder_a, folder_b)
-    df.to_csv("image_metrics.csv", index=False)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='去烟前后红外图像质量指标统计')
+    parser.add_argument('--folder_a', default='images-hw', help='去烟前图像目录（或帧存储目录）')
+    parser.add_argument('--folder_b', default='main', help='去烟后图像目录（或帧存储目录）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='计算进程数')
+    parser.add_argument('--chunk_size', type=int, default=256, help='每次写入CSV的行数')
+    parser.add_argument('--unordered', action='store_true', help='按完成顺序写入CSV（默认按文件名顺序）')
+    parser.add_argument('--noise_method', default='dct', choices=list(NOISE_ESTIMATORS),
+                        help='噪声估计方法（dct32/laplacian 更快，数值差异见 noise_bench.py）')
+    parser.add_argument('--save_stats', default=None, help='把本次的在线统计保存为JSON，便于之后合并')
+    parser.add_argument('--merge_stats', nargs='*', default=[], help='合并其他运行/机器保存的统计JSON')
+    parser.add_argument('--report_only', action='store_true', help='不处理图像，只根据 --merge_stats 生成报告')
+    args = parser.parse_args()
+
+    # 在线汇总：逐行更新均值/方差/极值/分位数，不保留全部结果
+    aggregator = MetricAggregator()
+    for path in args.merge_stats:
+        aggregator.merge(MetricAggregator.load(path))
+
+    if not args.report_only:
+        # 处理图像并分块保存结果
+        stream_metrics(args.folder_a, args.folder_b, "image_metrics.csv", args.workers,
+                       ordered=not args.unordered, chunk_size=args.chunk_size, noise_method=args.noise_method,
+                       aggregator=aggregator)
+    if args.save_stats:
+        aggregator.save(args.save_stats)
+    if not aggregator.rows:
+        print("没有有效的图像对")
+        raise SystemExit(1)
 
     # 生成统计报告
-    analysis = analyze_results(df)
-    report = pd.DataFrame({
-        'Metric': ['NoiseLevel', 'DynamicRange', 'Variance', 'EdgeStrength', 'Contrast', 'Brightness'],
-        'Average_Pre': [analysis[f'avg_{m}']['pre'] for m in
-                        ['Noise', 'DynamicRange', 'Variance', 'EdgeStrength', 'Contrast', 'Brightness']],
-        'Average_Post': [analysis[f'avg_{m}']['post'] for m in
-                         ['Noise', 'DynamicRange', 'Variance', 'EdgeStrength', 'Contrast', 'Brightness']],
-        'Best_Pre': [analysis[f'best_{m}']['pre'] for m in
-                     ['Noise', 'DynamicRange', 'Variance', 'EdgeStrength', 'Contrast', 'Brightness']],
-        'Best_Post': [analysis[f'best_{m}']['post'] for m in
-                      ['Noise', 'DynamicRange', 'Variance', 'EdgeStrength', 'Contrast', 'Brightness']]
-    })
+    analysis = analyze_results(aggregator)
+    report = build_report(analysis)
 
-    print("\n统计分析结果：")
+    print(f"\n统计分析结果（{aggregator.rows} 对图像）：")
     print(report)
+    for m in REPORT_METRICS:
+        best, dist = analysis[f'best_{m}'], analysis[f'dist_{m}']
+        print(f"{m:<14}p50 {dist['pre_p50']:.4g} -> {dist['post_p50']:.4g}, p95 {dist['pre_p95']:.4g} -> "
+              f"{dist['post_p95']:.4g}, 最优: {best['pre_file']} / {best['post_file']}")
     report.to_csv("statistical_report.csv", index=False)
\ No newline at end of file
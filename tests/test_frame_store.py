@@ -0,0 +1,138 @@
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from frame_store import INDEX, FrameStore, FrameStoreWriter, ImageFolder, open_frames
+
+
+def make_frames(count, shape=(18, 32, 3), seed=0):
+    rng = np.random.default_rng(seed)
+    return {f"f{i:03d}.png": rng.integers(0, 256, shape, np.uint8) for i in range(count)}
+
+
+def chunk_lengths(root):
+    names = sorted(name for name in os.listdir(root) if name.endswith(".npy"))
+    return [np.load(os.path.join(root, name), mmap_mode="r").shape[0] for name in names]
+
+
+def test_round_trip_with_reopen_and_append(tmp_path):
+    root = str(tmp_path / "frames")
+    frames = make_frames(45)
+    names = list(frames)
+
+    with FrameStoreWriter(root, chunk_frames=16) as writer:
+        paths = [writer.append(name, frames[name], source="a") for name in names[:6]]
+    assert paths[0] == os.path.join(root, "chunk_00000.npy")
+    assert chunk_lengths(root) == [6]  # 最后一块截到实际帧数
+
+    with FrameStoreWriter(root, chunk_frames=64) as writer:  # 已有存储沿用 store.json 中的块大小
+        assert writer.chunk_frames == 16
+        for name in names[6:]:
+            writer.append(name, frames[name])
+    assert chunk_lengths(root) == [16, 16, 13]
+
+    store = FrameStore(root)
+    assert len(store) == 45
+    assert store.names() == names
+    assert store.meta(names[0])["source"] == "a"
+    for name in names:
+        np.testing.assert_array_equal(store.get(name), frames[name])
+    assert store.get("missing.png") is None
+
+
+def test_repeated_name_last_line_wins(tmp_path):
+    root = str(tmp_path / "frames")
+    old, new = make_frames(2).values()
+    with FrameStoreWriter(root) as writer:
+        writer.append("a.png", old)
+        writer.append("b.png", old)
+        writer.append("a.png", new)
+
+    store = FrameStore(root)
+    assert len(store) == 2
+    np.testing.assert_array_equal(store.get("a.png"), new)
+    np.testing.assert_array_equal(store.get("b.png"), old)
+
+    # 旧位置不回收，续写从所有记录之后开始
+    with FrameStoreWriter(root) as writer:
+        writer.append("c.png", old)
+    assert FrameStore(root).meta("c.png")["slot"] == 3
+
+
+def test_truncated_index_line_is_ignored(tmp_path):
+    root = str(tmp_path / "frames")
+    frames = make_frames(3)
+    names = list(frames)
+    with FrameStoreWriter(root) as writer:
+        writer.append(names[0], frames[names[0]])
+    with open(os.path.join(root, INDEX), "a", encoding="utf-8") as f:
+        f.write('{"name": "' + names[1])  # 中断时写了一半的行
+
+    with FrameStoreWriter(root) as writer:
+        writer.append(names[2], frames[names[2]])
+
+    store = FrameStore(root)
+    assert store.names() == [names[0], names[2]]
+    np.testing.assert_array_equal(store.get(names[2]), frames[names[2]])
+
+
+def test_shape_mismatch_is_rejected(tmp_path):
+    with FrameStoreWriter(str(tmp_path / "frames")) as writer:
+        writer.append("a.png", np.zeros((4, 4, 3), np.uint8))
+        with pytest.raises(ValueError):
+            writer.append("b.png", np.zeros((4, 5, 3), np.uint8))
+
+
+def test_bgr_store_read_paths(tmp_path):
+    root = str(tmp_path / "frames")
+    frames = make_frames(3)
+    with FrameStoreWriter(root) as writer:
+        writer.write_group([(os.path.join("out", name), frame) for name, frame in frames.items()])
+
+    for name, frame in frames.items():
+        np.testing.assert_array_equal(open_frames(root).get(name), frame)
+        gray = open_frames(root, cv2.IMREAD_GRAYSCALE).get(name)
+        np.testing.assert_array_equal(gray, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+        np.testing.assert_array_equal(open_frames(root, cv2.IMREAD_ANYDEPTH).get(name), gray)
+
+
+def test_gray_store_matches_gray_reads_of_bgr_store(tmp_path):
+    frames = make_frames(5)
+    with FrameStoreWriter(str(tmp_path / "bgr")) as writer:
+        for name, frame in frames.items():
+            writer.append(name, frame)
+    with FrameStoreWriter(str(tmp_path / "gray"), gray=True) as writer:
+        for name, frame in frames.items():
+            writer.append(name, frame)
+
+    gray_store = open_frames(str(tmp_path / "gray"), cv2.IMREAD_GRAYSCALE)
+    bgr_store = open_frames(str(tmp_path / "bgr"), cv2.IMREAD_GRAYSCALE)
+    assert gray_store.shape == (18, 32)
+    for name in frames:
+        frame = gray_store.get(name)
+        assert isinstance(frame, np.memmap)  # 单通道存储按灰度读取时直接返回映射视图，不再转换
+        np.testing.assert_array_equal(frame, bgr_store.get(name))
+
+
+def test_open_frames_on_image_folder(tmp_path):
+    frame = make_frames(1)["f000.png"]
+    cv2.imwrite(str(tmp_path / "a.png"), frame)
+    (tmp_path / "notes.txt").write_text("x")
+
+    folder = open_frames(str(tmp_path))
+    assert isinstance(folder, ImageFolder)
+    assert folder.names((".png",)) == ["a.png"]
+    assert "a.png" in folder
+    np.testing.assert_array_equal(folder.get("a.png"), frame)
+    assert open_frames(str(tmp_path), cv2.IMREAD_GRAYSCALE).get("a.png").ndim == 2
+
+
+def test_store_header_records_first_frame(tmp_path):
+    root = str(tmp_path / "frames")
+    with FrameStoreWriter(root, chunk_frames=4) as writer:
+        writer.append("a.png", np.zeros((2, 3), np.uint16))
+    with open(os.path.join(root, "store.json"), encoding="utf-8") as f:
+        assert json.load(f) == {"shape": [2, 3], "dtype": "<u2", "chunk_frames": 4}
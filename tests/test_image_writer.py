@@ -0,0 +1,32 @@
+import os
+
+import cv2
+import numpy as np
+
+from image_writer import AsyncImageWriter
+
+
+def frame(seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (12, 16, 3), np.uint8)
+
+
+def test_format_applies_only_to_final_image(tmp_path):
+    steps = str(tmp_path / "a_1_original.png")
+    final = str(tmp_path / "a.png")
+    done = []
+    with AsyncImageWriter("jpg") as writer:
+        paths = writer.write_group([(steps, frame(0)), (final, frame(1))], done.append)
+
+    assert paths == [steps, str(tmp_path / "a.jpg")]  # 中间步骤保持原文件名
+    assert done == [paths]
+    assert sorted(os.listdir(tmp_path)) == ["a.jpg", "a_1_original.png"]
+    np.testing.assert_array_equal(cv2.imread(steps), frame(0))  # png 无损
+    assert writer.written == 2 and not writer.errors
+
+
+def test_keep_format_and_single_write(tmp_path):
+    with AsyncImageWriter() as writer:
+        assert writer.write(str(tmp_path / "a.bmp"), frame()) == str(tmp_path / "a.bmp")
+    with AsyncImageWriter("png") as writer:
+        assert writer.write(str(tmp_path / "b.bmp"), frame()) == str(tmp_path / "b.png")
+    assert sorted(os.listdir(tmp_path)) == ["a.bmp", "b.png"]
@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+from manifest import BatchManifest, read_bytes
+
+PARAMS = {"pipeline": "test", "gain": 1.5}
+
+
+@pytest.fixture
+def batch(tmp_path):
+    """一个输入文件、一个输出目录，并已按 PARAMS 处理并记录过一次"""
+    src = tmp_path / "in.png"
+    src.write_bytes(b"frame-0")
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    output = out_dir / "in.png"
+    output.write_bytes(b"result")
+    with BatchManifest(str(out_dir), PARAMS) as manifest:
+        assert not manifest.check("in.png", str(src))[0]
+        manifest.record("in.png", [str(output)])
+    return src, out_dir, output
+
+
+def lines(out_dir):
+    with open(os.path.join(out_dir, BatchManifest.FILENAME), encoding="utf-8") as f:
+        return f.readlines()
+
+
+def test_unchanged_entry_is_skipped_by_stat(batch, monkeypatch):
+    src, out_dir, _ = batch
+    with BatchManifest(str(out_dir), PARAMS) as manifest:
+        # 大小和修改时间一致时不应读取文件
+        monkeypatch.setattr("manifest.read_bytes", lambda path: pytest.fail("快速判断不应读取文件"))
+        skip, datas = manifest.check("in.png", str(src))
+    assert skip and datas is None
+    assert manifest.skipped == 1
+
+
+def test_params_change_reprocesses(batch):
+    src, out_dir, _ = batch
+    with BatchManifest(str(out_dir), dict(PARAMS, gain=2.0)) as manifest:
+        assert not manifest.check("in.png", str(src))[0]
+
+
+def test_force_reprocesses(batch):
+    src, out_dir, _ = batch
+    with BatchManifest(str(out_dir), PARAMS, force=True) as manifest:
+        assert not manifest.check("in.png", str(src))[0]
+
+
+def test_missing_output_reprocesses(batch):
+    src, out_dir, output = batch
+    output.unlink()
+    with BatchManifest(str(out_dir), PARAMS) as manifest:
+        assert not manifest.check("in.png", str(src))[0]
+
+
+def test_changed_content_reprocesses(batch):
+    src, out_dir, _ = batch
+    src.write_bytes(b"frame-1")
+    with BatchManifest(str(out_dir), PARAMS) as manifest:
+        assert not manifest.check("in.png", str(src))[0]
+
+
+def test_touched_input_is_restamped_not_rerun(batch):
+    src, out_dir, _ = batch
+    st = os.stat(src)
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+    before = len(lines(out_dir))
+
+    with BatchManifest(str(out_dir), PARAMS) as manifest:
+        assert not manifest.is_current("in.png", str(src))  # 修改时间变了，快速判断不通过
+        assert manifest.is_current("in.png", str(src), [read_bytes(str(src))])  # 内容相同
+    assert manifest.recorded == 0
+    assert len(lines(out_dir)) == before + 1  # 只追加了一行新的文件属性
+
+    with BatchManifest(str(out_dir), PARAMS) as manifest:
+        assert manifest.is_current("in.png", str(src))  # 重新记录后又能走快速判断
+
+
+def test_truncated_last_line_is_ignored(batch, tmp_path):
+    src, out_dir, output = batch
+    other = tmp_path / "other.png"
+    other.write_bytes(b"frame-other")
+    with open(os.path.join(out_dir, BatchManifest.FILENAME), "a", encoding="utf-8") as f:
+        f.write('{"name": "other.png", "hash": "ab')  # 中断时写了一半的行
+
+    with BatchManifest(str(out_dir), PARAMS) as manifest:
+        assert manifest.check("in.png", str(src))[0]  # 前面的完整记录仍然有效
+        assert not manifest.check("other.png", str(other))[0]
+        manifest.record("other.png", [str(output)])
+
+    with BatchManifest(str(out_dir), PARAMS) as manifest:
+        assert manifest.check("other.png", str(other))[0]  # 截断行之后追加的记录可以正常读取
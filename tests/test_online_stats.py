@@ -0,0 +1,123 @@
+import math
+
+import numpy as np
+import pytest
+
+from online_stats import DEFAULT_ALPHA, MetricAggregator, QuantileSketch, RunningStat
+
+QUANTILES = (0.0, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 1.0)
+
+
+def sample(seed=0, n=5000):
+    """正负值、零和跨越多个数量级的数值都包含在内"""
+    rng = np.random.default_rng(seed)
+    values = np.concatenate([
+        rng.normal(100, 15, n),
+        rng.lognormal(0, 3, n),
+        -rng.exponential(5, n // 5),
+        np.zeros(n // 50),
+    ])
+    rng.shuffle(values)
+    return values
+
+
+def running(values, alpha=DEFAULT_ALPHA):
+    stat = RunningStat(alpha)
+    for i, value in enumerate(values):
+        stat.add(value, f"v{i}")
+    return stat
+
+
+def assert_matches_numpy(stat, values, alpha):
+    assert stat.count == len(values)
+    assert stat.mean == pytest.approx(values.mean(), rel=1e-9)
+    assert stat.variance == pytest.approx(values.var(), rel=1e-9)
+    assert stat.min == values.min() and stat.argmin == f"v{values.argmin()}"
+    assert stat.max == values.max() and stat.argmax == f"v{values.argmax()}"
+    for q in QUANTILES:
+        # 草图返回排名 q*(n-1) 处（向下取整）元素所在桶的代表值，相对误差不超过 alpha
+        exact = np.quantile(values, q, method="lower")
+        assert abs(stat.quantile(q) - exact) <= alpha * abs(exact) + 1e-12, q
+
+
+@pytest.mark.parametrize("alpha", [DEFAULT_ALPHA, 0.01])
+def test_running_stat_matches_numpy(alpha):
+    values = sample()
+    assert_matches_numpy(running(values, alpha), values, alpha)
+
+
+@pytest.mark.parametrize("alpha", [DEFAULT_ALPHA, 0.01])
+def test_split_and_merge_matches_single_pass(alpha):
+    values = sample(seed=1)
+    parts = np.array_split(np.arange(values.size), [1000, 1001, 7000])  # 含只有一个样本的分片
+    merged = RunningStat(alpha)
+    for part in parts:
+        piece = RunningStat(alpha)
+        for i in part:
+            piece.add(values[i], f"v{i}")
+        merged.merge(piece)
+    merged.merge(RunningStat(alpha))  # 空统计不影响结果
+
+    assert_matches_numpy(merged, values, alpha)
+    single = running(values, alpha)
+    for q in QUANTILES:
+        assert merged.quantile(q) == single.quantile(q)  # 按桶相加，与一次性加入完全相同
+
+
+def test_non_finite_values_are_skipped():
+    stat = RunningStat()
+    for value in (1.0, math.nan, math.inf, -math.inf, 3.0):
+        stat.add(value)
+    assert stat.count == 2 and stat.skipped == 3
+    assert stat.mean == 2.0
+
+
+def test_empty_stat():
+    stat = RunningStat()
+    assert math.isnan(stat.variance)
+    assert math.isnan(stat.quantile(0.5))
+
+
+def test_sketch_merge_rejects_different_alpha():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.001))
+
+
+def test_aggregator_merge_does_not_alias_source():
+    a, b = MetricAggregator(), MetricAggregator()
+    a.add({"filename": "a.png", "brightness": 10.0})
+    b.add({"filename": "b.png", "brightness": 20.0, "noise": 1.0})
+
+    a.merge(b)
+    a.add({"filename": "c.png", "brightness": 30.0, "noise": 3.0})
+
+    assert a["noise"].count == 2 and a["noise"].mean == 2.0
+    assert b["noise"].count == 1 and b["noise"].mean == 1.0
+    assert b["noise"].sketch.count == 1
+    assert a["brightness"].count == 3 and b["brightness"].count == 1
+    assert a.rows == 3 and b.rows == 1
+
+
+def test_aggregator_save_load_merge(tmp_path):
+    values = sample(seed=2, n=1000)
+    halves = np.array_split(np.arange(values.size), 2)
+    full = MetricAggregator()
+    for i, value in enumerate(values):
+        full.add({"filename": f"v{i}", "x": value, "y": 2 * value})
+    for index, part in enumerate(halves):
+        aggregator = MetricAggregator()
+        for i in part:
+            aggregator.add({"filename": f"v{i}", "x": values[i], "y": 2 * values[i]})
+        aggregator.save(str(tmp_path / f"part{index}.json"))
+
+    merged = MetricAggregator()
+    for index in range(len(halves)):
+        merged.merge(MetricAggregator.load(str(tmp_path / f"part{index}.json")))
+
+    assert merged.rows == full.rows
+    for key in ("x", "y"):
+        assert merged[key].mean == pytest.approx(full[key].mean, rel=1e-9)
+        assert merged[key].variance == pytest.approx(full[key].variance, rel=1e-9)
+        assert (merged[key].argmin, merged[key].argmax) == (full[key].argmin, full[key].argmax)
+        for q in QUANTILES:
+            assert merged[key].quantile(q) == full[key].quantile(q)
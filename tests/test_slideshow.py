@@ -0,0 +1,111 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from frame_cache import FrameCache
+from slideshow import SlideshowPrefetcher
+
+COUNT = 6
+LAPS = 3
+SHAPE = (8, 10, 3)
+
+
+@pytest.fixture
+def image_files(tmp_path):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(COUNT):
+        path = str(tmp_path / f"{i}.png")
+        cv2.imwrite(path, rng.integers(0, 256, SHAPE, np.uint8))
+        paths.append(path)
+    return paths
+
+
+class FakeBatchProcessor:
+    """代替增强 + 推理：记录处理过的帧数，输出为反色帧"""
+
+    def __init__(self):
+        self.processed = 0
+        self.batches = []
+
+    def __call__(self, frames):
+        self.processed += len(frames)
+        self.batches.append(len(frames))
+        return [255 - frame for frame in frames]
+
+
+def play(prefetcher, frames, timeout=10.0):
+    """像GUI计时器一样轮询 next_ready()，取出指定帧数后停止"""
+    shown = []
+    deadline = time.monotonic() + timeout
+    prefetcher.start()
+    try:
+        while len(shown) < frames:
+            assert time.monotonic() < deadline, "预取超时"
+            item = prefetcher.next_ready()
+            if item is None:
+                time.sleep(0.001)
+                continue
+            shown.append(item)
+    finally:
+        prefetcher.stop()
+    return shown
+
+
+def check_laps(shown, image_files):
+    assert [index for index, _ in shown] == list(range(COUNT)) * LAPS  # 播放顺序不因缓存命中而改变
+    for index, frame in shown:
+        np.testing.assert_array_equal(frame, 255 - cv2.imread(image_files[index]))
+
+
+@pytest.mark.parametrize("spill", [False, True], ids=["memory", "disk"])
+def test_cache_skips_processing_after_first_lap(image_files, tmp_path, spill):
+    frame_bytes = int(np.prod(SHAPE))
+    if spill:
+        # 内存只放得下两帧，其余帧溢出到磁盘，之后每圈都从磁盘读回
+        cache = FrameCache(max_bytes=2 * frame_bytes, spill_dir=str(tmp_path / "spill"))
+    else:
+        cache = FrameCache(max_bytes=COUNT * frame_bytes)
+    process_batch = FakeBatchProcessor()
+    prefetcher = SlideshowPrefetcher(image_files, process_batch, batch_size=4, buffer_size=3,
+                                     cache=cache, cache_params=lambda: {"weights": "fake.pt", "conf": 0.5})
+
+    shown = play(prefetcher, COUNT * LAPS)
+
+    check_laps(shown, image_files)
+    assert process_batch.processed == COUNT  # 只有第一圈真正处理
+    assert process_batch.batches == [4, 2]
+    if spill:
+        assert cache.hits == 0 and cache.disk_hits >= COUNT * (LAPS - 1)
+        assert cache.disk_used <= cache.spill_bytes
+    else:
+        assert cache.disk_hits == 0 and cache.hits >= COUNT * (LAPS - 1)
+    assert prefetcher.dropped == 0
+
+
+def test_without_cache_every_lap_is_processed(image_files):
+    process_batch = FakeBatchProcessor()
+    prefetcher = SlideshowPrefetcher(image_files, process_batch, batch_size=4, buffer_size=3)
+
+    shown = play(prefetcher, COUNT * LAPS)
+
+    check_laps(shown, image_files)
+    assert process_batch.processed >= COUNT * LAPS
+
+
+def test_params_change_invalidates_cache(image_files):
+    params = {"conf": 0.5}
+    process_batch = FakeBatchProcessor()
+    cache = FrameCache()
+    play(SlideshowPrefetcher(image_files, process_batch, loop=False, cache=cache,
+                             cache_params=lambda: params), COUNT)
+    play(SlideshowPrefetcher(image_files, process_batch, loop=False, cache=cache,
+                             cache_params=lambda: params), COUNT)
+    assert process_batch.processed == COUNT
+
+    params = {"conf": 0.6}
+    play(SlideshowPrefetcher(image_files, process_batch, loop=False, cache=cache,
+                             cache_params=lambda: params), COUNT)
+    assert process_batch.processed == 2 * COUNT